@@ -1,12 +1,13 @@
 from django.contrib import admin
-from .models import Resource, Booking
+from .models import Resource, Booking, BookingArchive, DurationDiscount, PriceRule
 
 
 @admin.register(Resource)
 class ResourceAdmin(admin.ModelAdmin):
-    list_display = ('name', 'location_name', 'sport_type', 'is_active', 'price_per_hour', 'slot_minutes')
+    list_display = ('name', 'location_name', 'place_id', 'sport_type', 'is_active', 'price_per_hour', 'slot_minutes')
     list_filter = ('sport_type', 'is_active')
-    search_fields = ('name', 'location_name')
+    search_fields = ('name', 'location_name', 'place_id')
+    raw_id_fields = ('place',)
     list_editable = ('is_active', 'price_per_hour', 'slot_minutes')
 
 
@@ -16,4 +17,31 @@ class BookingAdmin(admin.ModelAdmin):
     list_filter = ('status', 'resource__sport_type', 'user', 'created_at')
     search_fields = ('user__username', 'resource__name', 'notes')
     list_editable = ('status',)
-    date_hierarchy = 'start_time'
\ No newline at end of file
+    date_hierarchy = 'start_time'
+
+@admin.register(BookingArchive)
+class BookingArchiveAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'resource', 'start_time', 'end_time', 'status', 'price', 'archived_at')
+    list_filter = ('status', 'archived_at')
+    search_fields = ('user__username', 'resource__name')
+    date_hierarchy = 'start_time'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(PriceRule)
+class PriceRuleAdmin(admin.ModelAdmin):
+    list_display = ('name', 'resource', 'weekdays', 'start_time', 'end_time', 'rate', 'multiplier', 'priority', 'is_active')
+    list_filter = ('is_active', 'weekdays')
+    search_fields = ('name', 'resource__name')
+    raw_id_fields = ('resource',)
+    list_editable = ('priority', 'is_active')
+
+@admin.register(DurationDiscount)
+class DurationDiscountAdmin(admin.ModelAdmin):
+    list_display = ('resource', 'min_minutes', 'percent_off', 'is_active')
+    list_filter = ('is_active',)
+    raw_id_fields = ('resource',)
@@ -0,0 +1,238 @@
+import json
+import logging
+import platform
+import random
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from booking.models import Booking, Resource
+from booking.services import OPEN_TIME, SLOTS_PER_DAY, SLOT_MINUTES, overlapping_bookings
+from home.utils.bench import ensure_scratch_database, latency_summary, run_concurrent
+
+User = get_user_model()
+
+BENCH_PREFIX = 'bench-booking'
+OPERATIONS = ('create', 'update', 'cancel', 'availability')
+DEFAULT_MIX = 'create=50,update=20,cancel=10,availability=20'
+
+
+def parse_mix(value):
+    """'create=50,availability=20' -> {'create': 50, 'availability': 20}."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise CommandError(f'Operasi tidak dikenal: {name!r} (pilihan: {", ".join(OPERATIONS)})')
+        try:
+            mix[name] = int(weight)
+        except ValueError:
+            raise CommandError(f'Bobot untuk {name} harus bilangan bulat')
+    if not any(weight > 0 for weight in mix.values()):
+        raise CommandError('Minimal satu operasi harus berbobot > 0')
+    return mix
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark view booking in-process (create/update/cancel/availability) lewat django.test.Client '
+        'dengan banyak klien bersamaan; melaporkan latensi p50/p95/p99, throughput, tingkat bentrok dan '
+        'booking ganda. Tidak ada request HTTP sungguhan: latensi mencakup view, ORM dan database, tanpa '
+        'jaringan, server WSGI maupun middleware di depannya. Hanya database scratch dari settings yang '
+        'diukur; tidak ada perbandingan SQLite/Postgres dalam satu run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Jumlah request total')
+        parser.add_argument('--workers', type=int, default=16, help='Jumlah klien yang berjalan bersamaan')
+        parser.add_argument('--resources', type=int, default=4, help='Jumlah resource yang diperebutkan')
+        parser.add_argument('--days', type=int, default=2, help='Jumlah hari yang dipakai untuk jadwal booking')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Bobot tiap operasi (default: {DEFAULT_MIX})')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--format', choices=('text', 'json'), default='text', help='Format laporan di stdout')
+        parser.add_argument('--output', help='Tulis juga laporan JSON ke file ini')
+
+    def handle(self, *args, **options):
+        ensure_scratch_database()
+        mix = parse_mix(options['mix'])
+        workers = max(1, options['workers'])
+        rng = random.Random(options['seed'])
+
+        users = [User.objects.create(username=f'{BENCH_PREFIX}-{i}') for i in range(workers)]
+        resources = [
+            Resource.objects.create(name=f'{BENCH_PREFIX} {i}', sport_type='other')
+            for i in range(max(1, options['resources']))
+        ]
+        tz = timezone.get_current_timezone()
+        first_day = timezone.localdate() + timedelta(days=1)
+        days = [first_day + timedelta(days=i) for i in range(max(1, options['days']))]
+
+        def random_range():
+            start = timezone.make_aware(datetime.combine(rng.choice(days), OPEN_TIME), tz)
+            start += timedelta(minutes=SLOT_MINUTES * rng.randrange(SLOTS_PER_DAY - 8))
+            return start, start + timedelta(minutes=SLOT_MINUTES * rng.choice((4, 6, 8)))
+
+        # Rencana request dibuat di muka dengan seed tetap supaya hasil antar-run bisa dibandingkan.
+        names = [name for name in OPERATIONS if mix.get(name, 0) > 0]
+        weights = [mix[name] for name in names]
+        plan = []
+        for i in range(options['requests']):
+            start, end = random_range()
+            plan.append((i % workers, rng.choices(names, weights)[0], rng.choice(resources), start, end, rng.random()))
+
+        owned = defaultdict(list)  # indeks klien -> id booking miliknya
+        owned_lock = threading.Lock()
+        clients = threading.local()
+        all_clients = []
+
+        def client_for(worker):
+            cache = getattr(clients, 'by_worker', None)
+            if cache is None:
+                cache = clients.by_worker = {}
+            if worker not in cache:
+                client = Client(HTTP_HOST='localhost')
+                client.force_login(users[worker])
+                cache[worker] = client
+                all_clients.append(client)
+            return cache[worker]
+
+        def send(operation, client, worker, resource, start, end, pick):
+            if operation in ('update', 'cancel'):
+                with owned_lock:
+                    mine = owned[worker]
+                    booking_id = mine[int(pick * len(mine))] if mine else None
+                if booking_id is None:
+                    operation = 'create'
+                elif operation == 'cancel':
+                    with owned_lock:
+                        owned[worker].remove(booking_id)
+                    return operation, client.post(
+                        reverse('booking:booking-cancel', args=[booking_id]), secure=True,
+                    )
+                else:
+                    return operation, client.post(
+                        reverse('booking:booking-update', args=[booking_id]),
+                        {'start_time': start.isoformat(), 'end_time': end.isoformat()},
+                        content_type='application/json', secure=True,
+                    )
+            if operation == 'availability':
+                return operation, client.get(
+                    reverse('booking:availability'),
+                    {'resource': str(resource.pk), 'date': start.astimezone(tz).date().isoformat()},
+                    secure=True,
+                )
+            response = client.post(reverse('booking:book'), {
+                'resource_id': str(resource.pk),
+                'resource_label': resource.name,
+                'start_time': start.isoformat(),
+                'end_time': end.isoformat(),
+            }, content_type='application/json', secure=True)
+            if response.status_code == 201:
+                with owned_lock:
+                    owned[worker].append(response.json()['id'])
+            return operation, response
+
+        def run(item):
+            worker, operation, resource, start, end, pick = item
+            try:
+                operation, response = send(operation, client_for(worker), worker, resource, start, end, pick)
+            except Exception:
+                return operation, 'error'
+            code = response.status_code
+            if 200 <= code < 300:
+                return operation, 'ok'
+            if code == 409:
+                return operation, 'conflict'
+            if code >= 500 or 'failed:' in str(getattr(response, 'data', '') or ''):
+                return operation, 'error'
+            return operation, 'rejected'
+
+        # Setiap 409/500 dicatat django.request (traceback tampil di konsol saat DEBUG);
+        # hasilnya sudah dihitung di laporan, jadi log-nya dibungkam selama benchmark.
+        request_logger = logging.getLogger('django.request')
+        previous_level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            timed, elapsed = run_concurrent(run, plan, workers)
+            results = [(operation, outcome, latency) for (operation, outcome), latency in timed]
+            violations = overlapping_bookings(Booking.objects.filter(resource__in=resources)).count()
+            report = self._report(options, workers, results, elapsed, violations)
+        finally:
+            request_logger.setLevel(previous_level)
+            for client in all_clients:
+                client.logout()
+            Booking.objects.filter(user__in=users).delete()
+            Resource.objects.filter(pk__in=[r.pk for r in resources]).delete()
+            User.objects.filter(pk__in=[u.pk for u in users]).delete()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+        if options['format'] == 'json':
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._write_text(report)
+
+    def _report(self, options, workers, results, elapsed, violations):
+        by_operation = defaultdict(list)
+        for operation, outcome, latency in results:
+            by_operation[operation].append((outcome, latency))
+
+        def stats(rows):
+            outcomes = [outcome for outcome, _ in rows]
+            return {
+                'requests': len(rows),
+                **{outcome: outcomes.count(outcome) for outcome in ('ok', 'conflict', 'rejected', 'error')},
+                **latency_summary(latency for _, latency in rows),
+            }
+
+        writes = by_operation['create'] + by_operation['update']
+        conflicts = sum(1 for outcome, _ in writes if outcome == 'conflict')
+        return {
+            'benchmark': 'booking',
+            'mode': 'in-process view (django.test.Client, tanpa HTTP)',
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'params': {
+                'requests': len(results),
+                'workers': workers,
+                'resources': options['resources'],
+                'days': options['days'],
+                'mix': options['mix'],
+                'seed': options['seed'],
+            },
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(results) / elapsed, 1) if elapsed else None,
+            'conflict_rate': round(conflicts / len(writes), 4) if writes else 0.0,
+            'double_booking_violations': violations,
+            'overall': stats([(outcome, latency) for _, outcome, latency in results]),
+            'operations': {operation: stats(rows) for operation, rows in sorted(by_operation.items())},
+        }
+
+    def _write_text(self, report):
+        params = report['params']
+        self.stdout.write(f'Mode               : {report["mode"]}')
+        self.stdout.write(f'Database           : {report["database"]}')
+        self.stdout.write(f'Request            : {params["requests"]} ({params["workers"]} klien, '
+                          f'{params["resources"]} resource)')
+        self.stdout.write(f'Throughput         : {report["throughput_rps"]} request/s')
+        self.stdout.write(f'Tingkat bentrok    : {report["conflict_rate"] * 100:.1f}% dari create/update')
+        for operation, row in report['operations'].items():
+            self.stdout.write(
+                f'  {operation:<12} n={row["requests"]:<5} ok={row["ok"]:<5} bentrok={row["conflict"]:<5} '
+                f'ditolak={row["rejected"]:<4} error={row["error"]:<4} '
+                f'p50/p95/p99={row["p50_ms"]}/{row["p95_ms"]}/{row["p99_ms"]}ms'
+            )
+        if report['double_booking_violations']:
+            self.stdout.write(self.style.ERROR(
+                f'{report["double_booking_violations"]} booking saling bertabrakan!'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Tidak ada booking ganda.'))
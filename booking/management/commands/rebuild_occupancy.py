@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from booking.models import Booking, Resource, ResourceDayOccupancy
+from booking.services import ACTIVE_STATUSES, booking_day_masks, invalidate_availability, store_occupancy
+
+
+class Command(BaseCommand):
+    help = 'Membangun ulang bitmap okupansi per resource per hari dari tabel Booking'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resource', action='append', help='Hanya resource ini (boleh diulang)')
+        parser.add_argument('--check', action='store_true', help='Hanya laporkan selisih, tanpa menulis')
+
+    def handle(self, *args, **options):
+        resources = Resource.objects.all()
+        if options['resource']:
+            resources = resources.filter(pk__in=options['resource'])
+
+        fixed = 0
+        for resource_id in resources.values_list('pk', flat=True):
+            with transaction.atomic():
+                expected = {}
+                rows = Booking.objects.filter(resource_id=resource_id, status__in=ACTIVE_STATUSES).values_list('start_time', 'end_time')
+                for start, end in rows.iterator():
+                    for day, mask in booking_day_masks(start, end).items():
+                        expected[day] = expected.get(day, 0) | mask
+
+                stored = {
+                    row.day: row.mask
+                    for row in ResourceDayOccupancy.objects.filter(resource_id=resource_id)
+                }
+                changed = {day: mask for day, mask in expected.items() if stored.get(day) != mask}
+                stale = [day for day, mask in stored.items() if mask and day not in expected]
+                if not (changed or stale):
+                    continue
+
+                fixed += len(changed) + len(stale)
+                self.stdout.write(self.style.WARNING(
+                    f'{resource_id}: {len(changed)} hari berbeda, {len(stale)} hari tanpa booking aktif'
+                ))
+                if options['check']:
+                    continue
+                store_occupancy(resource_id, changed)
+                ResourceDayOccupancy.objects.filter(resource_id=resource_id, day__in=stale).delete()
+                invalidate_availability(resource_id)
+
+        if not fixed:
+            self.stdout.write(self.style.SUCCESS('Bitmap okupansi sudah sesuai dengan tabel Booking.'))
+        elif options['check']:
+            self.stdout.write(self.style.ERROR(f'{fixed} bitmap harian tidak sesuai.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{fixed} bitmap harian dibangun ulang.'))
@@ -0,0 +1,70 @@
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from booking.models import Booking, Resource
+from booking.services import BookingConflict, OPEN_TIME, overlapping_bookings, write_booking
+from home.utils.bench import DB_ERROR, ensure_scratch_database, format_latency, run_concurrent
+
+User = get_user_model()
+
+STRESS_PREFIX = 'stress-booking'
+
+
+class Command(BaseCommand):
+    help = 'Banyak request booking bersamaan pada slot yang sama, lalu memastikan tidak ada booking ganda'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Jumlah percobaan booking')
+        parser.add_argument('--workers', type=int, default=16, help='Jumlah thread yang berjalan bersamaan')
+        parser.add_argument('--resources', type=int, default=2, help='Jumlah resource yang diperebutkan')
+        parser.add_argument('--slots', type=int, default=6, help='Jumlah jam mulai berbeda yang diperebutkan')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        ensure_scratch_database()
+        rng = random.Random(options['seed'])
+        user = User.objects.create(username=f'{STRESS_PREFIX}-user')
+        resources = [
+            Resource.objects.create(name=f'{STRESS_PREFIX} {i}', sport_type='other')
+            for i in range(options['resources'])
+        ]
+        tz = timezone.get_current_timezone()
+        opening = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=1), OPEN_TIME), tz)
+
+        # Durasi 1-2 jam dengan jam mulai berdekatan, jadi sebagian besar request saling bertabrakan.
+        attempts = []
+        for _ in range(options['requests']):
+            start = opening + timedelta(minutes=30 * rng.randrange(options['slots']))
+            attempts.append((rng.choice(resources).pk, start, start + timedelta(hours=rng.choice((1, 2)))))
+
+        def book(attempt):
+            resource_id, start, end = attempt
+            try:
+                write_booking(resource_id, start, end, user=user, price=Decimal('0'))
+            except BookingConflict:
+                return 'conflict'
+            return 'ok'
+
+        try:
+            results, elapsed = run_concurrent(book, attempts, options['workers'])
+            outcomes = [outcome for outcome, _ in results]
+            double_booked = overlapping_bookings(Booking.objects.filter(resource__in=resources)).count()
+
+            self.stdout.write(f'Request            : {len(attempts)} ({options["workers"]} thread)')
+            self.stdout.write(f'Berhasil           : {outcomes.count("ok")}')
+            self.stdout.write(f'Bentrok (ditolak)  : {outcomes.count("conflict")}')
+            self.stdout.write(f'Error database     : {outcomes.count(DB_ERROR)}')
+            self.stdout.write(f'Throughput         : {len(attempts) / elapsed:.1f} request/s')
+            self.stdout.write(f'Latensi p50 / p95  : {format_latency(latency for _, latency in results)}')
+
+            if double_booked:
+                self.stdout.write(self.style.ERROR(f'{double_booked} booking saling bertabrakan!'))
+            else:
+                self.stdout.write(self.style.SUCCESS('Tidak ada booking ganda.'))
+        finally:
+            Booking.objects.filter(user=user).delete()
+            Resource.objects.filter(pk__in=[r.pk for r in resources]).delete()
+            user.delete()
@@ -0,0 +1,43 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+from booking.services import SWEEP_BATCH_SIZE, archive_bookings, expire_pending_bookings
+
+
+class Command(BaseCommand):
+    help = 'Menandai booking PENDING yang kedaluwarsa sebagai EXPIRED dan mengarsipkan booking lama'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE, help='Jumlah baris per UPDATE/arsip')
+        parser.add_argument(
+            '--hold-minutes', type=int,
+            help='Juga kedaluwarsakan booking PENDING yang menunggu lebih lama dari ini (default: hanya yang waktu mulainya sudah lewat)',
+        )
+        parser.add_argument('--archive-after-days', type=int, default=90, help='Arsipkan booking yang selesai lebih dari N hari lalu')
+        parser.add_argument('--no-archive', action='store_true', help='Lewati pengarsipan')
+        parser.add_argument('--interval', type=int, help='Jalan terus dan ulangi setiap N detik (scheduler di dalam proses)')
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options)
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
+            close_old_connections()
+
+    def sweep(self, options):
+        started = time.perf_counter()
+        hold = timedelta(minutes=options['hold_minutes']) if options['hold_minutes'] is not None else None
+        expired = expire_pending_bookings(hold=hold, batch_size=options['batch_size'])
+
+        archived = 0
+        if not options['no_archive']:
+            before = timezone.now() - timedelta(days=options['archive_after_days'])
+            archived = archive_bookings(before, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{expired} booking kedaluwarsa, {archived} booking diarsipkan '
+            f'dalam {time.perf_counter() - started:.2f}s.'
+        ))
@@ -0,0 +1,57 @@
+from django.db import migrations
+
+CONSTRAINT = "booking_booking_no_overlap"
+
+
+def add_exclusion_constraint(apps, schema_editor):
+    """
+    Postgres: tidak boleh ada dua booking aktif di resource yang sama dengan
+    rentang waktu [start, end) yang beririsan. Backend lain tidak punya
+    exclusion constraint dan mengandalkan lock di booking.services.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT a.id, b.id FROM booking_booking a
+            JOIN booking_booking b
+              ON a.resource_id = b.resource_id AND a.id < b.id
+             AND a.start_time < b.end_time AND b.start_time < a.end_time
+            WHERE a.status IN ('pending', 'confirmed') AND b.status IN ('pending', 'confirmed')
+            LIMIT 20
+            """
+        )
+        overlaps = cursor.fetchall()
+        if overlaps:
+            pairs = ", ".join(f"{a}/{b}" for a, b in overlaps)
+            raise RuntimeError(
+                f"Ada booking aktif yang saling bertabrakan, batalkan salah satunya dulu: {pairs}"
+            )
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    schema_editor.execute(
+        f"""
+        ALTER TABLE booking_booking ADD CONSTRAINT {CONSTRAINT}
+        EXCLUDE USING gist (
+            resource_id WITH =,
+            tstzrange(start_time, end_time, '[)') WITH &&
+        ) WHERE (status IN ('pending', 'confirmed'))
+        """
+    )
+
+
+def drop_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"ALTER TABLE booking_booking DROP CONSTRAINT IF EXISTS {CONSTRAINT}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_exclusion_constraint, drop_exclusion_constraint),
+    ]
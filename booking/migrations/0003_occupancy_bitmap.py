@@ -0,0 +1,82 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:25
+
+import math
+from datetime import datetime, time as dtime, timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Salinan beku dari booking.services saat migrasi ini dibuat: 96 slot 15 menit
+# per hari lokal, bit ke-i = slot ke-i, disimpan 12 byte little-endian.
+ACTIVE_STATUSES = ('pending', 'confirmed')
+SLOT_SECONDS = 15 * 60
+DAY_SLOTS = 24 * 60 * 60 // SLOT_SECONDS
+DAY_BYTES = DAY_SLOTS // 8
+
+
+def _day_masks(start, end, tz):
+    masks = {}
+    day = timezone.localtime(start, tz).date()
+    last_day = timezone.localtime(end, tz).date()
+    while day <= last_day:
+        midnight = timezone.make_aware(datetime.combine(day, dtime.min), tz)
+        first = max(0, math.floor((start - midnight).total_seconds()) // SLOT_SECONDS)
+        last = min(DAY_SLOTS, -(-math.ceil((end - midnight).total_seconds()) // SLOT_SECONDS))
+        if first < last:
+            masks[day] = ((1 << last) - 1) ^ ((1 << first) - 1)
+        day += timedelta(days=1)
+    return masks
+
+
+def build_occupancy(apps, schema_editor):
+    """Bangun bitmap okupansi dari booking aktif yang sudah ada."""
+    Booking = apps.get_model('booking', 'Booking')
+    ResourceDayOccupancy = apps.get_model('booking', 'ResourceDayOccupancy')
+    tz = timezone.get_default_timezone()
+    masks = {}
+    rows = Booking.objects.filter(status__in=ACTIVE_STATUSES).values_list('resource_id', 'start_time', 'end_time')
+    for resource_id, start, end in rows.iterator():
+        for day, mask in _day_masks(start, end, tz).items():
+            masks[resource_id, day] = masks.get((resource_id, day), 0) | mask
+    ResourceDayOccupancy.objects.bulk_create(
+        [
+            ResourceDayOccupancy(resource_id=resource_id, day=day, bits=mask.to_bytes(DAY_BYTES, 'little'))
+            for (resource_id, day), mask in masks.items()
+        ],
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0002_booking_no_overlap'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceDayOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('bits', models.BinaryField(max_length=12)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['resource', 'status', 'start_time'], name='booking_res_status_start'),
+        ),
+        migrations.AddField(
+            model_name='resourcedayoccupancy',
+            name='resource',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='booking.resource'),
+        ),
+        migrations.AddConstraint(
+            model_name='resourcedayoccupancy',
+            constraint=models.UniqueConstraint(fields=('resource', 'day'), name='booking_occupancy_resource_day'),
+        ),
+        migrations.RunPython(build_occupancy, migrations.RunPython.noop),
+    ]
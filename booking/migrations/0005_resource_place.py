@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_resources_to_spots(apps, schema_editor):
+    """Hubungkan resource lama ke spot yang namanya sama persis (tanpa beda huruf besar/kecil) dan tidak ambigu."""
+    from home.utils.spots_loader import load_all_spots
+
+    FitnessSpot = apps.get_model('home', 'FitnessSpot')
+    Resource = apps.get_model('booking', 'Resource')
+
+    by_name = {}
+    spots = [(s['name'], s['place_id']) for s in load_all_spots()]
+    spots += list(FitnessSpot.objects.values_list('name', 'place_id'))
+    for name, place_id in spots:
+        by_name.setdefault(name.strip().lower(), set()).add(place_id)
+
+    for resource in Resource.objects.filter(place__isnull=True):
+        for name in (resource.location_name, resource.name):
+            place_ids = by_name.get((name or '').strip().lower())
+            if place_ids and len(place_ids) == 1:
+                resource.place_id = place_ids.pop()
+                resource.save(update_fields=['place'])
+                break
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0004_booking_list_indexes'),
+        ('home', '0002_placetype_alter_fitnessspot_rating_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resource',
+            name='place',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='resources', to='home.fitnessspot'),
+        ),
+        migrations.RunPython(link_resources_to_spots, migrations.RunPython.noop),
+    ]
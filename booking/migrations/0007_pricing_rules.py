@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_booking_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DurationDiscount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_minutes', models.PositiveIntegerField()),
+                ('percent_off', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('is_active', models.BooleanField(default=True)),
+                ('resource', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='duration_discounts', to='booking.resource')),
+            ],
+            options={
+                'ordering': ['min_minutes'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PriceRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('weekdays', models.CharField(blank=True, help_text='Kode hari dipisah koma, mis. SA,SU. Kosong = setiap hari.', max_length=20)),
+                ('start_time', models.TimeField(blank=True, help_text='Kosong = sejak tengah malam.', null=True)),
+                ('end_time', models.TimeField(blank=True, help_text='Kosong = sampai tengah malam.', null=True)),
+                ('rate', models.DecimalField(blank=True, decimal_places=2, help_text='Tarif per jam. Kosong = pakai price_per_hour resource.', max_digits=12, null=True)),
+                ('multiplier', models.DecimalField(decimal_places=3, default=1, max_digits=6)),
+                ('priority', models.IntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True)),
+                ('resource', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='price_rules', to='booking.resource')),
+            ],
+            options={
+                'ordering': ['priority', 'id'],
+            },
+        ),
+    ]
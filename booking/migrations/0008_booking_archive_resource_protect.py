@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0007_pricing_rules'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bookingarchive',
+            name='resource',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_bookings', to='booking.resource'),
+        ),
+    ]
@@ -1,6 +1,10 @@
 import uuid
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from home.models import FitnessSpot
 
 class Resource(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -10,6 +14,12 @@ class Resource(models.Model):
     is_active = models.BooleanField(default=True)
     slot_minutes = models.PositiveIntegerField(default=60)
     price_per_hour = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Place id Google dari spot di peta (FitnessSpot). Tanpa constraint database,
+    # karena spot di form booking bisa berasal dari file JSON yang belum diimpor.
+    place = models.ForeignKey(
+        FitnessSpot, null=True, blank=True, on_delete=models.DO_NOTHING,
+        db_constraint=False, related_name="resources",
+    )
 
     def __str__(self):
         if self.location_name:
@@ -34,3 +44,159 @@ class Booking(models.Model):
     status = models.CharField(max_length=10, choices=BookingStatus.choices, default=BookingStatus.PENDING)
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["resource", "status", "start_time"], name="booking_res_status_start"),
+            models.Index(fields=["user", "start_time"], name="booking_user_start"),
+            models.Index(fields=["status", "start_time"], name="booking_status_start"),
+        ]
+
+class ResourceDayOccupancy(models.Model):
+    """
+    Slot 15 menit yang terisi booking aktif untuk satu resource pada satu
+    tanggal lokal, disimpan sebagai bitmap 96 bit (12 byte, little-endian;
+    bit ke-i = slot yang mulai i*15 menit setelah tengah malam). Diperbarui
+    dalam transaksi yang sama dengan perubahan booking-nya, dan bisa
+    dibangun ulang dengan `manage.py rebuild_occupancy`.
+    """
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name="occupancy")
+    day = models.DateField()
+    bits = models.BinaryField(max_length=12)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["resource", "day"], name="booking_occupancy_resource_day"),
+        ]
+
+    @property
+    def mask(self):
+        return int.from_bytes(self.bits, "little")
+
+class PriceRule(models.Model):
+    """
+    Tarif per jam untuk jendela waktu tertentu (mis. jam sibuk). Aturan
+    tanpa resource berlaku untuk semua resource; bila beberapa aturan
+    mengenai slot yang sama, prioritas tertinggi menang, lalu aturan
+    khusus resource. Tarif slot = (`rate` atau `price_per_hour` resource)
+    dikali `multiplier`.
+    """
+    name = models.CharField(max_length=100)
+    resource = models.ForeignKey(
+        Resource, null=True, blank=True, on_delete=models.CASCADE, related_name="price_rules",
+    )
+    weekdays = models.CharField(
+        max_length=20, blank=True, help_text="Kode hari dipisah koma, mis. SA,SU. Kosong = setiap hari.",
+    )
+    start_time = models.TimeField(null=True, blank=True, help_text="Kosong = sejak tengah malam.")
+    end_time = models.TimeField(null=True, blank=True, help_text="Kosong = sampai tengah malam.")
+    rate = models.DecimalField(
+        max_digits=12, decimal_places=2, null=True, blank=True,
+        help_text="Tarif per jam. Kosong = pakai price_per_hour resource.",
+    )
+    multiplier = models.DecimalField(max_digits=6, decimal_places=3, default=1)
+    priority = models.IntegerField(default=0)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ["priority", "id"]
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        from .services import SLOT_MINUTES, WEEKDAY_CODES
+        codes = [code.strip().upper() for code in self.weekdays.split(",") if code.strip()]
+        if any(code not in WEEKDAY_CODES for code in codes):
+            raise ValidationError({"weekdays": f"Gunakan kode {', '.join(WEEKDAY_CODES)}."})
+        self.weekdays = ",".join(codes)
+        for field in ("start_time", "end_time"):
+            value = getattr(self, field)
+            if value is not None and (value.minute % SLOT_MINUTES or value.second or value.microsecond):
+                raise ValidationError({field: f"Harus kelipatan {SLOT_MINUTES} menit."})
+        if self.start_time and self.end_time and self.end_time <= self.start_time:
+            raise ValidationError({"end_time": "Harus setelah start_time."})
+
+class DurationDiscount(models.Model):
+    """Potongan persen untuk booking minimal `min_minutes`; yang terbesar yang berlaku dipakai."""
+    resource = models.ForeignKey(
+        Resource, null=True, blank=True, on_delete=models.CASCADE, related_name="duration_discounts",
+    )
+    min_minutes = models.PositiveIntegerField()
+    percent_off = models.DecimalField(max_digits=5, decimal_places=2)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ["min_minutes"]
+
+    def __str__(self):
+        return f"{self.percent_off}% >= {self.min_minutes} menit"
+
+    def clean(self):
+        if not 0 <= self.percent_off <= 100:
+            raise ValidationError({"percent_off": "Harus antara 0 dan 100."})
+
+RANGE_FIELDS = {"resource", "resource_id", "start_time", "end_time"}
+
+@receiver(pre_save, sender=Booking)
+def remember_booking_range(sender, instance, update_fields=None, **kwargs):
+    """
+    Catat resource dan rentang lama booking yang diubah (lewat jalur mana pun:
+    admin, shell, save() biasa), supaya hari-hari lamanya ikut dihitung ulang.
+    """
+    instance._previous_range = None
+    if instance._state.adding or (update_fields is not None and not RANGE_FIELDS & set(update_fields)):
+        return
+    instance._previous_range = (
+        Booking.objects.filter(pk=instance.pk).values_list("resource_id", "start_time", "end_time").first()
+    )
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_booking_availability(sender, instance, **kwargs):
+    """Booking dibuat, diubah, dibatalkan atau dihapus, jadi bitmap hari-harinya dan cache ketersediaannya sudah basi."""
+    from .services import booking_day_masks, booking_days_changed
+    previous = instance.__dict__.pop("_previous_range", None)
+    if previous is not None:
+        resource_id, start, end = previous
+        booking_days_changed(resource_id, booking_day_masks(start, end))
+    booking_days_changed(instance.resource_id, booking_day_masks(instance.start_time, instance.end_time))
+
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+def invalidate_resource_refs_on_change(sender, instance, **kwargs):
+    """Nama atau place id resource berubah, jadi hasil resolusi di cache sudah basi."""
+    from .services import invalidate_resource_refs
+    invalidate_resource_refs()
+
+@receiver(post_save, sender=PriceRule)
+@receiver(post_delete, sender=PriceRule)
+@receiver(post_save, sender=DurationDiscount)
+@receiver(post_delete, sender=DurationDiscount)
+def invalidate_pricing_on_change(sender, instance, **kwargs):
+    """Aturan harga berubah, jadi tabel tarif yang sudah dikompilasi sudah basi."""
+    from .services import invalidate_pricing
+    invalidate_pricing()
+
+class BookingArchive(models.Model):
+    """
+    Booking lama yang sudah selesai, dipindahkan dari tabel Booking oleh
+    `manage.py sweep_bookings` supaya tabel utama tetap kecil. Kolomnya
+    sama dengan Booking, ditambah waktu pengarsipan.
+    """
+    id = models.UUIDField(primary_key=True, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="archived_bookings")
+    # PROTECT seperti Booking.resource: menghapus resource tidak boleh diam-diam menghapus riwayatnya.
+    resource = models.ForeignKey(Resource, on_delete=models.PROTECT, related_name="archived_bookings")
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    status = models.CharField(max_length=10, choices=BookingStatus.choices)
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "start_time"], name="booking_archive_user_start"),
+        ]
@@ -3,6 +3,7 @@ from uuid import UUID
 from django.utils import timezone
 from rest_framework import serializers
 from .models import Resource, Booking, BookingStatus
+from .services import BookingConflict, quote_price, write_booking
 
 def _is_uuid(v: str) -> bool:
     try:
@@ -53,13 +54,17 @@ class BookingCreateSerializer(serializers.Serializer):
         if timezone.is_naive(start): start = timezone.make_aware(start, tz)
         if timezone.is_naive(end):   end   = timezone.make_aware(end, tz)
 
-        price = validated.get('price', res.price_per_hour if hasattr(res, 'price_per_hour') else 100)
+        # Harga eksplisit tetap dihormati; selain itu pakai mesin harga yang sama dengan view booking.
+        price = validated.get('price')
+        if price is None:
+            price = quote_price(res, start, end, tz)
 
-        return Booking.objects.create(
-            user=user,
-            resource=res,
-            start_time=start,
-            end_time=end,
-            status=BookingStatus.CONFIRMED,
-            price=price,  
-        )
+        try:
+            return write_booking(
+                res.pk, start, end,
+                user=user,
+                status=BookingStatus.CONFIRMED,
+                price=price,
+            )
+        except BookingConflict:
+            raise serializers.ValidationError('time conflict')
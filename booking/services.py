@@ -1,25 +1,870 @@
-from django.db import transaction
+import gzip
+import hashlib
+import heapq
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta, time as dtime
+from decimal import ROUND_HALF_UP, Decimal
+from uuid import UUID
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, F, OuterRef, Q
 from django.utils import timezone
-from .models import Booking, BookingStatus, Resource
+from functools import lru_cache
+from home.utils.db import lock_for_write
+from home.utils.spots_loader import GRID_CELL_SIZE_DEG, load_all_spots
+from .models import (
+    Booking, BookingArchive, BookingStatus, DurationDiscount, PriceRule, Resource, ResourceDayOccupancy,
+)
 
-@transaction.atomic
-def create_booking(user, resource_id, start, end, price):
-    res = Resource.objects.select_for_update().get(pk=resource_id, is_active=True)
+ACTIVE_STATUSES = (BookingStatus.PENDING, BookingStatus.CONFIRMED)
+
+OPEN_TIME = dtime(10, 0)
+CLOSE_TIME = dtime(20, 0)
+SLOT_MINUTES = 15
+SLOT_SECONDS = SLOT_MINUTES * 60
+
+AVAILABILITY_CACHE_TIMEOUT = 60 * 60
+
+# Nama exclusion constraint Postgres (lihat migrasi 0002).
+NO_OVERLAP_CONSTRAINT = "booking_booking_no_overlap"
+
+# Lock per resource untuk SQLite, yang tidak punya exclusion constraint
+# maupun row lock. Lock dibagi ke sejumlah tetap "stripe" supaya jumlahnya
+# tidak bertambah terus mengikuti jumlah resource.
+_RESOURCE_LOCKS = [threading.Lock() for _ in range(64)]
+
+class BookingConflict(ValueError):
+    """Rentang waktu bertabrakan dengan booking aktif lain di resource yang sama."""
+
+class BookingNotEditable(ValueError):
+    """Booking yang dipindah sudah tidak aktif atau sudah dimulai."""
+
+@contextmanager
+def resource_write_lock(resource_id):
+    """
+    Transaksi yang diserialkan per resource. Di Postgres baris Resource
+    dikunci dengan SELECT ... FOR UPDATE; di SQLite dipakai lock per
+    resource di proses ini, dan antar-proses transaksi ini memegang lock
+    tulis database sejak statement pertamanya (lihat lock_for_write).
+    """
+    if connection.vendor == "sqlite":
+        with _RESOURCE_LOCKS[hash(str(resource_id)) % len(_RESOURCE_LOCKS)], transaction.atomic():
+            lock_for_write(Resource.objects.filter(pk=resource_id))
+            yield
+    else:
+        with transaction.atomic():
+            lock_for_write(Resource.objects.filter(pk=resource_id))
+            yield
+
+def write_booking(resource_id, start, end, booking=None, **fields):
+    """
+    Satu-satunya jalur tulis booking: membuat booking baru, atau memindahkan
+    `booking` ke rentang baru. Pengecekan bentrok dan penyimpanan terjadi di
+    bawah lock resource yang sama, dan di Postgres exclusion constraint
+    menjadi jaminan terakhir. Melempar BookingConflict bila slot terisi,
+    atau BookingNotEditable bila `booking` sudah tidak aktif atau sudah dimulai.
+    """
     if end <= start:
         raise ValueError("Range waktu tidak valid.")
+
+    with resource_write_lock(resource_id):
+        if booking is not None:
+            # Baca ulang di bawah lock (Postgres: SELECT ... FOR UPDATE) supaya
+            # pembatalan yang terjadi bersamaan tidak ditimpa pemindahan ini.
+            lock_for_write(Booking.objects.filter(pk=booking.pk))
+            booking.refresh_from_db(fields=["status", "start_time", "end_time"])
+            if booking.status not in ACTIVE_STATUSES or booking.start_time <= timezone.now():
+                raise BookingNotEditable("Booking tidak bisa diubah.")
+        status = fields.get("status", booking.status if booking else BookingStatus.PENDING)
+
+        # Bentrok selalu dicek dengan query rentang yang persis: bitmap okupansi
+        # hanya turunan untuk bacaan ketersediaan dan bisa tertinggal dari tabel
+        # booking (mis. perubahan lewat admin atau update massal).
+        if status in ACTIVE_STATUSES:
+            clash = Booking.objects.filter(
+                resource_id=resource_id,
+                status__in=ACTIVE_STATUSES,
+                start_time__lt=end,
+                end_time__gt=start,
+            )
+            if booking is not None:
+                clash = clash.exclude(pk=booking.pk)
+            if clash.exists():
+                raise BookingConflict("Slot sudah terisi.")
+
+        try:
+            with transaction.atomic():
+                if booking is None:
+                    return Booking.objects.create(resource_id=resource_id, start_time=start, end_time=end, **fields)
+                # Signal pre_save/post_save menghitung ulang hari lama dan hari baru.
+                booking.start_time, booking.end_time = start, end
+                for name, value in fields.items():
+                    setattr(booking, name, value)
+                booking.save(update_fields=["start_time", "end_time", *fields])
+                return booking
+        except IntegrityError as e:
+            if NO_OVERLAP_CONSTRAINT in str(e):
+                raise BookingConflict("Slot sudah terisi.") from e
+            raise
+
+def create_booking(user, resource_id, start, end, price):
+    res = Resource.objects.get(pk=resource_id, is_active=True)
     if start <= timezone.now():
         raise ValueError("Waktu mulai sudah lewat, pilih waktu lain.")
+    return write_booking(
+        res.pk, start, end,
+        user=user, price=price, status=BookingStatus.CONFIRMED,
+    )
+
+def opening_hours(day, tz=None):
+    """Jam buka (aware) untuk satu tanggal di zona waktu lokal."""
+    tz = tz or timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(day, OPEN_TIME), tz),
+        timezone.make_aware(datetime.combine(day, CLOSE_TIME), tz),
+    )
+
+SLOTS_PER_DAY = (
+    (CLOSE_TIME.hour * 60 + CLOSE_TIME.minute) - (OPEN_TIME.hour * 60 + OPEN_TIME.minute)
+) // SLOT_MINUTES
+FULL_DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+
+# Bitmap okupansi mencakup satu hari penuh sejak tengah malam (96 slot);
+# slot jam buka adalah bit OPEN_SLOT .. OPEN_SLOT + SLOTS_PER_DAY - 1.
+DAY_SLOTS = 24 * 60 // SLOT_MINUTES
+DAY_BYTES = DAY_SLOTS // 8
+OPEN_SLOT = (OPEN_TIME.hour * 60 + OPEN_TIME.minute) // SLOT_MINUTES
+
+def slot_mask(start_seconds, end_seconds, slots=SLOTS_PER_DAY):
+    """Bitmask slot yang bersinggungan dengan [start, end) (detik sejak slot 0). Bit ke-i = slot ke-i."""
+    first = max(0, start_seconds // SLOT_SECONDS)
+    last = min(slots, -(-end_seconds // SLOT_SECONDS))
+    if first >= last:
+        return 0
+    return ((1 << last) - 1) ^ ((1 << first) - 1)
+
+def mask_intervals(mask):
+    """Deretan bit menyala yang berurutan sebagai interval (start, end) dalam detik sejak slot 0."""
+    intervals = []
+    index = 0
+    while mask:
+        if mask & 1:
+            run = (~mask & (mask + 1)).bit_length() - 1
+            intervals.append((index * SLOT_SECONDS, (index + run) * SLOT_SECONDS))
+            mask >>= run
+            index += run
+        else:
+            skip = (mask & -mask).bit_length() - 1
+            mask >>= skip
+            index += skip
+    return intervals
+
+def booking_day_masks(start, end, tz=None):
+    """{tanggal lokal: bitmap 96 slot} yang terisi oleh rentang [start, end)."""
+    tz = tz or timezone.get_current_timezone()
+    masks = {}
+    day = timezone.localtime(start, tz).date()
+    last_day = timezone.localtime(end, tz).date()
+    while day <= last_day:
+        midnight = timezone.make_aware(datetime.combine(day, dtime.min), tz)
+        mask = slot_mask(
+            math.floor((start - midnight).total_seconds()),
+            math.ceil((end - midnight).total_seconds()),
+            DAY_SLOTS,
+        )
+        if mask:
+            masks[day] = mask
+        day += timedelta(days=1)
+    return masks
 
-    conflict = Booking.objects.select_for_update().filter(
-        resource=res,
-        status__in=[BookingStatus.PENDING, BookingStatus.CONFIRMED],
-        start_time__lt=end,
-        end_time__gt=start,
-    ).exists()
-    if conflict:
-        raise ValueError("Slot sudah terisi.")
-
-    return Booking.objects.create(
-        user=user, resource=res, start_time=start, end_time=end,
-        price=price, status=BookingStatus.CONFIRMED
+def occupancy_bits(resource_ids, first_day, last_day):
+    """Bitmap okupansi {(resource_id, tanggal): int} dengan satu query. Hari tanpa baris berarti kosong."""
+    rows = ResourceDayOccupancy.objects.filter(
+        resource_id__in=list(resource_ids), day__range=(first_day, last_day),
+    ).values_list("resource_id", "day", "bits")
+    return {(rid, day): int.from_bytes(bits, "little") for rid, day, bits in rows}
+
+def compute_occupancy(resource_id, days, tz=None):
+    """Bitmap okupansi hari-hari itu, dihitung langsung dari tabel Booking."""
+    tz = tz or timezone.get_current_timezone()
+    masks = dict.fromkeys(days, 0)
+    if not masks:
+        return masks
+    rows = Booking.objects.filter(
+        resource_id=resource_id,
+        status__in=ACTIVE_STATUSES,
+        start_time__lt=timezone.make_aware(datetime.combine(max(masks) + timedelta(days=1), dtime.min), tz),
+        end_time__gt=timezone.make_aware(datetime.combine(min(masks), dtime.min), tz),
+    ).values_list("start_time", "end_time")
+    for start, end in rows:
+        for day, mask in booking_day_masks(start, end, tz).items():
+            if day in masks:
+                masks[day] |= mask
+    return masks
+
+def store_occupancy(resource_id, masks):
+    ResourceDayOccupancy.objects.bulk_create(
+        [
+            ResourceDayOccupancy(resource_id=resource_id, day=day, bits=mask.to_bytes(DAY_BYTES, "little"))
+            for day, mask in masks.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["resource", "day"],
+        update_fields=["bits"],
     )
+
+def refresh_occupancy(resource_id, days):
+    """Hitung ulang dan simpan bitmap okupansi hari-hari itu. Dipanggil di transaksi yang mengubah booking."""
+    store_occupancy(resource_id, compute_occupancy(resource_id, days))
+
+def _availability_version(resource_id):
+    return cache.get_or_set(f"booking_availability_version_{resource_id}", time.time_ns, None)
+
+def invalidate_availability(resource_id):
+    """Buang semua ketersediaan resource ini dari cache. Dipanggil setiap kali booking-nya berubah."""
+    cache.set(f"booking_availability_version_{resource_id}", time.time_ns(), None)
+
+# resource_id -> hari yang bitmap-nya basi, selama blok batched_occupancy_refresh.
+_OCCUPANCY_BATCH = ContextVar("booking_occupancy_batch", default=None)
+
+def booking_days_changed(resource_id, days):
+    """
+    Bitmap dan cache ketersediaan hari-hari itu basi (dipanggil signal Booking).
+    Dihitung ulang langsung, atau sekali di akhir batched_occupancy_refresh.
+    """
+    batch = _OCCUPANCY_BATCH.get()
+    if batch is not None:
+        batch.setdefault(resource_id, set()).update(days)
+        return
+    refresh_occupancy(resource_id, days)
+    invalidate_availability(resource_id)
+
+@contextmanager
+def batched_occupancy_refresh():
+    """
+    Kumpulkan perubahan booking dari signal selama blok ini, lalu hitung ulang
+    bitmap sekali per resource saat blok selesai, bukan sekali per baris.
+    Menghasilkan dict resource_id -> hari yang tersentuh.
+    """
+    touched = {}
+    token = _OCCUPANCY_BATCH.set(touched)
+    try:
+        yield touched
+    finally:
+        _OCCUPANCY_BATCH.reset(token)
+    for resource_id, days in touched.items():
+        refresh_occupancy(resource_id, days)
+        invalidate_availability(resource_id)
+
+def day_availability(resource_id, day):
+    """
+    Ketersediaan satu resource untuk satu hari: interval sibuk di jam buka
+    (detik sejak jam buka) beserta slot kosongnya, dibaca dari bitmap
+    okupansi. Hasilnya di-cache per (resource, tanggal) sampai ada booking
+    resource itu yang berubah.
+    """
+    open_start, _ = opening_hours(day)
+    if resource_id is None:
+        busy_mask = 0
+    else:
+        key = f"booking_availability_{resource_id}_{day.isoformat()}"
+        version = _availability_version(resource_id)
+        cached = cache.get(key, version=version)
+        if cached is not None:
+            return cached
+        busy_mask = (occupancy_bits([resource_id], day, day).get((resource_id, day), 0) >> OPEN_SLOT) & FULL_DAY_MASK
+
+    step = timedelta(seconds=SLOT_SECONDS)
+    slots = []
+    for index in range(SLOTS_PER_DAY):
+        if not busy_mask >> index & 1:
+            slot_start = open_start + index * step
+            slots.append({"start": slot_start.isoformat(), "end": (slot_start + step).isoformat()})
+
+    result = {"busy": mask_intervals(busy_mask), "slots": slots}
+    if resource_id is not None:
+        cache.set(key, result, AVAILABILITY_CACHE_TIMEOUT, version=version)
+    return result
+
+def availability_bitmaps(resource_ids, first_day, last_day):
+    """
+    Bitmap slot kosong untuk banyak resource dan banyak hari sekaligus,
+    {resource_id: {tanggal: int}}, diambil dari bitmap okupansi dengan satu
+    query lalu digeser ke jendela jam buka.
+    """
+    days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+    occupied = occupancy_bits(resource_ids, first_day, last_day)
+    return {
+        rid: {day: FULL_DAY_MASK & ~(occupied.get((rid, day), 0) >> OPEN_SLOT) for day in days}
+        for rid in resource_ids
+    }
+
+def overlapping_bookings(queryset=None):
+    """Booking aktif yang beririsan dengan booking aktif lain di resource yang sama. Seharusnya selalu kosong."""
+    queryset = Booking.objects.all() if queryset is None else queryset
+    others = Booking.objects.filter(
+        resource=OuterRef("resource"),
+        status__in=ACTIVE_STATUSES,
+        start_time__lt=OuterRef("end_time"),
+        end_time__gt=OuterRef("start_time"),
+    ).exclude(pk=OuterRef("pk"))
+    return queryset.filter(status__in=ACTIVE_STATUSES).filter(Exists(others))
+
+BOOKING_PAGE_SIZE = 50
+BOOKING_MAX_PAGE_SIZE = 200
+
+def filter_bookings(queryset, params):
+    """
+    Terapkan filter daftar booking dari query string: status (boleh
+    dipisah koma), from/to (tanggal lokal start_time, inklusif) dan
+    resource. Melempar ValueError untuk nilai yang tidak valid.
+    """
+    statuses = [s for s in (params.get("status") or "").split(",") if s]
+    if statuses:
+        if not set(statuses) <= set(BookingStatus.values):
+            raise ValueError("bad status")
+        queryset = queryset.filter(status__in=statuses)
+
+    tz = timezone.get_current_timezone()
+    if params.get("from"):
+        day = date.fromisoformat(params["from"])
+        queryset = queryset.filter(start_time__gte=timezone.make_aware(datetime.combine(day, dtime.min), tz))
+    if params.get("to"):
+        day = date.fromisoformat(params["to"]) + timedelta(days=1)
+        queryset = queryset.filter(start_time__lt=timezone.make_aware(datetime.combine(day, dtime.min), tz))
+    if params.get("resource"):
+        queryset = queryset.filter(resource_id=UUID(params["resource"]))
+    return queryset
+
+RESOURCE_REF_CACHE_TIMEOUT = 24 * 60 * 60
+
+@lru_cache(maxsize=1)
+def _known_place_ids():
+    return frozenset(spot["place_id"] for spot in load_all_spots())
+
+def is_known_place_id(value):
+    """True bila `value` adalah place id spot yang ada di data spot."""
+    return bool(value) and value in _known_place_ids()
+
+def _resource_ref_version():
+    return cache.get_or_set("booking_resource_ref_version", time.time_ns, None)
+
+def invalidate_resource_refs():
+    """Buang semua hasil resolusi place id/label -> resource dari cache."""
+    cache.set("booking_resource_ref_version", time.time_ns(), None)
+
+def lookup_resource_id(rid, label=None):
+    """
+    Cari resource untuk `rid` (UUID, place id, atau nama) lalu `label`,
+    dengan urutan yang sama seperti form booking dulu. Resource yang
+    ditemukan lewat nama dan belum punya place id dihubungkan ke spot
+    `rid`, supaya pencarian berikutnya cukup lewat indeks place_id; hanya
+    bila nama itu cocok dengan tepat satu resource, karena nama tidak unik.
+    """
+    qs = Resource.objects.all()
+    if rid:
+        try:
+            pk = UUID(str(rid))
+        except ValueError:
+            pk = None
+        if pk is not None and qs.filter(pk=pk).exists():
+            return pk
+        found = qs.filter(place_id=rid).values_list("pk", flat=True).first()
+        if found is not None:
+            return found
+
+    for name in (rid, label):
+        if not name:
+            continue
+        matches = list(
+            qs.filter(Q(location_name__iexact=name) | Q(name__iexact=name))
+            .order_by("pk")
+            .values_list("pk", "place_id")[:2]
+        )
+        if matches:
+            pk, place_id = matches[0]
+            if len(matches) == 1 and place_id is None and is_known_place_id(rid):
+                Resource.objects.filter(pk=pk, place_id__isnull=True).update(place_id=rid)
+            return pk
+    return None
+
+def resolve_resource_id(rid, label=None):
+    """Versi ber-cache dari `lookup_resource_id`. Hanya hasil yang ditemukan yang di-cache."""
+    if not rid and not label:
+        return None
+    digest = hashlib.md5(f"{rid}\x00{label or ''}".encode()).hexdigest()
+    key = f"booking_resource_ref_{digest}"
+    version = _resource_ref_version()
+    pk = cache.get(key, version=version)
+    if pk is None:
+        pk = lookup_resource_id(rid, label)
+        if pk is not None:
+            cache.set(key, pk, RESOURCE_REF_CACHE_TIMEOUT, version=version)
+    return pk
+
+# Indeks spot untuk halaman booking. Data spot berasal dari file statis
+# (lihat home.utils.spots_loader), jadi indeks cukup dibangun sekali per
+# proses: baris ringkas terurut nama, nama lowercase untuk pencarian, sel
+# grid untuk query viewport/terdekat, serta JSON dan gzip-nya yang sudah jadi.
+SPOT_FIELDS = ("place_id", "name", "latitude", "longitude")
+SPOT_CELL_DEG = GRID_CELL_SIZE_DEG
+SPOT_BOOTSTRAP_SIZE = 15
+SPOT_SEARCH_LIMIT = 20
+SPOT_MAX_RESULTS = 200
+KM_PER_DEG = 111.195
+
+def _spot_cell(lat, lng):
+    return math.floor(lat / SPOT_CELL_DEG), math.floor(lng / SPOT_CELL_DEG)
+
+def _distance_km(lat1, lng1, lat2, lng2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    h = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+def _ring_cells(row, col, ring):
+    """Sel grid yang berjarak tepat `ring` sel (Chebyshev) dari (row, col)."""
+    if ring == 0:
+        yield row, col
+        return
+    for c in range(col - ring, col + ring + 1):
+        yield row - ring, c
+        yield row + ring, c
+    for r in range(row - ring + 1, row + ring):
+        yield r, col - ring
+        yield r, col + ring
+
+@lru_cache(maxsize=1)
+def spot_index():
+    """
+    Bangun indeks spot: `rows` berisi tuple (place_id, name, lat, lng)
+    terurut nama, `cells` memetakan sel grid -> posisi baris, dan `json`/
+    `gzip`/`etag` adalah payload penuh yang siap dikirim apa adanya.
+    """
+    rows = sorted(
+        (
+            (s["place_id"], s["name"], round(s["latitude"], 6), round(s["longitude"], 6))
+            for s in load_all_spots()
+        ),
+        key=lambda row: row[1].casefold(),
+    )
+    cells = {}
+    for i, row in enumerate(rows):
+        cells.setdefault(_spot_cell(row[2], row[3]), []).append(i)
+    bounds = None
+    if rows:
+        lats = [row[2] for row in rows]
+        lngs = [row[3] for row in rows]
+        bounds = {"north": max(lats), "south": min(lats), "east": max(lngs), "west": min(lngs)}
+    body = json.dumps(
+        {"fields": SPOT_FIELDS, "spots": rows}, ensure_ascii=False, separators=(",", ":"),
+    ).encode()
+    return {
+        "rows": rows,
+        "names": [row[1].casefold() for row in rows],
+        "cells": cells,
+        "bounds": bounds,
+        "json": body,
+        "gzip": gzip.compress(body, 6),
+        "etag": f'"{hashlib.md5(body).hexdigest()}"',
+    }
+
+def invalidate_spot_index():
+    """Bangun ulang indeks pada akses berikutnya (mis. setelah file spot diperbarui)."""
+    load_all_spots.cache_clear()
+    spot_index.cache_clear()
+    _known_place_ids.cache_clear()
+
+def spot_bootstrap():
+    """Payload kecil untuk halaman booking: jumlah spot, batas peta, dan beberapa spot pertama."""
+    index = spot_index()
+    return {
+        "total": len(index["rows"]),
+        "bounds": index["bounds"],
+        "etag": index["etag"],
+        "initial": index["rows"][:SPOT_BOOTSTRAP_SIZE],
+    }
+
+def search_spots(query, limit=SPOT_SEARCH_LIMIT):
+    """Spot yang namanya mengandung `query`; yang diawali `query` didahulukan."""
+    q = (query or "").strip().casefold()
+    if not q:
+        return []
+    index = spot_index()
+    prefix, contains = [], []
+    for i, name in enumerate(index["names"]):
+        if name.startswith(q):
+            prefix.append(i)
+            if len(prefix) >= limit:
+                break
+        elif len(contains) < limit and q in name:
+            contains.append(i)
+    return [index["rows"][i] for i in (prefix + contains)[:limit]]
+
+def viewport_spots(south, west, north, east, limit=SPOT_MAX_RESULTS):
+    """
+    Spot di dalam kotak (south, west, north, east), diurutkan nama.
+    Hanya sel grid yang beririsan dengan kotak yang diperiksa. Kembalikan
+    (rows, truncated).
+    """
+    if south > north or west > east:
+        raise ValueError("bounding box tidak valid")
+    index = spot_index()
+    row0, col0 = _spot_cell(south, west)
+    row1, col1 = _spot_cell(north, east)
+    if (row1 - row0 + 1) * (col1 - col0 + 1) > len(index["cells"]):
+        keys = [key for key in index["cells"] if row0 <= key[0] <= row1 and col0 <= key[1] <= col1]
+    else:
+        keys = [(r, c) for r in range(row0, row1 + 1) for c in range(col0, col1 + 1)]
+    rows = index["rows"]
+    hits = sorted(
+        i for key in keys for i in index["cells"].get(key, ())
+        if south <= rows[i][2] <= north and west <= rows[i][3] <= east
+    )
+    return [rows[i] for i in hits[:limit]], len(hits) > limit
+
+def nearest_spots(lat, lng, limit=SPOT_BOOTSTRAP_SIZE):
+    """
+    `limit` spot terdekat dari (lat, lng) beserta jaraknya dalam km.
+    Sel grid diperiksa per cincin dari sel titik asal; pencarian berhenti
+    begitu tidak ada sel di luar cincin yang bisa lebih dekat.
+    """
+    index = spot_index()
+    if not index["cells"] or limit <= 0:
+        return []
+    rows, cells = index["rows"], index["cells"]
+    origin_row, origin_col = _spot_cell(lat, lng)
+    max_ring = max(max(abs(r - origin_row), abs(c - origin_col)) for r, c in cells)
+    if (2 * max_ring + 1) ** 2 > 4 * len(rows):
+        # Titik asal jauh di luar area data: lebih murah menghitung semua baris.
+        nearest = heapq.nsmallest(limit, ((_distance_km(lat, lng, row[2], row[3]), i) for i, row in enumerate(rows)))
+        return [(rows[i], round(km, 2)) for km, i in nearest]
+    # Jarak minimum ke sel di luar cincin ke-n, dengan sumbu bujur yang lebih sempit.
+    ring_km = SPOT_CELL_DEG * KM_PER_DEG * min(1.0, math.cos(math.radians(abs(lat) + SPOT_CELL_DEG)))
+    found = []
+    for ring in range(max_ring + 1):
+        for key in _ring_cells(origin_row, origin_col, ring):
+            for i in cells.get(key, ()):
+                found.append((_distance_km(lat, lng, rows[i][2], rows[i][3]), i))
+        if len(found) >= limit:
+            found.sort()
+            del found[limit:]
+            if found[-1][0] <= ring * ring_km:
+                break
+    found.sort()
+    return [(rows[i], round(km, 2)) for km, i in found[:limit]]
+
+SWEEP_BATCH_SIZE = 500
+ARCHIVE_FIELDS = ["id", "user_id", "resource_id", "start_time", "end_time", "price", "status", "notes", "created_at"]
+
+def _refresh_after_bulk_change(rows):
+    """Perbarui bitmap dan cache untuk baris (resource_id, start, end) yang diubah lewat queryset.update()."""
+    days_by_resource = {}
+    for resource_id, start, end in rows:
+        days_by_resource.setdefault(resource_id, set()).update(booking_day_masks(start, end))
+    for resource_id, days in days_by_resource.items():
+        refresh_occupancy(resource_id, days)
+        invalidate_availability(resource_id)
+
+def expire_pending_bookings(now=None, hold=None, batch_size=SWEEP_BATCH_SIZE):
+    """
+    Ubah booking PENDING yang sudah lewat waktu mulainya (atau, bila `hold`
+    diberikan, yang menunggu lebih lama dari `hold`) menjadi EXPIRED,
+    per potongan `batch_size` baris. Mengembalikan jumlah booking yang diubah.
+    """
+    now = now or timezone.now()
+    overdue = Q(start_time__lte=now)
+    if hold is not None:
+        overdue |= Q(created_at__lte=now - hold)
+    pending = Booking.objects.filter(overdue, status=BookingStatus.PENDING)
+
+    expired = 0
+    while True:
+        with transaction.atomic():
+            rows = list(pending.order_by("pk").values_list("pk", "resource_id", "start_time", "end_time")[:batch_size])
+            if not rows:
+                return expired
+            # Status dicek ulang di UPDATE, jadi booking yang baru saja dikonfirmasi tidak ikut kedaluwarsa.
+            changed = Booking.objects.filter(
+                pk__in=[row[0] for row in rows], status=BookingStatus.PENDING,
+            ).update(status=BookingStatus.EXPIRED)
+            _refresh_after_bulk_change(row[1:] for row in rows)
+        expired += changed
+
+def archive_bookings(before, batch_size=SWEEP_BATCH_SIZE):
+    """
+    Pindahkan booking yang selesai sebelum `before` ke BookingArchive, per
+    potongan `batch_size` baris, lalu buang bitmap okupansi hari-hari yang
+    semua booking-nya sudah diarsipkan. Mengembalikan jumlah booking yang diarsipkan.
+    """
+    finished = Booking.objects.filter(end_time__lt=before).exclude(status=BookingStatus.PENDING)
+    tz = timezone.get_current_timezone()
+    archived = 0
+    while True:
+        with transaction.atomic():
+            rows = list(finished.order_by("pk").values_list(*ARCHIVE_FIELDS)[:batch_size])
+            if not rows:
+                return archived
+            BookingArchive.objects.bulk_create(
+                [BookingArchive(**dict(zip(ARCHIVE_FIELDS, row))) for row in rows],
+                ignore_conflicts=True,
+            )
+            # Signal post_delete hanya mencatat hari yang tersentuh; bitmap-nya
+            # dihitung ulang sekali per resource di akhir blok.
+            with batched_occupancy_refresh() as touched:
+                Booking.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            for resource_id, days in touched.items():
+                _drop_archived_days(resource_id, days, tz)
+        archived += len(rows)
+
+def _drop_archived_days(resource_id, days, tz):
+    """Hapus bitmap hari-hari `days` yang tidak lagi punya booking apa pun di resource ini."""
+    if not days:
+        return
+    remaining = Booking.objects.filter(
+        resource_id=resource_id,
+        start_time__lt=timezone.make_aware(datetime.combine(max(days) + timedelta(days=1), dtime.min), tz),
+        end_time__gt=timezone.make_aware(datetime.combine(min(days), dtime.min), tz),
+    ).values_list("start_time", "end_time")
+    busy = set()
+    for start, end in remaining:
+        busy.update(booking_day_masks(start, end, tz))
+    ResourceDayOccupancy.objects.filter(resource_id=resource_id, day__in=days - busy).delete()
+
+WEEKDAY_CODES = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+MAX_OCCURRENCES = 200
+
+def parse_weekly_rule(rule):
+    """
+    Baca subset RRULE mingguan, mis. "FREQ=WEEKLY;BYDAY=MO,TH;INTERVAL=1;COUNT=16"
+    atau "...;UNTIL=20260131". Mengembalikan dict byday/interval/count/until;
+    melempar ValueError untuk aturan yang tidak didukung.
+    """
+    parts = {}
+    for item in (rule or "").upper().replace("RRULE:", "").split(";"):
+        if not item:
+            continue
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"bagian RRULE tidak valid: {item}")
+        parts[key.strip()] = value.strip()
+
+    if parts.pop("FREQ", None) != "WEEKLY":
+        raise ValueError("hanya FREQ=WEEKLY yang didukung")
+    try:
+        byday = sorted({WEEKDAY_CODES[code] for code in parts.pop("BYDAY").split(",")})
+    except KeyError:
+        raise ValueError("BYDAY wajib diisi dengan MO,TU,WE,TH,FR,SA,SU")
+    interval = int(parts.pop("INTERVAL", "1"))
+    count = int(parts.pop("COUNT")) if "COUNT" in parts else None
+    until = datetime.strptime(parts.pop("UNTIL")[:8], "%Y%m%d").date() if "UNTIL" in parts else None
+    if parts:
+        raise ValueError(f"bagian RRULE tidak didukung: {', '.join(sorted(parts))}")
+    if interval < 1 or (count is None and until is None) or (count is not None and count < 1):
+        raise ValueError("INTERVAL harus >= 1 dan COUNT atau UNTIL wajib diisi")
+    return {"byday": byday, "interval": interval, "count": count, "until": until}
+
+def expand_weekly(first_day, start_time, duration, byday, interval=1, count=None, until=None, tz=None):
+    """
+    Daftar (start, end) aware untuk setiap kemunculan aturan mingguan,
+    dimulai dari minggu `first_day`, paling banyak MAX_OCCURRENCES.
+    """
+    tz = tz or timezone.get_current_timezone()
+    week_start = first_day - timedelta(days=first_day.weekday())
+    occurrences = []
+    while len(occurrences) < min(count or MAX_OCCURRENCES, MAX_OCCURRENCES):
+        for weekday in byday:
+            day = week_start + timedelta(days=weekday)
+            if day < first_day:
+                continue
+            if until is not None and day > until:
+                return occurrences
+            start = timezone.make_aware(datetime.combine(day, start_time), tz)
+            occurrences.append((start, start + duration))
+            if len(occurrences) >= min(count or MAX_OCCURRENCES, MAX_OCCURRENCES):
+                break
+        week_start += timedelta(weeks=interval)
+    return occurrences
+
+# Mesin harga. Aturan (PriceRule, DurationDiscount) dikompilasi per resource
+# menjadi tabel tarif 7 hari x 96 slot 15 menit beserta prefix sum-nya, jadi
+# harga rentang berapa pun cukup dihitung dari selisih prefix ditambah sisa
+# slot parsial di ujung. Tabel disimpan di memori proses dan dibuang saat
+# versi di cache berubah (invalidate_pricing) atau price_per_hour berubah.
+_PRICING = {}
+_PRICING_LOCK = threading.Lock()
+HOUR = Decimal(3600)
+CENT = Decimal("0.01")
+
+def _pricing_version():
+    return cache.get_or_set("booking_pricing_version", time.time_ns, None)
+
+def invalidate_pricing():
+    """Paksa semua tabel tarif dikompilasi ulang pada quote berikutnya."""
+    cache.set("booking_pricing_version", time.time_ns(), None)
+
+def _rule_slots(rule):
+    first = 0 if rule.start_time is None else (rule.start_time.hour * 60 + rule.start_time.minute) // SLOT_MINUTES
+    last = DAY_SLOTS if rule.end_time is None else (rule.end_time.hour * 60 + rule.end_time.minute) // SLOT_MINUTES
+    return range(first, last)
+
+def compile_pricing(resource):
+    """
+    Tabel tarif resource: `rates[hari][slot]` tarif per jam, `prefix[hari][n]`
+    jumlah harga slot 0..n-1, dan `discounts` berupa (min_minutes, persen)
+    terurut dari durasi terpanjang.
+    """
+    base = Decimal(resource.price_per_hour or 0)
+    rules = (
+        PriceRule.objects.filter(Q(resource__isnull=True) | Q(resource=resource.pk), is_active=True)
+        .order_by("priority", F("resource").asc(nulls_first=True), "id")
+    )
+    rates = [[base] * DAY_SLOTS for _ in range(7)]
+    # Urutan naik: aturan yang diproses belakangan (prioritas lebih tinggi) menimpa.
+    for rule in rules:
+        rate = (base if rule.rate is None else rule.rate) * rule.multiplier
+        codes = [code for code in rule.weekdays.split(",") if code]
+        weekdays = [WEEKDAY_CODES[code] for code in codes] if codes else range(7)
+        for weekday in weekdays:
+            for slot in _rule_slots(rule):
+                rates[weekday][slot] = rate
+
+    slot_share = Decimal(SLOT_SECONDS) / HOUR
+    prefix = []
+    for day_rates in rates:
+        sums = [Decimal(0)]
+        for rate in day_rates:
+            sums.append(sums[-1] + rate * slot_share)
+        prefix.append(sums)
+
+    discounts = list(
+        DurationDiscount.objects.filter(Q(resource__isnull=True) | Q(resource=resource.pk), is_active=True)
+        .order_by("-min_minutes", "-percent_off")
+        .values_list("min_minutes", "percent_off")
+    )
+    return {"rates": rates, "prefix": prefix, "discounts": discounts}
+
+def pricing_for(resource, version=None):
+    """Tabel tarif ber-cache untuk `resource` (dipakai bersama oleh quote dan booking)."""
+    version = _pricing_version() if version is None else version
+    key = (version, Decimal(resource.price_per_hour or 0))
+    entry = _PRICING.get(resource.pk)
+    if entry is None or entry[0] != key:
+        entry = (key, compile_pricing(resource))
+        with _PRICING_LOCK:
+            _PRICING[resource.pk] = entry
+    return entry[1]
+
+def _day_amount(compiled, weekday, from_s, to_s):
+    """Harga detik ke-`from_s` s.d. `to_s` sejak tengah malam pada satu hari."""
+    rates, prefix = compiled["rates"][weekday], compiled["prefix"][weekday]
+    first_slot = from_s // SLOT_SECONDS
+    if first_slot == (to_s - 1) // SLOT_SECONDS:
+        return rates[first_slot] * (to_s - from_s) / HOUR
+    first_full = -(-from_s // SLOT_SECONDS)
+    last_full = to_s // SLOT_SECONDS
+    amount = prefix[last_full] - prefix[first_full]
+    if from_s < first_full * SLOT_SECONDS:
+        amount += rates[first_slot] * (first_full * SLOT_SECONDS - from_s) / HOUR
+    if to_s > last_full * SLOT_SECONDS:
+        amount += rates[last_full] * (to_s - last_full * SLOT_SECONDS) / HOUR
+    return amount
+
+def quote_price(resource, start, end, tz=None, compiled=None):
+    """Harga booking `resource` untuk [start, end), sudah termasuk potongan durasi."""
+    if end <= start:
+        return Decimal("0.00")
+    tz = tz or timezone.get_current_timezone()
+    compiled = compiled or pricing_for(resource)
+    local_start, local_end = start.astimezone(tz), end.astimezone(tz)
+    amount = Decimal(0)
+    day = local_start.date()
+    while day <= local_end.date():
+        midnight = timezone.make_aware(datetime.combine(day, dtime.min), tz)
+        from_s = max(0, int((local_start - midnight).total_seconds()))
+        to_s = min(24 * 3600, int((local_end - midnight).total_seconds()))
+        if to_s > from_s:
+            amount += _day_amount(compiled, day.weekday(), from_s, to_s)
+        day += timedelta(days=1)
+
+    minutes = (end - start).total_seconds() / 60
+    for min_minutes, percent_off in compiled["discounts"]:
+        if minutes >= min_minutes:
+            amount -= amount * percent_off / 100
+            break
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+def quote_week(resource, first_day, duration, step_minutes=SLOT_MINUTES, days=7):
+    """
+    Harga setiap jam mulai (kelipatan `step_minutes` dalam jam buka) untuk
+    `days` hari sejak `first_day`, dengan durasi `duration`. Jam mulai yang
+    membuat booking melewati jam tutup bernilai None.
+    """
+    tz = timezone.get_current_timezone()
+    compiled = pricing_for(resource)
+    open_min = OPEN_TIME.hour * 60 + OPEN_TIME.minute
+    close_min = CLOSE_TIME.hour * 60 + CLOSE_TIME.minute
+    starts = list(range(open_min, close_min, step_minutes))
+    length = duration.total_seconds() / 60
+    grid = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        midnight = timezone.make_aware(datetime.combine(day, dtime.min), tz)
+        grid.append({
+            "date": day.isoformat(),
+            "prices": [
+                quote_price(resource, midnight + timedelta(minutes=m), midnight + timedelta(minutes=m) + duration, tz, compiled)
+                if m + length <= close_min else None
+                for m in starts
+            ],
+        })
+    return {
+        "start_times": [f"{m // 60:02d}:{m % 60:02d}" for m in starts],
+        "duration_minutes": int(length),
+        "days": grid,
+    }
+
+def book_recurring(resource, occurrences, **fields):
+    """
+    Booking banyak kemunculan sekaligus. Bentrok dicek dengan satu query
+    rentang untuk semua kemunculan, dan kemunculan yang bebas disimpan
+    dengan satu bulk_create.
+    Mengembalikan (booking yang dibuat, kemunculan yang bentrok).
+    """
+    occurrences = sorted(set(occurrences))
+    if not occurrences:
+        return [], []
+
+    compiled = pricing_for(resource)
+    with resource_write_lock(resource.pk):
+        tz = timezone.get_current_timezone()
+        ranges = Q()
+        for start, end in occurrences:
+            ranges |= Q(start_time__lt=end, end_time__gt=start)
+        taken = list(
+            Booking.objects.filter(ranges, resource=resource, status__in=ACTIVE_STATUSES)
+            .order_by("start_time")
+            .values_list("start_time", "end_time")
+        )
+
+        conflicts, free = [], []
+        for start, end in occurrences:
+            clash = any(t_start < end and t_end > start for t_start, t_end in taken)
+            (conflicts if clash else free).append((start, end))
+            if not clash:
+                # Kemunculan dalam satu seri juga tidak boleh saling tumpang tindih.
+                taken.append((start, end))
+
+        created = Booking.objects.bulk_create([
+            Booking(
+                resource=resource, start_time=start, end_time=end,
+                price=quote_price(resource, start, end, tz, compiled), **fields,
+            )
+            for start, end in free
+        ])
+        _refresh_after_bulk_change((resource.pk, b.start_time, b.end_time) for b in created)
+    return created, conflicts
@@ -1,12 +1,35 @@
-from django.test import TestCase, Client
+import gzip
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from unittest.mock import patch
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import ProtectedError
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth.models import User
 from decimal import Decimal
-from datetime import timedelta
+from datetime import date, datetime, timedelta, time as dtime
 from rest_framework.test import APIClient, APITestCase
-from .models import Resource, Booking, BookingStatus
-from .services import create_booking
+from .models import (
+    Resource, Booking, BookingArchive, BookingStatus, DurationDiscount, PriceRule, ResourceDayOccupancy,
+)
+from .services import (
+    BOOKING_PAGE_SIZE, FULL_DAY_MASK, BookingConflict, BookingNotEditable, archive_bookings, availability_bitmaps,
+    booking_day_masks, create_booking,
+    day_availability, expire_pending_bookings, mask_intervals, occupancy_bits, opening_hours,
+    expand_weekly, lookup_resource_id, overlapping_bookings, parse_weekly_rule, resolve_resource_id, write_booking,
+    nearest_spots, search_spots, spot_index, viewport_spots, quote_price,
+)
 from .serializers import BookingCreateSerializer
 from django.test import TestCase
 from rest_framework.test import APIClient
@@ -63,6 +86,716 @@ class BookingServiceTests(BookingBaseTest):
         with self.assertRaises(ValueError):
             create_booking(self.user, self.resource.id, start, end, Decimal("100000.00"))
 
+class BookingAvailabilityTests(BookingBaseTest):
+    def setUp(self):
+        super().setUp()
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.open_start, _ = opening_hours(self.day)
+
+    def _book(self, start_minute, end_minute, status=BookingStatus.CONFIRMED):
+        return Booking.objects.create(
+            user=self.user, resource=self.resource,
+            start_time=self.open_start + timedelta(minutes=start_minute),
+            end_time=self.open_start + timedelta(minutes=end_minute),
+            price=Decimal("50000.00"), status=status,
+        )
+
+    def test_mask_intervals(self):
+        self.assertEqual(mask_intervals(0b1100111), [(0, 2700), (4500, 6300)])
+        self.assertEqual(mask_intervals(0), [])
+
+    def test_unaligned_booking_blocks_overlapping_slots(self):
+        self._book(125, 170)
+        self._book(0, 30, status=BookingStatus.CANCELLED)
+        slots = day_availability(self.resource.id, self.day)["slots"]
+        self.assertEqual(len(slots), 36)
+        starts = {timezone.localtime(datetime.fromisoformat(s["start"])).strftime("%H:%M") for s in slots}
+        self.assertTrue({"10:00", "11:45", "13:00"} <= starts)
+        self.assertFalse({"12:00", "12:45"} & starts)
+
+    def test_cached_until_booking_changes(self):
+        booking = self._book(60, 120)
+        self.assertEqual(len(day_availability(self.resource.id, self.day)["slots"]), 36)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(day_availability(self.resource.id, self.day)["slots"]), 36)
+
+        booking.status = BookingStatus.CANCELLED
+        booking.save(update_fields=["status"])
+        self.assertEqual(len(day_availability(self.resource.id, self.day)["slots"]), 40)
+
+        self._book(0, 600)
+        self.assertEqual(day_availability(self.resource.id, self.day)["slots"], [])
+
+    def test_view_uses_index(self):
+        self._book(0, 60)
+        res = self.api_client.get(reverse("booking:availability"), {"resource": str(self.resource.id), "date": self.day.isoformat()})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.data), 36)
+        self.assertEqual(datetime.fromisoformat(res.data[0]["start"]), self.open_start + timedelta(hours=1))
+
+    def test_bitmaps_match_day_index(self):
+        other = Resource.objects.create(name="Lapangan B", sport_type="futsal", price_per_hour=Decimal("0"))
+        self._book(125, 170)
+        Booking.objects.create(
+            user=self.user, resource=other,
+            start_time=self.open_start + timedelta(hours=9),
+            end_time=self.open_start + timedelta(days=1, hours=1),
+            price=Decimal("0"), status=BookingStatus.PENDING,
+        )
+        next_day = self.day + timedelta(days=1)
+        with self.assertNumQueries(1):
+            bitmaps = availability_bitmaps([self.resource.id, other.id], self.day, next_day)
+
+        for rid in (self.resource.id, other.id):
+            for day in (self.day, next_day):
+                open_start, _ = opening_hours(day)
+                expected = sum(
+                    1 << int((datetime.fromisoformat(slot["start"]) - open_start).total_seconds()) // 900
+                    for slot in day_availability(rid, day)["slots"]
+                )
+                self.assertEqual(bitmaps[rid][day], expected)
+        self.assertEqual(bitmaps[other.id][next_day], FULL_DAY_MASK ^ 0b1111)
+        self.assertEqual(bitmaps[other.id][self.day], (1 << 36) - 1)
+
+    def test_batch_endpoint(self):
+        self._book(0, 60)
+        url = reverse("booking:availability-batch")
+        res = self.api_client.get(url, {
+            "resources": f"{self.resource.id},unknown-spot",
+            "start": self.day.isoformat(),
+            "end": (self.day + timedelta(days=2)).isoformat(),
+        })
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["slots_per_day"], 40)
+        days = res.data["resources"][str(self.resource.id)]["days"]
+        self.assertEqual(len(days), 3)
+        self.assertEqual(int(days[self.day.isoformat()], 16), FULL_DAY_MASK ^ 0b1111)
+        self.assertIsNone(res.data["resources"]["unknown-spot"]["resource_id"])
+
+        self.assertEqual(self.api_client.get(url, {"resources": str(self.resource.id)}).status_code, 400)
+        too_long = {"resources": str(self.resource.id), "start": self.day.isoformat(),
+                    "end": (self.day + timedelta(days=40)).isoformat()}
+        self.assertEqual(self.api_client.get(url, too_long).status_code, 400)
+
+class BookingWriteServiceTests(BookingBaseTest):
+    def setUp(self):
+        super().setUp()
+        self.start = timezone.now() + timedelta(days=1)
+        self.end = self.start + timedelta(hours=1)
+
+    def test_write_booking_rejects_overlap_but_allows_cancelled(self):
+        write_booking(self.resource.pk, self.start, self.end, user=self.user, price=Decimal("0"))
+        with self.assertRaises(BookingConflict):
+            write_booking(self.resource.pk, self.start + timedelta(minutes=30), self.end, user=self.user, price=Decimal("0"))
+        cancelled = write_booking(
+            self.resource.pk, self.start, self.end,
+            user=self.user, price=Decimal("0"), status=BookingStatus.CANCELLED,
+        )
+        self.assertEqual(cancelled.status, BookingStatus.CANCELLED)
+        self.assertFalse(overlapping_bookings().exists())
+
+    def test_reschedule_excludes_itself(self):
+        booking = write_booking(self.resource.pk, self.start, self.end, user=self.user, price=Decimal("0"))
+        later = write_booking(self.resource.pk, self.end, self.end + timedelta(hours=1), user=self.user, price=Decimal("0"))
+        write_booking(self.resource.pk, self.start + timedelta(minutes=15), self.end, booking=booking)
+        booking.refresh_from_db()
+        self.assertEqual(booking.start_time, self.start + timedelta(minutes=15))
+        with self.assertRaises(BookingConflict):
+            write_booking(self.resource.pk, self.start, self.end + timedelta(minutes=15), booking=later)
+
+    def test_reschedule_does_not_revert_concurrent_cancel(self):
+        booking = write_booking(self.resource.pk, self.start, self.end, user=self.user, price=Decimal("0"))
+        # Instance `booking` basi: pembatalan terjadi setelah instance dibaca.
+        Booking.objects.filter(pk=booking.pk).update(status=BookingStatus.CANCELLED)
+        with self.assertRaises(BookingNotEditable):
+            write_booking(self.resource.pk, self.end, self.end + timedelta(hours=1), booking=booking, price=Decimal("5"))
+        booking.refresh_from_db()
+        self.assertEqual((booking.status, booking.start_time, booking.price), (BookingStatus.CANCELLED, self.start, Decimal("0")))
+
+    def test_update_view_reports_conflict(self):
+        self.api_client.force_authenticate(user=self.user)
+        write_booking(self.resource.pk, self.start, self.end, user=self.user, price=Decimal("0"))
+        mine = write_booking(self.resource.pk, self.end, self.end + timedelta(hours=1), user=self.user, price=Decimal("0"))
+        res = self.api_client.post(
+            reverse("booking:booking-update", args=[mine.pk]),
+            {"start_time": self.start.isoformat(), "end_time": self.end.isoformat()},
+            format="json",
+        )
+        self.assertEqual(res.status_code, 409)
+
+
+class OccupancyBitmapTests(BookingBaseTest):
+    def setUp(self):
+        super().setUp()
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.midnight = timezone.make_aware(datetime.combine(self.day, datetime.min.time()))
+
+    def _bits(self, day=None):
+        return occupancy_bits([self.resource.pk], day or self.day, day or self.day).get((self.resource.pk, day or self.day), 0)
+
+    def test_bitmap_follows_booking_lifecycle(self):
+        booking = write_booking(
+            self.resource.pk, self.midnight + timedelta(hours=10), self.midnight + timedelta(hours=11),
+            user=self.user, price=Decimal("0"),
+        )
+        self.assertEqual(self._bits(), 0b1111 << 40)
+
+        write_booking(self.resource.pk, self.midnight + timedelta(hours=23), self.midnight + timedelta(hours=25), booking=booking)
+        self.assertEqual(self._bits(), 0b1111 << 92)
+        self.assertEqual(self._bits(self.day + timedelta(days=1)), 0b1111)
+
+        booking.status = BookingStatus.CANCELLED
+        booking.save(update_fields=["status"])
+        self.assertEqual(self._bits(), 0)
+        booking.delete()
+        self.assertEqual(self._bits(self.day + timedelta(days=1)), 0)
+
+    def test_plain_save_refreshes_old_and_new_days(self):
+        booking = write_booking(
+            self.resource.pk, self.midnight + timedelta(hours=10), self.midnight + timedelta(hours=11),
+            user=self.user, price=Decimal("0"),
+        )
+        other = Resource.objects.create(name="Lapangan B", sport_type="futsal")
+        next_day = self.day + timedelta(days=1)
+        # Dipindah di luar write_booking (mis. lewat admin): hari lama tidak boleh menyisakan bit.
+        fresh = Booking.objects.get(pk=booking.pk)
+        fresh.resource = other
+        fresh.start_time += timedelta(days=1)
+        fresh.end_time += timedelta(days=1)
+        fresh.save()
+        self.assertEqual(self._bits(), 0)
+        self.assertEqual(occupancy_bits([other.pk], next_day, next_day)[other.pk, next_day], 0b1111 << 40)
+
+    def test_conflict_check_is_exact_within_a_slot(self):
+        start = self.midnight + timedelta(hours=10)
+        write_booking(self.resource.pk, start, start + timedelta(minutes=50), user=self.user, price=Decimal("0"))
+        write_booking(self.resource.pk, start + timedelta(minutes=50), start + timedelta(hours=1), user=self.user, price=Decimal("0"))
+        with self.assertRaises(BookingConflict):
+            write_booking(self.resource.pk, start + timedelta(minutes=55), start + timedelta(hours=2), user=self.user, price=Decimal("0"))
+
+    def test_conflict_is_detected_even_when_bitmap_is_stale(self):
+        start = self.midnight + timedelta(hours=12)
+        write_booking(self.resource.pk, start, start + timedelta(hours=1), user=self.user, price=Decimal("0"))
+        # Bitmap hanya untuk bacaan; bitmap yang tertinggal tidak boleh meloloskan bentrok.
+        ResourceDayOccupancy.objects.filter(resource=self.resource).delete()
+        with self.assertRaises(BookingConflict):
+            write_booking(self.resource.pk, start + timedelta(minutes=30), start + timedelta(hours=2), user=self.user, price=Decimal("0"))
+
+    def test_rebuild_command_repairs_drift(self):
+        start = self.midnight + timedelta(hours=15)
+        booking = write_booking(self.resource.pk, start, start + timedelta(hours=1), user=self.user, price=Decimal("0"))
+        Booking.objects.filter(pk=booking.pk).update(status=BookingStatus.EXPIRED)
+
+        out = io.StringIO()
+        call_command("rebuild_occupancy", "--check", stdout=out)
+        self.assertIn("1 bitmap harian tidak sesuai", out.getvalue())
+        self.assertNotEqual(self._bits(), 0)
+
+        call_command("rebuild_occupancy", stdout=io.StringIO())
+        self.assertEqual(self._bits(), 0)
+        out = io.StringIO()
+        call_command("rebuild_occupancy", "--check", stdout=out)
+        self.assertIn("sudah sesuai", out.getvalue())
+
+
+class BookingListTests(BookingBaseTest):
+    def setUp(self):
+        super().setUp()
+        base = timezone.now() + timedelta(days=1)
+        self.bookings = Booking.objects.bulk_create([
+            Booking(
+                user=self.user, resource=self.resource,
+                start_time=base + timedelta(hours=2 * i), end_time=base + timedelta(hours=2 * i + 1),
+                price=Decimal("0"),
+                status=BookingStatus.CANCELLED if i % 3 == 0 else BookingStatus.CONFIRMED,
+            )
+            for i in range(7)
+        ])
+
+    def test_api_cursor_walks_every_booking_once(self):
+        self.api_client.force_authenticate(user=self.user)
+        url = reverse("booking:mine_api")
+        params = {"limit": 3}
+        seen = []
+        while True:
+            res = self.api_client.get(url, params)
+            self.assertEqual(res.status_code, 200)
+            seen.extend(item["id"] for item in res.data)
+            if "X-Next-Cursor" not in res:
+                break
+            self.assertIn('rel="next"', res["Link"])
+            params["cursor"] = res["X-Next-Cursor"]
+        expected = [str(b.id) for b in sorted(self.bookings, key=lambda b: b.start_time, reverse=True)]
+        self.assertEqual(seen, expected)
+
+    def test_api_filters_and_validation(self):
+        self.api_client.force_authenticate(user=self.user)
+        url = reverse("booking:mine_api")
+        res = self.api_client.get(url, {"status": "cancelled"})
+        self.assertEqual(len(res.data), 3)
+        res = self.api_client.get(url, {"resource": str(self.resource.id), "from": timezone.localdate().isoformat()})
+        self.assertEqual(len(res.data), 7)
+        for params in ({"cursor": "nonsense"}, {"limit": "0"}, {"status": "bogus"}, {"from": "kemarin"}):
+            self.assertEqual(self.api_client.get(url, params).status_code, 400)
+
+    def test_page_paginates_pending_first(self):
+        Booking.objects.bulk_create([
+            Booking(
+                user=self.user, resource=self.resource,
+                start_time=timezone.now() + timedelta(days=30, hours=i), end_time=timezone.now() + timedelta(days=30, hours=i, minutes=30),
+                price=Decimal("0"), status=BookingStatus.PENDING,
+            )
+            for i in range(BOOKING_PAGE_SIZE)
+        ])
+        self.client.login(username="tester", password="12345")
+        res = self.client.get(reverse("booking:mine_page"))
+        items = res.context["items"]
+        self.assertEqual(len(items), BOOKING_PAGE_SIZE)
+        self.assertTrue(all(item["status"] == BookingStatus.PENDING for item in items))
+        res = self.client.get(res.context["next_url"])
+        self.assertEqual(len(res.context["items"]), 7)
+        self.assertIsNone(res.context["next_url"])
+
+    def test_export_streams_csv_and_jsonl_for_admins(self):
+        url = reverse("booking:mine_export")
+        self.api_client.force_authenticate(user=self.user)
+        self.assertEqual(self.api_client.get(url).status_code, 403)
+
+        admin = User.objects.create_user(username="staff", password="12345", is_staff=True)
+        self.api_client.force_authenticate(user=admin)
+        res = self.api_client.get(url, {"status": "confirmed"})
+        self.assertTrue(res.streaming)
+        lines = b"".join(res.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:2], ["id", "user__username"])
+        self.assertEqual(len(lines), 5)
+
+        res = self.api_client.get(url, {"type": "jsonl"})
+        rows = [json.loads(line) for line in b"".join(res.streaming_content).decode().splitlines()]
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[0]["user__username"], "tester")
+
+
+    def test_archived_bookings_stay_in_history_and_export(self):
+        old = Booking.objects.create(
+            user=self.user, resource=self.resource, start_time=timezone.now() - timedelta(days=120),
+            end_time=timezone.now() - timedelta(days=120) + timedelta(hours=1), price=Decimal("0"),
+            status=BookingStatus.CONFIRMED,
+        )
+        self.assertEqual(archive_bookings(timezone.now() - timedelta(days=90)), 1)
+        self.assertFalse(Booking.objects.filter(pk=old.pk).exists())
+
+        self.api_client.force_authenticate(user=self.user)
+        url = reverse("booking:mine_api")
+        params, seen = {"limit": 3}, []
+        while True:
+            res = self.api_client.get(url, params)
+            seen.extend(item["id"] for item in res.data)
+            if "X-Next-Cursor" not in res:
+                break
+            params["cursor"] = res["X-Next-Cursor"]
+        expected = sorted(self.bookings, key=lambda b: b.start_time, reverse=True) + [old]
+        self.assertEqual(seen, [str(b.id) for b in expected])
+
+        self.client.login(username="tester", password="12345")
+        items = self.client.get(reverse("booking:mine_page")).context["items"]
+        self.assertEqual(items[-1]["id"], str(old.id))
+        self.assertFalse(items[-1]["can_cancel"])
+
+        admin = User.objects.create_user(username="staff", password="12345", is_staff=True)
+        self.api_client.force_authenticate(user=admin)
+        res = self.api_client.get(reverse("booking:mine_export"), {"type": "jsonl"})
+        rows = [json.loads(line) for line in b"".join(res.streaming_content).decode().splitlines()]
+        self.assertEqual([row["id"] for row in rows], [str(b.id) for b in reversed(expected)])
+
+
+class ResourceResolutionTests(BookingBaseTest):
+    def test_place_id_lookup_is_cached_and_invalidated(self):
+        self.resource.place_id = "ChIJ-test-place"
+        self.resource.save()
+        self.assertEqual(resolve_resource_id("ChIJ-test-place", "apa saja"), self.resource.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolve_resource_id("ChIJ-test-place", "apa saja"), self.resource.pk)
+
+        other = Resource.objects.create(name="Lapangan C", sport_type="futsal", place_id="ChIJ-other")
+        self.assertEqual(resolve_resource_id("ChIJ-other"), other.pk)
+        other.delete()
+        self.assertIsNone(resolve_resource_id("ChIJ-other"))
+
+    def test_label_match_links_known_place(self):
+        with patch("booking.services._known_place_ids", return_value=frozenset({"ChIJ-jakarta"})):
+            self.assertEqual(resolve_resource_id("ChIJ-jakarta", "jakarta"), self.resource.pk)
+            self.assertIsNone(resolve_resource_id("ChIJ-unknown", "Nowhere"))
+        self.resource.refresh_from_db()
+        self.assertEqual(self.resource.place_id, "ChIJ-jakarta")
+
+    def test_ambiguous_name_match_is_not_linked(self):
+        Resource.objects.create(name="Lapangan B", location_name="Jakarta", sport_type="futsal")
+        with patch("booking.services._known_place_ids", return_value=frozenset({"ChIJ-jakarta"})):
+            self.assertIsNotNone(lookup_resource_id("ChIJ-jakarta", "jakarta"))
+        self.assertFalse(Resource.objects.filter(place_id="ChIJ-jakarta").exists())
+
+    def test_booking_creates_resource_linked_to_place(self):
+        self.api_client.force_authenticate(user=self.user)
+        start = timezone.now() + timedelta(days=2)
+        with patch("booking.services._known_place_ids", return_value=frozenset({"ChIJ-new-spot"})):
+            res = self.api_client.post(reverse("booking:book"), {
+                "resource_id": "ChIJ-new-spot",
+                "resource_label": "GOR Baru",
+                "start_time": start.isoformat(),
+                "end_time": (start + timedelta(hours=1)).isoformat(),
+            }, format="json")
+            self.assertEqual(res.status_code, 201)
+            created = Booking.objects.get(pk=res.data["id"]).resource
+            self.assertEqual(created.place_id, "ChIJ-new-spot")
+
+            res = self.api_client.post(reverse("booking:book"), {
+                "resource_id": "bukan-place-id",
+                "resource_label": "GOR Lain",
+                "start_time": start.isoformat(),
+                "end_time": (start + timedelta(hours=1)).isoformat(),
+            }, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertIsNone(Booking.objects.get(pk=res.data["id"]).resource.place_id)
+
+        day = timezone.localdate() + timedelta(days=3)
+        params = {"resource": "ChIJ-new-spot", "label": "GOR Baru", "date": day.isoformat()}
+        self.api_client.get(reverse("booking:availability"), params)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.api_client.get(reverse("booking:availability"), params).data), 40)
+
+
+class SpotIndexTests(BookingBaseTest):
+    SPOTS = [
+        {"place_id": "p-senayan", "name": "GOR Senayan", "latitude": -6.2183, "longitude": 106.8023},
+        {"place_id": "p-bekasi", "name": "Arena Bekasi", "latitude": -6.2383, "longitude": 106.9756},
+        {"place_id": "p-depok", "name": "Lapangan Senayan Depok", "latitude": -6.4025, "longitude": 106.7942},
+        {"place_id": "p-bogor", "name": "GOR Pajajaran", "latitude": -6.5950, "longitude": 106.7990},
+    ]
+
+    def setUp(self):
+        super().setUp()
+        spot_index.cache_clear()
+        patcher = patch("booking.services.load_all_spots", return_value=self.SPOTS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(spot_index.cache_clear)
+
+    def ids(self, rows):
+        return [row[0] for row in rows]
+
+    def test_search_prefers_prefix_matches(self):
+        self.assertEqual(self.ids(search_spots("senayan")), ["p-senayan", "p-depok"])
+        self.assertEqual(self.ids(search_spots("GOR")), ["p-bogor", "p-senayan"])
+        self.assertEqual(self.ids(search_spots("gor", limit=1)), ["p-bogor"])
+        self.assertEqual(search_spots("  "), [])
+
+    def test_viewport_and_nearest(self):
+        rows, truncated = viewport_spots(-6.45, 106.7, -6.2, 106.85)
+        self.assertEqual(self.ids(rows), ["p-senayan", "p-depok"])
+        self.assertFalse(truncated)
+        rows, truncated = viewport_spots(-7, 106, -6, 108, limit=2)
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(truncated)
+        with self.assertRaises(ValueError):
+            viewport_spots(-6.2, 106.7, -6.45, 106.85)
+
+        nearest = nearest_spots(-6.22, 106.80, limit=2)
+        self.assertEqual([row[0] for row, _ in nearest], ["p-senayan", "p-bekasi"])
+        self.assertLess(nearest[0][1], 1)
+        far = nearest_spots(51.5, -0.12, limit=1)
+        self.assertEqual(far[0][0][0], "p-senayan")
+
+    def test_page_ships_bootstrap_only(self):
+        self.client.force_login(self.user)
+        res = self.client.get(reverse("booking:page"))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.context["spot_bootstrap"]["total"], 4)
+        self.assertNotIn("spots", res.context)
+
+    def test_index_endpoint_is_compressed_and_cacheable(self):
+        url = reverse("booking:spot-index")
+        res = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(res["Content-Encoding"], "gzip")
+        data = json.loads(gzip.decompress(res.content))
+        self.assertEqual(len(data["spots"]), 4)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"]).status_code, 304)
+
+        res = self.client.get(reverse("booking:spot-search"), {"q": "bekasi"})
+        self.assertEqual(res.json()["spots"][0][0], "p-bekasi")
+        res = self.client.get(reverse("booking:spot-viewport"), {"south": "x"})
+        self.assertEqual(res.status_code, 400)
+        res = self.client.get(reverse("booking:spot-nearest"), {"lat": -6.24, "lng": 106.97, "limit": 1})
+        self.assertEqual(res.json()["fields"][-1], "distance_km")
+        self.assertEqual(res.json()["spots"][0][0], "p-bekasi")
+
+
+class PricingTests(BookingBaseTest):
+    MONDAY = date(2026, 11, 2)
+
+    def setUp(self):
+        super().setUp()
+        PriceRule.objects.create(
+            name="Jam sibuk", weekdays="MO,TU,WE,TH,FR",
+            start_time=dtime(17, 0), end_time=dtime(20, 0), multiplier=Decimal("1.5"),
+        )
+        PriceRule.objects.create(name="Akhir pekan", resource=self.resource, weekdays="SA,SU", rate=Decimal("80000"))
+        self.promo = PriceRule.objects.create(
+            name="Promo pagi", weekdays="MO", start_time=dtime(10, 0), end_time=dtime(11, 0),
+            rate=Decimal("0"), priority=5,
+        )
+        DurationDiscount.objects.create(min_minutes=120, percent_off=Decimal("10"))
+
+    def at(self, day, hour, minute=0):
+        return timezone.make_aware(datetime.combine(day, dtime(hour, minute)))
+
+    def test_rules_and_discounts(self):
+        monday, saturday = self.MONDAY, self.MONDAY + timedelta(days=5)
+        cases = [
+            (self.at(monday, 16, 30), self.at(monday, 17, 30), "62500.00"),
+            (self.at(monday, 16, 50), self.at(monday, 17, 5), "14583.33"),
+            (self.at(monday, 18), self.at(monday, 20), "135000.00"),
+            (self.at(monday, 10), self.at(monday, 11), "0.00"),
+            (self.at(saturday, 10), self.at(saturday, 12), "144000.00"),
+        ]
+        for start, end, expected in cases:
+            self.assertEqual(quote_price(self.resource, start, end), Decimal(expected), (start, end))
+
+    def test_compiled_table_is_cached_until_rules_change(self):
+        start, end = self.at(self.MONDAY, 10), self.at(self.MONDAY, 11)
+        quote_price(self.resource, start, end)
+        with self.assertNumQueries(0):
+            self.assertEqual(quote_price(self.resource, start, end), Decimal("0.00"))
+        self.promo.delete()
+        self.assertEqual(quote_price(self.resource, start, end), Decimal("50000.00"))
+        self.resource.price_per_hour = Decimal("60000")
+        self.assertEqual(quote_price(self.resource, start, end), Decimal("60000.00"))
+
+    def test_week_grid_and_booking_share_engine(self):
+        res = self.api_client.get(reverse("booking:price-week"), {
+            "resource": str(self.resource.pk), "start": self.MONDAY.isoformat(),
+            "duration_minutes": 120, "step_minutes": 60,
+        })
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["start_times"][0], "10:00")
+        self.assertEqual(len(res.data["days"]), 7)
+        monday, saturday = res.data["days"][0]["prices"], res.data["days"][5]["prices"]
+        self.assertEqual(monday[0], Decimal("45000.00"))
+        self.assertEqual(monday[8], Decimal("135000.00"))
+        self.assertIsNone(monday[9])
+        self.assertEqual(saturday[0], Decimal("144000.00"))
+
+        res = self.api_client.get(reverse("booking:price-week"), {"resource": str(self.resource.pk), "duration_minutes": 50})
+        self.assertEqual(res.status_code, 400)
+
+        start, end = self.at(self.MONDAY, 18), self.at(self.MONDAY, 19)
+        res = self.api_client.get(reverse("booking:price-quote"), {
+            "resource": str(self.resource.pk), "start": start.isoformat(), "end": end.isoformat(),
+        })
+        self.assertEqual(res.data["price"], Decimal("75000.00"))
+        self.api_client.force_authenticate(user=self.user)
+        res = self.api_client.post(reverse("booking:book"), {
+            "resource_id": str(self.resource.pk),
+            "start_time": start.isoformat(),
+            "end_time": end.isoformat(),
+        }, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(Booking.objects.get(pk=res.data["id"]).price, Decimal("75000.00"))
+
+
+class BookingSweeperTests(BookingBaseTest):
+    def _booking(self, start, status, hours=1):
+        return Booking.objects.create(
+            user=self.user, resource=self.resource, start_time=start,
+            end_time=start + timedelta(hours=hours), price=Decimal("0"), status=status,
+        )
+
+    def test_expires_overdue_pending_in_batches(self):
+        now = timezone.now()
+        overdue = [self._booking(now - timedelta(hours=3 * i + 2), BookingStatus.PENDING) for i in range(5)]
+        upcoming = self._booking(now + timedelta(days=1), BookingStatus.PENDING)
+        confirmed = self._booking(now - timedelta(hours=30), BookingStatus.CONFIRMED)
+
+        self.assertEqual(expire_pending_bookings(batch_size=2), 5)
+        statuses = dict(Booking.objects.values_list("pk", "status"))
+        self.assertTrue(all(statuses[b.pk] == BookingStatus.EXPIRED for b in overdue))
+        self.assertEqual(statuses[upcoming.pk], BookingStatus.PENDING)
+        self.assertEqual(statuses[confirmed.pk], BookingStatus.CONFIRMED)
+
+        self.assertEqual(expire_pending_bookings(hold=timedelta(0)), 1)
+
+    def test_expired_booking_frees_its_slot(self):
+        day = timezone.localdate() + timedelta(days=1)
+        open_start, _ = opening_hours(day)
+        stale = self._booking(open_start, BookingStatus.PENDING)
+        Booking.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(len(day_availability(self.resource.pk, day)["slots"]), 36)
+
+        expire_pending_bookings(hold=timedelta(minutes=30))
+        self.assertEqual(len(day_availability(self.resource.pk, day)["slots"]), 40)
+        write_booking(self.resource.pk, open_start, open_start + timedelta(hours=1), user=self.user, price=Decimal("0"))
+
+    def test_archives_old_finished_bookings(self):
+        now = timezone.now()
+        old = self._booking(now - timedelta(days=120), BookingStatus.CONFIRMED)
+        old_pending = self._booking(now - timedelta(days=100), BookingStatus.PENDING)
+        recent = self._booking(now - timedelta(days=10), BookingStatus.CANCELLED)
+
+        out = io.StringIO()
+        call_command("sweep_bookings", "--batch-size", "1", stdout=out)
+        self.assertIn("1 booking kedaluwarsa, 2 booking diarsipkan", out.getvalue())
+        self.assertEqual(list(Booking.objects.values_list("pk", flat=True)), [recent.pk])
+        archived = BookingArchive.objects.get(pk=old.pk)
+        self.assertEqual((archived.user, archived.status, archived.start_time), (self.user, BookingStatus.CONFIRMED, old.start_time))
+        self.assertEqual(BookingArchive.objects.get(pk=old_pending.pk).status, BookingStatus.EXPIRED)
+        self.assertFalse(ResourceDayOccupancy.objects.filter(day__lt=timezone.localdate() - timedelta(days=90)).exists())
+
+    def test_archive_batch_query_count_does_not_grow_with_rows(self):
+        def archive(count):
+            start = timezone.now() - timedelta(days=200)
+            for i in range(count):
+                self._booking(start - timedelta(days=i), BookingStatus.CONFIRMED)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(archive_bookings(timezone.now() - timedelta(days=90), batch_size=100), count)
+            return len(queries)
+
+        self.assertEqual(archive(2), archive(12))
+        self.assertFalse(ResourceDayOccupancy.objects.exists())
+
+    def test_archive_keeps_days_with_remaining_bookings(self):
+        day = timezone.localdate() - timedelta(days=100)
+        open_start, _ = opening_hours(day)
+        other_start, _ = opening_hours(day - timedelta(days=1))
+        self._booking(open_start, BookingStatus.CONFIRMED)
+        self._booking(other_start, BookingStatus.CONFIRMED)
+        later = self._booking(open_start + timedelta(hours=4), BookingStatus.CONFIRMED)
+
+        self.assertEqual(archive_bookings(open_start + timedelta(hours=2)), 2)
+        self.assertEqual(list(Booking.objects.values_list("pk", flat=True)), [later.pk])
+        # Hari yang masih punya booking mempertahankan bitmap-nya (hanya bit booking tersisa).
+        self.assertEqual(list(ResourceDayOccupancy.objects.values_list("day", flat=True)), [day])
+        self.assertEqual(occupancy_bits([self.resource.pk], day, day)[self.resource.pk, day],
+                         booking_day_masks(later.start_time, later.end_time)[day])
+
+        with self.assertRaises(ProtectedError):
+            Resource.objects.filter(pk=self.resource.pk).delete()
+
+
+class RecurringBookingTests(BookingBaseTest):
+    def test_parse_and_expand_weekly_rule(self):
+        rule = parse_weekly_rule("RRULE:FREQ=WEEKLY;BYDAY=TH,MO;INTERVAL=2;COUNT=5")
+        self.assertEqual(rule, {"byday": [0, 3], "interval": 2, "count": 5, "until": None})
+        occurrences = expand_weekly(date(2026, 1, 8), dtime(19, 0), timedelta(minutes=90), **rule)
+        self.assertEqual(
+            [start.date() for start, _ in occurrences],
+            [date(2026, 1, 8), date(2026, 1, 19), date(2026, 1, 22), date(2026, 2, 2), date(2026, 2, 5)],
+        )
+        self.assertEqual(occurrences[0][1] - occurrences[0][0], timedelta(minutes=90))
+
+        until = expand_weekly(date(2026, 1, 5), dtime(7, 0), timedelta(hours=1), **parse_weekly_rule("FREQ=WEEKLY;BYDAY=SA;UNTIL=20260131"))
+        self.assertEqual(len(until), 4)
+        for bad in ("FREQ=DAILY;COUNT=3", "FREQ=WEEKLY;BYDAY=XX;COUNT=3", "FREQ=WEEKLY;BYDAY=MO", "FREQ=WEEKLY;BYDAY=MO;COUNT=2;BYHOUR=3"):
+            with self.assertRaises(ValueError):
+                parse_weekly_rule(bad)
+
+    def test_endpoint_creates_free_occurrences_and_reports_conflicts(self):
+        self.api_client.force_authenticate(user=self.user)
+        first_day = timezone.localdate() + timedelta(days=7 - timezone.localdate().weekday())
+        clash_start = timezone.make_aware(datetime.combine(first_day + timedelta(weeks=2), dtime(19, 30)))
+        Booking.objects.create(
+            user=self.user, resource=self.resource, start_time=clash_start,
+            end_time=clash_start + timedelta(hours=1), price=Decimal("0"), status=BookingStatus.CONFIRMED,
+        )
+
+        # Termasuk 2 query untuk mengompilasi tabel tarif resource (cache masih kosong)
+        # dan 1 UPDATE kosong yang mengambil lock tulis SQLite di awal transaksi.
+        with self.assertNumQueries(11):
+            res = self.api_client.post(reverse("booking:book-recurring"), {
+                "resource_id": str(self.resource.id),
+                "start_date": first_day.isoformat(),
+                "start_time": "19:00",
+                "duration_minutes": 90,
+                "rrule": "FREQ=WEEKLY;BYDAY=MO;COUNT=6",
+            }, format="json")
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(len(res.data["created"]), 5)
+        self.assertEqual(len(res.data["conflicts"]), 1)
+        self.assertEqual(datetime.fromisoformat(res.data["conflicts"][0]["start"]).date(), first_day + timedelta(weeks=2))
+        self.assertEqual(Booking.objects.filter(resource=self.resource, status=BookingStatus.PENDING).count(), 5)
+        self.assertEqual(Booking.objects.filter(status=BookingStatus.PENDING).first().price, Decimal("75000.00"))
+        self.assertFalse(overlapping_bookings().exists())
+
+        day = first_day + timedelta(weeks=1)
+        self.assertNotIn(
+            "19:00",
+            {timezone.localtime(datetime.fromisoformat(s["start"])).strftime("%H:%M") for s in day_availability(self.resource.pk, day)["slots"]},
+        )
+
+        res = self.api_client.post(reverse("booking:book-recurring"), {
+            "resource_id": str(self.resource.id), "start_date": first_day.isoformat(), "start_time": "19:00",
+            "rrule": "FREQ=WEEKLY;BYDAY=MO;COUNT=6",
+        }, format="json")
+        self.assertEqual(res.status_code, 409)
+        self.assertEqual(len(res.data["conflicts"]), 6)
+
+    def test_endpoint_rejects_bad_rule(self):
+        self.api_client.force_authenticate(user=self.user)
+        res = self.api_client.post(reverse("booking:book-recurring"), {
+            "resource_id": str(self.resource.id), "start_date": "2026-01-05", "start_time": "19:00", "rrule": "FREQ=MONTHLY",
+        }, format="json")
+        self.assertEqual(res.status_code, 400)
+
+
+@override_settings(DEBUG=True)
+class BookingStressTests(TransactionTestCase):
+    @override_settings(DEBUG=False)
+    def test_benchmarks_refuse_outside_debug(self):
+        for command in ("stress_booking", "bench_booking"):
+            with self.assertRaises(CommandError):
+                call_command(command, stdout=io.StringIO())
+        self.assertFalse(Resource.objects.exists())
+
+    def _run_on_scratch_db(self, *command):
+        """
+        Jalankan command di proses terpisah pada database SQLite berbasis file.
+        Database test in-memory (shared cache) menolak tulis bersamaan dengan
+        "table is locked" alih-alih menunggu lock, jadi tidak bisa dipakai di sini.
+        """
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        env = {**os.environ, "PRODUCTION": "False", "SQLITE_PATH": os.path.join(scratch.name, "bench-scratch.sqlite3")}
+        for args in (("migrate", "-v0"), command):
+            result = subprocess.run(
+                [sys.executable, "manage.py", *args], cwd=settings.BASE_DIR, env=env,
+                capture_output=True, text=True, timeout=300,
+            )
+            self.assertEqual(result.returncode, 0, result.stderr)
+        return result.stdout
+
+    def test_concurrent_requests_never_double_book(self):
+        out = self._run_on_scratch_db("stress_booking", "--requests", "120", "--workers", "12")
+        summary = dict(re.findall(r"^(\w[\w ()]*?)\s+: (\d+)", out, re.MULTILINE))
+        self.assertGreaterEqual(int(summary["Berhasil"]), 1, out)
+        self.assertEqual(int(summary["Error database"]), 0, out)
+        self.assertEqual(
+            int(summary["Berhasil"]) + int(summary["Bentrok (ditolak)"]), 120, out,
+        )
+        self.assertIn("Tidak ada booking ganda.", out)
+
+    def test_http_benchmark_reports_json(self):
+        out = io.StringIO()
+        call_command(
+            "bench_booking", "--requests", "60", "--workers", "4", "--resources", "2",
+            "--format", "json", stdout=out,
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["double_booking_violations"], 0)
+        self.assertEqual(report["overall"]["requests"], 60)
+        self.assertEqual(sum(op["requests"] for op in report["operations"].values()), 60)
+        self.assertIn("p99_ms", report["operations"]["create"])
+        self.assertFalse(Booking.objects.exists())
+        self.assertFalse(Resource.objects.exists())
+
+
 class BookingSerializerTests(APITestCase):
     def setUp(self):
         from django.contrib.auth import get_user_model
@@ -5,10 +5,19 @@ app_name = "booking"
 
 urlpatterns = [
     path("page/", views.booking_page, name="page"),
+    path("spots/", views.spot_index_view, name="spot-index"),
+    path("spots/search/", views.spot_search_view, name="spot-search"),
+    path("spots/viewport/", views.spot_viewport_view, name="spot-viewport"),
+    path("spots/nearest/", views.spot_nearest_view, name="spot-nearest"),
     path("availability/", views.AvailabilityView.as_view(), name="availability"),
+    path("availability/batch/", views.BatchAvailabilityView.as_view(), name="availability-batch"),
+    path("price/quote/", views.PriceQuoteView.as_view(), name="price-quote"),
+    path("price/week/", views.WeekQuoteView.as_view(), name="price-week"),
     path("book/", views.BookingCreateView.as_view(), name="book"),
+    path("book/recurring/", views.RecurringBookingView.as_view(), name="book-recurring"),
     path("mine/", views.my_bookings_page, name="mine_page"),
     path("api/mine/", views.MyBookingAPI.as_view(), name="mine_api"),
+    path("api/mine/export/", views.BookingExportView.as_view(), name="mine_export"),
     path("cancel/<str:pk>/", views.BookingCancelView.as_view(), name="booking-cancel"),
     path("delete/<str:pk>/", views.BookingDeleteView.as_view(), name="booking-delete"),
     path("update/<str:pk>/", views.BookingUpdateView.as_view(), name="booking-update"),
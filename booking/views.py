@@ -1,18 +1,37 @@
+import csv
+import heapq
+import itertools
+import json
+import math
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Q
+from django.http import (
+    HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, JsonResponse, StreamingHttpResponse,
+)
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_GET
 from rest_framework import views, permissions, status
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.permissions import BasePermission
 from rest_framework.response import Response
 from datetime import datetime, date, timedelta, time as dtime, timezone as dt_timezone
 from django.utils import timezone
-from .models import Resource, Booking, BookingStatus
+from home.utils.pagination import keyset_page_merged
+from .models import Resource, Booking, BookingArchive, BookingStatus
+from .services import (
+    CLOSE_TIME, FULL_DAY_MASK, OPEN_TIME, SLOT_MINUTES, SLOTS_PER_DAY,
+    BOOKING_MAX_PAGE_SIZE, BOOKING_PAGE_SIZE, BookingConflict, BookingNotEditable, availability_bitmaps,
+    book_recurring, day_availability, expand_weekly, filter_bookings, is_known_place_id,
+    parse_weekly_rule, resolve_resource_id, write_booking,
+    SPOT_BOOTSTRAP_SIZE, SPOT_FIELDS, SPOT_MAX_RESULTS, SPOT_SEARCH_LIMIT,
+    nearest_spots, search_spots, spot_bootstrap, spot_index, viewport_spots,
+    quote_price, quote_week,
+)
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
 from django.shortcuts import render
 from .models import Resource, Booking
-from home.utils.spots_loader import load_all_spots
 from django.db import transaction, IntegrityError
-from decimal import Decimal
 from django.shortcuts import render, get_object_or_404, redirect
 from django.db.models import Case, When, Value, IntegerField, BooleanField
 from django.db.models.functions import Coalesce
@@ -76,49 +95,96 @@ def user_or_admin_required(view_func):
 
 @user_or_admin_required
 def booking_page(request):
-    raw = load_all_spots()
-    spots = []
-    for s in raw:
-        if isinstance(s, dict):
-            spots.append({
-                "place_id": s.get("place_id"),
-                "name": s.get("name"),
-                "latitude": s.get("latitude"),
-                "longitude": s.get("longitude"),
-            })
-        else:
-            spots.append({
-                "place_id": getattr(s, "place_id"),
-                "name": getattr(s, "name"),
-                "latitude": getattr(s, "latitude"),
-                "longitude": getattr(s, "longitude"),
-            })
-    return render(request, "booking_form.html", {"spots": spots})
+    # Daftar spot tidak lagi di-render penuh; halaman memakai endpoint spot_* di bawah.
+    return render(request, "booking_form.html", {"spot_bootstrap": spot_bootstrap()})
+
+def _float_param(request, name):
+    try:
+        value = float(request.GET[name])
+    except (KeyError, ValueError):
+        raise ValueError(name)
+    if not math.isfinite(value):
+        raise ValueError(name)
+    return value
+
+def _limit_param(request, default):
+    try:
+        return max(1, min(int(request.GET.get("limit", default)), SPOT_MAX_RESULTS))
+    except ValueError:
+        return default
+
+@require_GET
+def spot_index_view(request):
+    """Indeks spot lengkap yang sudah diserialisasi; dikirim gzip bila klien mendukung."""
+    index = spot_index()
+    if request.headers.get("If-None-Match") == index["etag"]:
+        response = HttpResponseNotModified()
+    elif "gzip" in request.headers.get("Accept-Encoding", ""):
+        response = HttpResponse(index["gzip"], content_type="application/json")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(index["json"], content_type="application/json")
+    response["ETag"] = index["etag"]
+    response["Cache-Control"] = "public, max-age=3600"
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+@require_GET
+def spot_search_view(request):
+    rows = search_spots(request.GET.get("q", ""), _limit_param(request, SPOT_SEARCH_LIMIT))
+    return JsonResponse({"fields": SPOT_FIELDS, "spots": rows})
+
+@require_GET
+def spot_viewport_view(request):
+    try:
+        box = [_float_param(request, name) for name in ("south", "west", "north", "east")]
+        rows, truncated = viewport_spots(*box, limit=_limit_param(request, SPOT_MAX_RESULTS))
+    except ValueError:
+        return JsonResponse({"error": "south, west, north, east wajib berupa angka yang valid"}, status=400)
+    return JsonResponse({"fields": SPOT_FIELDS, "spots": rows, "truncated": truncated})
+
+@require_GET
+def spot_nearest_view(request):
+    try:
+        lat, lng = _float_param(request, "lat"), _float_param(request, "lng")
+    except ValueError:
+        return JsonResponse({"error": "lat dan lng wajib berupa angka"}, status=400)
+    nearest = nearest_spots(lat, lng, _limit_param(request, SPOT_BOOTSTRAP_SIZE))
+    return JsonResponse({
+        "fields": SPOT_FIELDS + ("distance_km",),
+        "spots": [row + (km,) for row, km in nearest],
+    })
 
 @user_or_admin_required
 def my_bookings_page(request):
     tz = timezone.get_current_timezone()
     now = timezone.now()
+    is_admin = request.session.get('is_admin', False)
 
-    if request.session.get('is_admin', False):
-        base_query = Booking.objects.select_related("resource", "user").all()
-    else:
-        base_query = Booking.objects.filter(user=request.user).select_related("resource")
-
-    base = (
-        base_query
-        .annotate(
-            status_prio=Case(
-                When(status=BookingStatus.PENDING, then=Value(0)),
-                default=Value(1),
-                output_field=IntegerField(),
-            )
-        )
-        .order_by("status_prio", "-start_time")
+    status_prio = Case(
+        When(status=BookingStatus.PENDING, then=Value(0)),
+        default=Value(1),
+        output_field=IntegerField(),
     )
+    # Riwayat lama sudah dipindah ke BookingArchive oleh sweep_bookings; keduanya ditampilkan bersama.
+    querysets = []
+    for model in (Booking, BookingArchive):
+        qs = model.objects.select_related("resource", "user")
+        if not is_admin:
+            qs = qs.filter(user=request.user)
+        querysets.append(qs.annotate(status_prio=status_prio))
+
+    try:
+        page, next_cursor = keyset_page_merged(
+            [filter_bookings(qs, request.GET) for qs in querysets],
+            ["status_prio", "-start_time", "-pk"],
+            request.GET.get("cursor"),
+        )
+    except ValueError:
+        return HttpResponseBadRequest("Filter atau cursor tidak valid.")
 
     items = []
-    for b in base:
+    for b in page:
         place = (
             getattr(b.resource, "name", None)
             or getattr(b.resource, "location_name", None)
@@ -126,7 +192,7 @@ def my_bookings_page(request):
         )
 
         user_info = ""
-        if request.session.get('is_admin', False) and hasattr(b, 'user') and b.user:
+        if is_admin and b.user:
             user_info = f" ({b.user.username})"
 
         items.append({
@@ -138,7 +204,19 @@ def my_bookings_page(request):
             "can_cancel": b.start_time > now and b.status in [BookingStatus.PENDING, BookingStatus.CONFIRMED],
         })
 
-    return render(request, "my_bookings.html", {"items": items})
+    next_url = None
+    if next_cursor:
+        params = request.GET.copy()
+        params["cursor"] = next_cursor
+        next_url = f"{request.path}?{params.urlencode()}"
+
+    return render(request, "my_bookings.html", {
+        "items": items,
+        "next_url": next_url,
+        "filters": {key: request.GET.get(key, "") for key in ("status", "from", "to")},
+        "statuses": BookingStatus.choices,
+        "is_admin": is_admin,
+    })
 
 
 def to_local(dt, tz):
@@ -147,24 +225,10 @@ def to_local(dt, tz):
     return timezone.localtime(dt, tz) if timezone.is_aware(dt) else timezone.make_aware(dt, tz)
 
 def _resolve_resource(rid: str | None, label: str | None):
-    qs = Resource.objects.all()
-    res = None
-    if rid:
-        try:
-            UUID(str(rid))
-            res = qs.filter(pk=rid).first()
-        except Exception:
-            pass
-
-    if not res and rid and hasattr(Resource, "place_id"):
-        res = qs.filter(place_id=rid).first()
-
-    if not res and rid:
-        res = qs.filter(Q(location_name__iexact=rid) | Q(name__iexact=rid)).first()
-    if not res and label:
-        res = qs.filter(Q(location_name__iexact=label) | Q(name__iexact=label)).first()
-
-    return res
+    pk = resolve_resource_id(rid, label)
+    if pk is None:
+        return None
+    return Resource.objects.filter(pk=pk).first()
 
 class AvailabilityView(views.APIView):
     permission_classes = [permissions.AllowAny]
@@ -181,49 +245,129 @@ class AvailabilityView(views.APIView):
         except Exception:
             return Response({"detail": "bad date"}, status=status.HTTP_400_BAD_REQUEST)
 
-        tz = timezone.get_current_timezone()
-        open_start = timezone.make_aware(datetime.combine(d, dtime(10, 0)), tz)
-        open_end   = timezone.make_aware(datetime.combine(d, dtime(20, 0)), tz)
-
-        res = _resolve_resource(rid, label)
-
-        busy = []
-        if res:
-            qs = (Booking.objects
-                .filter(resource=res,
-                        status__in=[BookingStatus.PENDING, BookingStatus.CONFIRMED],
-                        start_time__lt=open_end,
-                        end_time__gt=open_start)
-                .values("start_time", "end_time"))
-
-            for b in qs:
-                s = to_tz(b["start_time"], tz)
-                e = to_tz(b["end_time"], tz)
-                if e > open_start and s < open_end:
-                    busy.append({"start": max(s, open_start), "end": min(e, open_end)})
-        free = [(open_start, open_end)]
-        for b in sorted(busy, key=lambda x: x["start"]):
-            new_free = []
-            for f_start, f_end in free:
-                if b["end"] <= f_start or b["start"] >= f_end:
-                    new_free.append((f_start, f_end))
-                else:
-                    if b["start"] > f_start:
-                        new_free.append((f_start, b["start"]))
-                    if b["end"] < f_end:
-                        new_free.append((b["end"], f_end))
-            free = new_free
-
-        step = timedelta(minutes=15)
-        slots = []
-        for f_start, f_end in free:
-            t = f_start
-            while t + step <= f_end:
-                slots.append({"start": t.isoformat(), "end": (t + step).isoformat()})
-                t += step
+        slots = day_availability(resolve_resource_id(rid, label), d)["slots"]
 
         return Response(slots, status=200)
 
+MAX_BATCH_DAYS = 31
+MAX_BATCH_RESOURCES = 50
+
+def _resolve_resources(rids):
+    """Versi banyak-sekaligus dari `resolve_resource_id`: UUID yang belum di-cache diambil dengan satu query."""
+    uuids = {}
+    for rid in rids:
+        try:
+            uuids[rid] = UUID(rid)
+        except ValueError:
+            pass
+    existing = set(Resource.objects.filter(pk__in=uuids.values()).values_list("pk", flat=True))
+    return {
+        rid: uuids[rid] if uuids.get(rid) in existing else resolve_resource_id(rid)
+        for rid in rids
+    }
+
+class BatchAvailabilityView(views.APIView):
+    """
+    Ketersediaan banyak resource untuk rentang tanggal dalam satu request.
+    Setiap hari dikirim sebagai bitmap hex: bit ke-i (dari bit terendah)
+    menyala bila slot 15 menit ke-i sejak jam buka masih kosong.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        rids = [
+            rid.strip()
+            for value in request.query_params.getlist("resources")
+            for rid in value.split(",")
+            if rid.strip()
+        ]
+        rids = list(dict.fromkeys(rids))
+        start_str = request.query_params.get("start")
+        if not rids or not start_str:
+            return Response({"detail": "missing resources/start"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            first_day = date.fromisoformat(start_str)
+            last_day = date.fromisoformat(request.query_params.get("end") or start_str)
+        except ValueError:
+            return Response({"detail": "bad date"}, status=status.HTTP_400_BAD_REQUEST)
+
+        day_count = (last_day - first_day).days + 1
+        if day_count < 1 or day_count > MAX_BATCH_DAYS:
+            return Response({"detail": f"date range must be 1-{MAX_BATCH_DAYS} days"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rids) > MAX_BATCH_RESOURCES:
+            return Response({"detail": f"at most {MAX_BATCH_RESOURCES} resources"}, status=status.HTTP_400_BAD_REQUEST)
+
+        resolved = _resolve_resources(rids)
+        bitmaps = availability_bitmaps({pk for pk in resolved.values() if pk}, first_day, last_day)
+        days = [first_day + timedelta(days=i) for i in range(day_count)]
+        width = -(-SLOTS_PER_DAY // 4)
+
+        resources = {}
+        for rid, pk in resolved.items():
+            per_day = bitmaps[pk] if pk else {}
+            resources[rid] = {
+                "resource_id": str(pk) if pk else None,
+                "days": {
+                    day.isoformat(): format(per_day.get(day, FULL_DAY_MASK), f"0{width}x")
+                    for day in days
+                },
+            }
+
+        return Response({
+            "open": OPEN_TIME.strftime("%H:%M"),
+            "close": CLOSE_TIME.strftime("%H:%M"),
+            "slot_minutes": SLOT_MINUTES,
+            "slots_per_day": SLOTS_PER_DAY,
+            "resources": resources,
+        }, status=200)
+
+MAX_QUOTE_DAYS = 14
+
+class PriceQuoteView(views.APIView):
+    """Harga satu booking (resource, start, end) sebelum dipesan."""
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        res = _resolve_resource(request.query_params.get("resource"), request.query_params.get("label"))
+        if res is None:
+            return Response({"detail": "resource not found"}, status=status.HTTP_404_NOT_FOUND)
+        start = _parse_iso(request.query_params.get("start"))
+        end = _parse_iso(request.query_params.get("end"))
+        if not (start and end) or end <= start:
+            return Response({"detail": "bad datetime"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"resource_id": str(res.pk), "price": quote_price(res, start, end)}, status=200)
+
+class WeekQuoteView(views.APIView):
+    """
+    Grid harga satu minggu dalam satu request: untuk setiap hari sejak
+    `start` dan setiap jam mulai dalam jam buka (setiap `step_minutes`),
+    harga booking berdurasi `duration_minutes`.
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        res = _resolve_resource(request.query_params.get("resource"), request.query_params.get("label"))
+        if res is None:
+            return Response({"detail": "resource not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            first_day = date.fromisoformat(request.query_params.get("start") or timezone.localdate().isoformat())
+            duration = int(request.query_params.get("duration_minutes", 60))
+            step = int(request.query_params.get("step_minutes", SLOT_MINUTES))
+            days = int(request.query_params.get("days", 7))
+        except ValueError:
+            return Response({"detail": "bad parameters"}, status=status.HTTP_400_BAD_REQUEST)
+        if duration <= 0 or duration % SLOT_MINUTES or step <= 0 or step % SLOT_MINUTES:
+            return Response(
+                {"detail": f"duration_minutes and step_minutes must be multiples of {SLOT_MINUTES}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not 1 <= days <= MAX_QUOTE_DAYS:
+            return Response({"detail": f"days must be 1-{MAX_QUOTE_DAYS}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        grid = quote_week(res, first_day, timedelta(minutes=duration), step, days)
+        return Response({"resource_id": str(res.pk), **grid}, status=200)
+
 def to_tz(dt, tz):
     if dt is None:
         return None
@@ -238,6 +382,34 @@ def _parse_iso(s: str):
         dt = timezone.make_aware(dt, dt_timezone.utc)
     return dt
 
+def _resolve_or_create_resource(rid, label):
+    """Resource untuk form booking; spot yang belum punya Resource dibuatkan dari label-nya."""
+    res = _resolve_resource(rid, label)
+
+    if not res and label:
+        r_kwargs = {
+            "name": label,
+            "location_name": label,
+            "is_active": True,
+        }
+        # Hanya place id spot yang benar-benar ada; kolom FK ini tanpa constraint database.
+        if hasattr(Resource, "place_id") and is_known_place_id(rid):
+            r_kwargs["place_id"] = rid
+        if hasattr(Resource, "slot_minutes"):
+            r_kwargs["slot_minutes"] = 60
+        if hasattr(Resource, "price_per_hour"):
+            r_kwargs["price_per_hour"] = 0
+        if hasattr(Resource, "sport_type"):
+            r_kwargs["sport_type"] = "other"
+        try:
+            res = Resource.objects.create(**r_kwargs)
+        except Exception as e:
+            return None, Response({"detail": "resource create failed"}, status=400)
+
+    if not res:
+        return None, Response({"detail": "resource not found"}, status=400)
+    return res, None
+
 class BookingCreateView(views.APIView):
     authentication_classes = (CsrfExemptSessionAuthentication,)
     permission_classes = [IsUserOrAdminSession]
@@ -253,38 +425,9 @@ class BookingCreateView(views.APIView):
         if not (start and end) or end <= start:
             return Response({"detail": "bad datetime"}, status=400)
 
-        res = _resolve_resource(rid, label)
-
-        if not res and label:
-            r_kwargs = {
-                "name": label,
-                "location_name": label,
-                "is_active": True,
-            }
-            if hasattr(Resource, "place_id") and rid:
-                r_kwargs["place_id"] = rid
-            if hasattr(Resource, "slot_minutes"):
-                r_kwargs["slot_minutes"] = 60
-            if hasattr(Resource, "price_per_hour"):
-                r_kwargs["price_per_hour"] = 0
-            if hasattr(Resource, "sport_type"):
-                r_kwargs["sport_type"] = "other"
-            try:
-                res = Resource.objects.create(**r_kwargs)
-            except Exception as e:
-                return Response({"detail": "resource create failed"}, status=400)
-
-        if not res:
-            return Response({"detail": "resource not found"}, status=400)
-
-        clash = Booking.objects.filter(
-            resource=res,
-            status__in=[BookingStatus.PENDING, BookingStatus.CONFIRMED],
-            start_time__lt=end,
-            end_time__gt=start,
-        ).exists()
-        if clash:
-            return Response({"detail": "time conflict"}, status=409)
+        res, error = _resolve_or_create_resource(rid, label)
+        if error is not None:
+            return error
 
         def has_bfield(name):
             return any(getattr(f, "name", None) == name for f in Booking._meta.get_fields())
@@ -297,21 +440,17 @@ class BookingCreateView(views.APIView):
 
         b_kwargs = dict(
             user=booking_user,
-            resource=res,
-            start_time=start,
-            end_time=end,
             status=BookingStatus.PENDING,
             notes=notes,
         )
 
         if has_bfield("price"):
-            dur_hours = Decimal((end - start).total_seconds()) / Decimal(3600)
-            price_per_hour = Decimal(getattr(res, "price_per_hour", 0) or 0)
-            b_kwargs["price"] = (price_per_hour * dur_hours).quantize(Decimal("0.01"))
+            b_kwargs["price"] = quote_price(res, start, end)
 
         try:
-            with transaction.atomic():
-                b = Booking.objects.create(**b_kwargs)
+            b = write_booking(res.pk, start, end, **b_kwargs)
+        except BookingConflict:
+            return Response({"detail": "time conflict"}, status=409)
         except IntegrityError as e:
             return Response({"detail": f"integrity error: {e}"}, status=400)
         except Exception as e:
@@ -320,25 +459,102 @@ class BookingCreateView(views.APIView):
         return Response({"id": str(b.id)}, status=201)
 
     
+class RecurringBookingView(views.APIView):
+    """
+    Booking berulang mingguan dalam satu request, mis. jadwal latihan
+    komunitas selama satu semester:
+
+        {"resource_id": ..., "resource_label": ..., "start_date": "2026-01-05",
+         "start_time": "19:00", "duration_minutes": 90,
+         "rrule": "FREQ=WEEKLY;BYDAY=MO,TH;COUNT=32", "notes": ...}
+
+    Kemunculan yang bentrok dilewati dan dilaporkan di "conflicts".
+    """
+    authentication_classes = (CsrfExemptSessionAuthentication,)
+    permission_classes = [IsUserOrAdminSession]
+
+    def post(self, request):
+        data = request.data or {}
+        try:
+            first_day = date.fromisoformat(data.get("start_date") or "")
+            start_time = dtime.fromisoformat(data.get("start_time") or "")
+            duration = timedelta(minutes=int(data.get("duration_minutes") or 60))
+            rule = parse_weekly_rule(data.get("rrule"))
+        except (TypeError, ValueError) as e:
+            return Response({"detail": f"bad recurrence: {e}"}, status=400)
+        if not timedelta(0) < duration <= timedelta(hours=12):
+            return Response({"detail": "duration_minutes must be 1-720"}, status=400)
+
+        res, error = _resolve_or_create_resource(data.get("resource_id"), (data.get("resource_label") or "").strip())
+        if error is not None:
+            return error
+
+        booking_user = request.user
+        if not (booking_user and booking_user.is_authenticated):
+            booking_user = _get_or_create_admin_user(request)
+        if booking_user is None:
+            return Response({"detail": "Unauthorized"}, status=401)
+
+        now = timezone.now()
+        occurrences = expand_weekly(first_day, start_time, duration, **rule)
+        upcoming = [(start, end) for start, end in occurrences if start > now]
+
+        created, conflicts = book_recurring(
+            res, upcoming,
+            user=booking_user, status=BookingStatus.PENDING, notes=(data.get("notes") or "").strip(),
+        )
+        tz = timezone.get_current_timezone()
+        return Response({
+            "created": [
+                {"id": str(b.id), "start": to_tz(b.start_time, tz).isoformat(), "end": to_tz(b.end_time, tz).isoformat()}
+                for b in created
+            ],
+            "conflicts": [
+                {"start": to_tz(start, tz).isoformat(), "end": to_tz(end, tz).isoformat()}
+                for start, end in conflicts
+            ],
+            "skipped_past": len(occurrences) - len(upcoming),
+        }, status=201 if created else 409)
+
+def _page_size(value):
+    if not value:
+        return BOOKING_PAGE_SIZE
+    size = int(value)
+    if not 1 <= size <= BOOKING_MAX_PAGE_SIZE:
+        raise ValueError("bad limit")
+    return size
+
 class MyBookingAPI(views.APIView):
+    """
+    Booking milik user (atau semua booking untuk admin), termasuk yang sudah
+    diarsipkan, terbaru dulu, per halaman. Halaman berikutnya ditunjuk lewat header Link/X-Next-Cursor,
+    sehingga body tetap berupa list seperti sebelumnya.
+    """
     permission_classes = [IsUserOrAdminSession]
 
     def get(self, request):
         now = timezone.now()
-        if _has_admin_access(request):
-            qs = (
-                Booking.objects.select_related("resource", "user")
-                .all()
-                .order_by("-start_time")
-            )
-        else:
-            qs = (
-                Booking.objects.filter(user=request.user)
-                .select_related("resource")
-                .order_by("-start_time")
+        is_admin = _has_admin_access(request)
+        querysets = []
+        for model in (Booking, BookingArchive):
+            if is_admin:
+                querysets.append(model.objects.select_related("resource", "user"))
+            else:
+                querysets.append(model.objects.filter(user=request.user).select_related("resource"))
+
+        params = request.query_params
+        try:
+            page, next_cursor = keyset_page_merged(
+                [filter_bookings(qs, params) for qs in querysets],
+                ["-start_time", "-pk"],
+                params.get("cursor"),
+                _page_size(params.get("limit")),
             )
+        except ValueError:
+            return Response({"detail": "bad filter, limit or cursor"}, status=400)
+
         out = []
-        for b in qs:
+        for b in page:
             can_cancel = (
                 b.start_time > now
                 and b.status in [BookingStatus.PENDING, BookingStatus.CONFIRMED]
@@ -346,14 +562,66 @@ class MyBookingAPI(views.APIView):
             out.append({
                 "id": str(b.id),
                 "place_name": getattr(b.resource, "name", "") or getattr(b.resource, "place_id", ""),
-                "owner": getattr(b.user, "username", None) if _has_admin_access(request) else None,
+                "owner": getattr(b.user, "username", None) if is_admin else None,
                 "start": timezone.localtime(b.start_time).isoformat(),
                 "end": timezone.localtime(b.end_time).isoformat(),
                 "status": b.status,
                 "can_cancel": can_cancel,
                 "notes": getattr(b, "notes", "") or "",
             })
-        return Response(out, status=200)
+
+        response = Response(out, status=200)
+        if next_cursor:
+            next_params = params.copy()
+            next_params["cursor"] = next_cursor
+            response["Link"] = f'<{request.build_absolute_uri(request.path)}?{next_params.urlencode()}>; rel="next"'
+            response["X-Next-Cursor"] = next_cursor
+        return response
+
+EXPORT_COLUMNS = ["id", "user__username", "resource_id", "resource__name", "start_time", "end_time", "status", "price", "notes", "created_at"]
+
+class _Echo:
+    def write(self, value):
+        return value
+
+class BookingExportView(views.APIView):
+    """
+    Ekspor semua booking, termasuk arsip (dengan filter yang sama seperti
+    MyBookingAPI) sebagai CSV atau JSONL yang di-stream per baris, untuk admin.
+    """
+    permission_classes = [IsUserOrAdminSession]
+
+    def get(self, request):
+        if not _has_admin_access(request):
+            return Response({"detail": "admin only"}, status=403)
+        kind = request.query_params.get("type", "csv")
+        if kind not in ("csv", "jsonl"):
+            return Response({"detail": "type must be csv or jsonl"}, status=400)
+        try:
+            querysets = [filter_bookings(model.objects.all(), request.query_params) for model in (Booking, BookingArchive)]
+        except ValueError:
+            return Response({"detail": "bad filter"}, status=400)
+
+        # Booking aktif dan arsipnya digabung berurutan (start_time, id) tanpa memuat semuanya ke memori.
+        start_index, id_index = EXPORT_COLUMNS.index("start_time"), EXPORT_COLUMNS.index("id")
+        rows = heapq.merge(
+            *(qs.order_by("start_time", "pk").values_list(*EXPORT_COLUMNS).iterator(chunk_size=2000) for qs in querysets),
+            key=lambda row: (row[start_index], row[id_index]),
+        )
+        if kind == "csv":
+            writer = csv.writer(_Echo())
+            lines = itertools.chain([writer.writerow(EXPORT_COLUMNS)], (writer.writerow(row) for row in rows))
+            content_type = "text/csv; charset=utf-8"
+        else:
+            lines = (
+                json.dumps(dict(zip(EXPORT_COLUMNS, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+                for row in rows
+            )
+            content_type = "application/x-ndjson; charset=utf-8"
+
+        response = StreamingHttpResponse(lines, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="bookings.{kind}"'
+        return response
 
 @method_decorator(csrf_exempt, name="dispatch")
 class BookingCancelView(views.APIView):
@@ -410,31 +678,20 @@ class BookingUpdateView(views.APIView):
 
         res = b.resource
 
-        clash = (
-            Booking.objects.filter(
-                resource=res,
-                status__in=[BookingStatus.PENDING, BookingStatus.CONFIRMED],
-                start_time__lt=end,
-                end_time__gt=start,
-            )
-            .exclude(pk=b.pk)
-            .exists()
-        )
-        if clash:
-            return Response({"detail": "time conflict"}, status=409)
-
         def has_bfield(name):
             return any(getattr(f, "name", None) == name for f in Booking._meta.get_fields())
 
-        b.start_time = start
-        b.end_time = end
-
+        changes = {}
         if has_bfield("price"):
-            dur_hours = Decimal((end - start).total_seconds()) / Decimal(3600)
-            price_per_hour = Decimal(getattr(res, "price_per_hour", 0) or 0)
-            b.price = (price_per_hour * dur_hours).quantize(Decimal("0.01"))
+            changes["price"] = quote_price(res, start, end)
 
-        b.save()
+        try:
+            write_booking(res.pk, start, end, booking=b, **changes)
+        except BookingNotEditable:
+            # Dibatalkan atau dimulai sejak pengecekan di atas.
+            return Response({"detail": "booking cannot be edited"}, status=400)
+        except BookingConflict:
+            return Response({"detail": "time conflict"}, status=409)
 
         return Response(
             {
@@ -22,8 +22,9 @@ class CommunityAdmin(admin.ModelAdmin):
     admin_list.short_description = 'Admins'
 
     def member_count(self, obj):
-        return obj.members.count()
+        return obj.members_count
     member_count.short_description = 'Members'
+    member_count.admin_order_field = 'members_count'
 
 
 @admin.register(CommunityPost)
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:58
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_members_count(apps, schema_editor):
+    """Isi members_count dari data anggota yang sudah ada."""
+    Community = apps.get_model('community', 'Community')
+    Through = Community.members.through
+    counts = (
+        Through.objects.filter(community=OuterRef('pk'))
+        .order_by()
+        .values('community')
+        .annotate(n=Count('*'))
+        .values('n')
+    )
+    Community.objects.update(members_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0007_alter_community_category'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='community',
+            name='members_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_members_count, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from home.utils.counters import CounterFieldsMixin, track_m2m_count
 
 SPORT_CHOICES = [
     ('Aerobics', 'Aerobics'),
@@ -124,7 +125,7 @@ SPORT_CHOICES = [
     ('Zumba', 'Zumba'),
 ]
 
-class Community(models.Model):
+class Community(CounterFieldsMixin, models.Model):
     name = models.CharField(
         max_length=200, 
         help_text='Name of the sports community'
@@ -178,6 +179,9 @@ class Community(models.Model):
         blank=True,
         related_name='joined_communities'
     )
+    # Dijaga oleh sinyal m2m_changed (lihat bawah); perbaiki dengan `manage.py repair_counters`.
+    members_count = models.PositiveIntegerField(default=0, editable=False)
+    counter_fields = ('members_count',)
 
     class Meta:
         verbose_name = 'Community'
@@ -199,6 +203,8 @@ class Community(models.Model):
             return False
         return self.members.filter(id=user.id).exists()
 
+track_m2m_count(Community.members, 'members_count')
+
 class CommunityPost(models.Model):
     community = models.ForeignKey(Community, on_delete=models.deletion.CASCADE, related_name='posts')
     title = models.CharField(max_length=100)
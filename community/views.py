@@ -12,6 +12,7 @@ from decimal import Decimal
 from .models import Community, CommunityPost 
 from .forms import CommunityForm
 from home.models import FitnessSpot
+from event.services import upcoming_community_events
 
 User = get_user_model()
 
@@ -47,7 +48,7 @@ def ajax_join_community(request, community_id):
             if request.user in community.admins.all():
                  return JsonResponse({"success": False, "error": "Admin cannot leave via this method."}, status=403)
             community.members.add(request.user)
-            member_count = community.members.count()
+            member_count = community.members_count
             return JsonResponse({"success": True, "member_count": member_count, "action": "joined"})
         except Community.DoesNotExist:
             return JsonResponse({"success": False, "error": "Community not found"}, status=404)
@@ -65,7 +66,7 @@ def ajax_leave_community(request, community_id):
             if request.user in community.admins.all():
                  return JsonResponse({"success": False, "error": "Admin cannot leave via this method."}, status=403)
             community.members.remove(request.user)
-            member_count = community.members.count()
+            member_count = community.members_count
             return JsonResponse({"success": True, "member_count": member_count, "action": "left"})
         except Community.DoesNotExist:
             return JsonResponse({"success": False, "error": "Community not found"}, status=404)
@@ -250,7 +251,10 @@ def community_detail(request, pk):
         Community.objects.select_related('fitness_spot').prefetch_related('members', 'admins'),
         pk=pk
     )
-    return render(request, 'community/community_detail.html', {'community': community})
+    return render(request, 'community/community_detail.html', {
+        'community': community,
+        'upcoming_events': upcoming_community_events(community, request.user),
+    })
 
 def communities_by_place_json(request, place_id):
     try:
@@ -370,7 +374,8 @@ def create_community_flutter(request):
     return JsonResponse({"status": "error", "message": "Method not allowed"}, status=401)
 
 def communities_json(request):
-    communities = Community.objects.all().order_by('-created_at')
+    order = ('-members_count', '-created_at') if request.GET.get('sort') == 'members' else ('-created_at',)
+    communities = Community.objects.all().order_by(*order)
     data = []
     for c in communities:
         data.append({
@@ -380,7 +385,7 @@ def communities_json(request):
             "short_description": c.short_description,
             "description": c.description,
             "contact_info": c.contact_info,
-            "members_count": c.members.count(),
+            "members_count": c.members_count,
             "image": c.image.url if c.image else None,
             "fitness_spot": {
                 "id": str(c.fitness_spot.pk),
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Event
+from .models import Event, EventWaitlistEntry
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
@@ -27,7 +27,7 @@ class EventAdmin(admin.ModelAdmin):
             'fields': ('date', 'location', 'registration_deadline')
         }),
         ('Participants', {
-            'fields': ('participants', 'participant_count')
+            'fields': ('capacity', 'participants', 'participant_count')
         }),
         ('Metadata', {
             'fields': ('created_at', 'updated_at'),
@@ -37,11 +37,20 @@ class EventAdmin(admin.ModelAdmin):
     
     def participant_count(self, obj):
         """Display number of participants"""
-        return obj.participants.count()
+        return obj.participants_count
     participant_count.short_description = 'Participants'
+    participant_count.admin_order_field = 'participants_count'
     
     def registration_status(self, obj):
         """Display registration status with color indicator"""
         return obj.registration_open()
     registration_status.short_description = 'Registration Open'
     registration_status.boolean = True
+
+
+@admin.register(EventWaitlistEntry)
+class EventWaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('event', 'user', 'created_at')
+    list_filter = ('event__community',)
+    search_fields = ('event__name', 'user__username')
+    raw_id_fields = ('event', 'user')
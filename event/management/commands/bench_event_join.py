@@ -0,0 +1,96 @@
+import time
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from community.models import Community
+from event import services
+from event.models import Event, EventWaitlistEntry
+from home.models import FitnessSpot
+from home.utils.bench import DB_ERROR, ensure_scratch_database, format_latency, run_concurrent
+
+User = get_user_model()
+
+BENCH_PREFIX = 'bench-event-join'
+
+
+class Command(BaseCommand):
+    help = (
+        'Mengukur throughput join event saat banyak user mendaftar bersamaan ke event berkapasitas, '
+        'lalu (opsional) sebagian peserta keluar supaya antrean dipromosikan. Memeriksa kapasitas '
+        'tidak terlampaui dan counter cocok dengan jumlah baris peserta.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help='Jumlah user yang join (satu join per user)')
+        parser.add_argument('--workers', type=int, default=16, help='Jumlah thread yang berjalan bersamaan')
+        parser.add_argument('--capacity', type=int, default=50, help='Kapasitas event')
+        parser.add_argument('--leaves', type=int, default=10, help='Jumlah peserta yang keluar setelah burst join')
+
+    def handle(self, *args, **options):
+        ensure_scratch_database()
+        workers = max(1, options['workers'])
+        capacity = max(1, options['capacity'])
+        users = [User.objects.create(username=f'{BENCH_PREFIX}-{i}') for i in range(options['users'])]
+        spot = FitnessSpot.objects.create(
+            name=f'{BENCH_PREFIX} spot', address='-', place_id=f'{BENCH_PREFIX}-{time.time_ns()}',
+            latitude=-6.2, longitude=106.8,
+        )
+        community = Community.objects.create(
+            name=f'{BENCH_PREFIX} community', description='-', fitness_spot=spot, category='Gym',
+        )
+        event = Event.objects.create(
+            name=f'{BENCH_PREFIX} event', description='-', location='-', community=community,
+            created_by=users[0], date=timezone.now() + timedelta(days=7), capacity=capacity,
+        )
+
+        # Instance terpisah per thread: join/leave memperbarui participants_count di instance.
+        def join(user):
+            return services.join_event(Event.objects.get(pk=event.pk), user)
+
+        def leave(user):
+            return services.leave_event(Event.objects.get(pk=event.pk), user)
+
+        try:
+            joins, join_elapsed = run_concurrent(join, users, workers)
+            participants = set(
+                Event.participants.through.objects.filter(event=event).values_list('user_id', flat=True)
+            )
+            leavers = [user for user in users if user.pk in participants][:max(0, options['leaves'])]
+            leaves, leave_elapsed = run_concurrent(leave, leavers, workers)
+
+            outcomes = [outcome for outcome, _ in joins]
+            event.refresh_from_db()
+            rows = Event.participants.through.objects.filter(event=event).count()
+            waiting = EventWaitlistEntry.objects.filter(event=event).count()
+
+            self.stdout.write(f'Database           : {connection.vendor}')
+            self.stdout.write(f'User               : {len(users)} ({workers} thread), kapasitas {capacity}')
+            self.stdout.write(f'Join berhasil      : {outcomes.count(services.JOINED)}')
+            self.stdout.write(f'Masuk antrean      : {outcomes.count(services.WAITLISTED)}')
+            self.stdout.write(f'Error database     : {outcomes.count(DB_ERROR)}')
+            self.stdout.write(f'Throughput join    : {len(joins) / join_elapsed:.1f} join/s ({join_elapsed:.3f}s)')
+            self.stdout.write(f'Latensi join p50/95: {format_latency(latency for _, latency in joins)}')
+            if leaves:
+                self.stdout.write(f'Keluar + promosi   : {len(leaves)} dalam {leave_elapsed:.3f}s, '
+                                  f'p50/p95 {format_latency(latency for _, latency in leaves)}')
+
+            # Join/leave yang gagal karena error database di-rollback utuh, jadi jumlah
+            # pasti hanya bisa diharapkan bila semuanya berhasil.
+            failed = outcomes.count(DB_ERROR) + [outcome for outcome, _ in leaves].count(DB_ERROR)
+            expected = rows if failed else min(capacity, len(users) - len(leavers))
+            if rows > capacity or rows != event.participants_count or rows != expected:
+                self.stdout.write(self.style.ERROR(
+                    f'Tidak konsisten: {rows} baris peserta, counter {event.participants_count}, '
+                    f'kapasitas {capacity}, antrean {waiting}'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Konsisten: {rows}/{capacity} kursi terisi, counter cocok, {waiting} user di antrean'
+                ))
+        finally:
+            event.delete()
+            community.delete()
+            spot.delete()
+            User.objects.filter(pk__in=[u.pk for u in users]).delete()
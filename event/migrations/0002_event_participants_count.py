@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 11:58
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_participants_count(apps, schema_editor):
+    """Isi participants_count dari data peserta yang sudah ada."""
+    Event = apps.get_model('event', 'Event')
+    Through = Event.participants.through
+    counts = (
+        Through.objects.filter(event=OuterRef('pk'))
+        .order_by()
+        .values('event')
+        .annotate(n=Count('*'))
+        .values('n')
+    )
+    Event.objects.update(participants_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='participants_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_participants_count, migrations.RunPython.noop),
+    ]
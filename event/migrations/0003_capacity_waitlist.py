@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0002_event_participants_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, help_text='Batas jumlah peserta (kosongkan bila tidak dibatasi)', null=True),
+        ),
+        migrations.CreateModel(
+            name='EventWaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='event.event')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_waitlist_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Waitlist Entry',
+                'verbose_name_plural': 'Waitlist Entries',
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['event', 'created_at', 'id'], name='event_waitlist_order_idx')],
+                'constraints': [models.UniqueConstraint(fields=('event', 'user'), name='unique_event_waitlist_user')],
+            },
+        ),
+    ]
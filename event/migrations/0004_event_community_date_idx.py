@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0008_community_members_count'),
+        ('event', '0003_capacity_waitlist'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['community', 'date'], name='event_community_date_idx'),
+        ),
+    ]
@@ -1,10 +1,45 @@
 from django.db import models
 from django.conf import settings
+from django.db.models import BooleanField, Case, Exists, OuterRef, Value, When
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
+from BlognEvent.models import Event as BlogEvent
 from community.models import Community
+from home.utils.counters import CounterFieldsMixin, track_m2m_count
 
 
-class Event(models.Model):
+class EventQuerySet(models.QuerySet):
+    def with_viewer(self, user, now=None):
+        """
+        Anotasi status untuk `user` dalam satu query: `is_participant`,
+        `is_community_admin` dan `registration_is_open` (jumlah peserta
+        sudah tersedia di kolom `participants_count`). Method izin di Event memakai anotasi ini
+        bila ada, jadi daftar event tidak lagi butuh query per event.
+        """
+        now = now or timezone.now()
+        qs = self.annotate(
+            registration_is_open=Case(
+                When(registration_deadline__isnull=False, registration_deadline__gte=now, then=Value(True)),
+                When(registration_deadline__isnull=True, date__gte=now, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+        if user is None or not user.is_authenticated:
+            return qs
+        return qs.annotate(
+            viewer_id=Value(user.pk),
+            is_participant=Exists(
+                self.model.participants.through.objects.filter(event_id=OuterRef('pk'), user_id=user.pk)
+            ),
+            is_community_admin=Exists(
+                Community.admins.through.objects.filter(community_id=OuterRef('community_id'), user_id=user.pk)
+            ),
+        )
+
+
+class Event(CounterFieldsMixin, models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
     date = models.DateTimeField()
@@ -27,6 +62,14 @@ class Event(models.Model):
         related_name='joined_events', 
         blank=True
     )
+    # Dijaga oleh sinyal m2m_changed (lihat bawah); perbaiki dengan `manage.py repair_counters`.
+    participants_count = models.PositiveIntegerField(default=0, editable=False)
+    counter_fields = ('participants_count',)
+    capacity = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text='Batas jumlah peserta (kosongkan bila tidak dibatasi)'
+    )
 
     registration_deadline = models.DateTimeField(
         null=True, 
@@ -37,14 +80,20 @@ class Event(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EventQuerySet.as_manager()
+
     class Meta:
         ordering = ['date']
         verbose_name = 'Event'
         verbose_name_plural = 'Events'
+        indexes = [
+            # Daftar event per komunitas selalu difilter community lalu diurutkan/dibatasi per tanggal.
+            models.Index(fields=['community', 'date'], name='event_community_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.community.name})"
-    
+
     def is_past(self):
         return timezone.now() > self.date
 
@@ -52,7 +101,16 @@ class Event(models.Model):
         now = timezone.now()
         return self.date <= now <= (self.date + timezone.timedelta(hours=2))
     
+    def _viewer_annotation(self, name, user):
+        """Nilai anotasi `name` dari EventQuerySet.with_viewer untuk `user`, atau None bila tidak ada."""
+        if self.__dict__.get('viewer_id') == user.pk and name in self.__dict__:
+            return self.__dict__[name]
+        return None
+
     def registration_open(self):
+        if 'registration_is_open' in self.__dict__:
+            return self.registration_is_open
+
         now = timezone.now()
 
         if self.registration_deadline:
@@ -67,10 +125,10 @@ class Event(models.Model):
         if user.is_staff or user.is_superuser:
             return True
 
-        if self.community.is_admin(user):
-            return True
-        
-        return False
+        is_admin = self._viewer_annotation('is_community_admin', user)
+        if is_admin is None:
+            is_admin = self.community.is_admin(user)
+        return bool(is_admin)
 
     def can_delete(self, user):
         return self.can_edit(user)
@@ -79,7 +137,7 @@ class Event(models.Model):
         if not user.is_authenticated:
             return False
 
-        if self.participants.filter(id=user.id).exists():
+        if self.user_is_participant(user):
             return False
 
         if not self.registration_open():
@@ -90,7 +148,77 @@ class Event(models.Model):
     def user_is_participant(self, user):
         if not user.is_authenticated:
             return False
-        return self.participants.filter(id=user.id).exists()
+        is_participant = self._viewer_annotation('is_participant', user)
+        if is_participant is None:
+            is_participant = self.participants.filter(id=user.id).exists()
+        return bool(is_participant)
     
     def participant_count(self):
-        return self.participants.count()
+        return self.participants_count
+
+    def is_full(self):
+        return self.capacity is not None and self.participants_count >= self.capacity
+
+    def seats_left(self):
+        if self.capacity is None:
+            return None
+        return max(self.capacity - self.participants_count, 0)
+
+
+class EventWaitlistEntry(models.Model):
+    """Antrean peserta untuk event yang penuh; dipromosikan urut `created_at` saat ada kursi kosong."""
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='waitlist')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='event_waitlist_entries'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        verbose_name = 'Waitlist Entry'
+        verbose_name_plural = 'Waitlist Entries'
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'user'], name='unique_event_waitlist_user'),
+        ]
+        indexes = [
+            models.Index(fields=['event', 'created_at', 'id'], name='event_waitlist_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} menunggu {self.event.name}"
+
+
+track_m2m_count(Event.participants, 'participants_count')
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=BlogEvent)
+@receiver(post_delete, sender=BlogEvent)
+@receiver(post_save, sender=Community)
+@receiver(post_delete, sender=Community)
+@receiver(m2m_changed, sender=BlogEvent.locations.through)
+def invalidate_calendars_on_change(sender, action=None, **kwargs):
+    """Isi feed kalender berubah; perubahan participants_count lewat UPDATE tidak memicu ini."""
+    if action is not None and not action.startswith('post_'):
+        return
+    from .services import invalidate_calendars
+    invalidate_calendars()
+
+
+@receiver(m2m_changed, sender=Event.participants.through)
+@receiver(m2m_changed, sender=Community.members.through)
+def invalidate_user_calendars_on_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Feed pribadi user ikut berubah saat ia ikut/keluar event atau komunitas."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    from .services import invalidate_calendars, invalidate_user_calendars
+    if reverse:
+        invalidate_user_calendars([instance.pk])
+    elif action == 'post_clear':
+        # Daftar user yang dikeluarkan sudah tidak diketahui; tandai semua feed usang.
+        invalidate_calendars()
+    else:
+        invalidate_user_calendars(pk_set or ())
@@ -0,0 +1,354 @@
+import hashlib
+import time
+from datetime import timedelta, timezone as dt_timezone
+from django.core import signing
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+from BlognEvent.models import Event as BlogEvent
+from community.models import Community
+from .models import Event, EventWaitlistEntry
+
+JOINED = 'joined'
+WAITLISTED = 'waitlisted'
+ALREADY_JOINED = 'already_joined'
+ALREADY_WAITLISTED = 'already_waitlisted'
+CLOSED = 'closed'
+
+LEFT = 'left'
+LEFT_WAITLIST = 'left_waitlist'
+NOT_JOINED = 'not_joined'
+
+Participant = Event.participants.through
+
+
+def _reserve_seat(event_id):
+    """
+    Ambil satu kursi dengan satu UPDATE bersyarat:
+    UPDATE ... SET participants_count = participants_count + 1
+    WHERE id = %s AND (capacity IS NULL OR participants_count < capacity).
+    Database yang memastikan dua join bersamaan tidak melewati kapasitas,
+    tanpa SELECT ... FOR UPDATE. Mengembalikan True bila kursi didapat.
+    """
+    return bool(
+        Event.objects.filter(pk=event_id)
+        .filter(Q(capacity__isnull=True) | Q(participants_count__lt=F('capacity')))
+        .update(participants_count=F('participants_count') + 1)
+    )
+
+
+def _release_seat(event_id):
+    Event.objects.filter(pk=event_id, participants_count__gt=0).update(
+        participants_count=F('participants_count') - 1
+    )
+
+
+def _add_participant(event_id, user_id):
+    """
+    Tulis baris peserta langsung ke tabel through (tidak memicu m2m_changed,
+    jadi counter tidak terhitung dua kali). False bila user sudah peserta.
+    """
+    try:
+        with transaction.atomic():
+            Participant.objects.create(event_id=event_id, user_id=user_id)
+    except IntegrityError:
+        return False
+    return True
+
+
+def join_event(event, user):
+    """
+    Daftarkan `user` ke `event`. Bila kursi habis, user masuk antrean.
+    Mengembalikan salah satu JOINED, WAITLISTED, ALREADY_JOINED,
+    ALREADY_WAITLISTED atau CLOSED; `event.participants_count` ikut diperbarui.
+    """
+    if not event.registration_open():
+        return CLOSED
+    if Participant.objects.filter(event_id=event.pk, user_id=user.pk).exists():
+        return ALREADY_JOINED
+
+    with transaction.atomic():
+        if _reserve_seat(event.pk):
+            if not _add_participant(event.pk, user.pk):
+                _release_seat(event.pk)
+                outcome = ALREADY_JOINED
+            else:
+                EventWaitlistEntry.objects.filter(event_id=event.pk, user_id=user.pk).delete()
+                invalidate_user_calendars([user.pk])
+                outcome = JOINED
+        else:
+            _entry, created = EventWaitlistEntry.objects.get_or_create(event_id=event.pk, user_id=user.pk)
+            outcome = WAITLISTED if created else ALREADY_WAITLISTED
+
+    event.refresh_from_db(fields=['participants_count'])
+    return outcome
+
+
+def leave_event(event, user):
+    """
+    Keluarkan `user` dari peserta (lalu promosikan antrean) atau dari antrean.
+    Mengembalikan LEFT, LEFT_WAITLIST atau NOT_JOINED.
+    """
+    with transaction.atomic():
+        deleted, _ = Participant.objects.filter(event_id=event.pk, user_id=user.pk).delete()
+        if deleted:
+            _release_seat(event.pk)
+            invalidate_user_calendars([user.pk])
+            promote_waitlist(event)
+            outcome = LEFT
+        else:
+            deleted, _ = EventWaitlistEntry.objects.filter(event_id=event.pk, user_id=user.pk).delete()
+            outcome = LEFT_WAITLIST if deleted else NOT_JOINED
+
+    event.refresh_from_db(fields=['participants_count'])
+    return outcome
+
+
+def promote_waitlist(event):
+    """
+    Isi kursi kosong dari antrean, urut paling awal mendaftar. Setiap entri
+    diklaim dengan DELETE; bila dua proses mengincar entri yang sama, hanya
+    satu yang menghapusnya dan yang lain lanjut ke entri berikutnya.
+    Mengembalikan daftar id user yang dipromosikan.
+    """
+    promoted = []
+    while True:
+        entry = (
+            EventWaitlistEntry.objects.filter(event_id=event.pk)
+            .order_by('created_at', 'id')
+            .values_list('pk', 'user_id')
+            .first()
+        )
+        if entry is None:
+            break
+        entry_id, user_id = entry
+        if not _reserve_seat(event.pk):
+            break
+        claimed, _ = EventWaitlistEntry.objects.filter(pk=entry_id).delete()
+        if not claimed or not _add_participant(event.pk, user_id):
+            _release_seat(event.pk)
+            continue
+        promoted.append(user_id)
+    if promoted:
+        invalidate_user_calendars(promoted)
+    return promoted
+
+
+def waitlist_position(event, user):
+    """Posisi (mulai 1) `user` di antrean `event`, atau None bila tidak mengantre."""
+    entry = EventWaitlistEntry.objects.filter(event_id=event.pk, user_id=user.pk).first()
+    if entry is None:
+        return None
+    return EventWaitlistEntry.objects.filter(
+        Q(created_at__lt=entry.created_at) | Q(created_at=entry.created_at, pk__lte=entry.pk),
+        event_id=event.pk,
+    ).count()
+
+
+def upcoming_community_events(community, user, limit=5):
+    """
+    Event mendatang sebuah komunitas, lengkap dengan anotasi with_viewer
+    untuk `user`, dalam satu query (memakai indeks (community, date)).
+    """
+    return list(
+        Event.objects.with_viewer(user)
+        .filter(community=community, date__gt=timezone.now())
+        .order_by('date', 'pk')[:limit]
+    )
+
+
+# --- Feed iCalendar ---
+
+CALENDAR_PAST_DAYS = 90
+CALENDAR_CACHE_TIMEOUT = 60 * 60 * 24
+CALENDAR_EVENT_DURATION = timedelta(hours=2)
+CALENDAR_CHUNK_SIZE = 500
+CALENDAR_DOMAIN = 'getfittoday'
+_calendar_signer = signing.Signer(salt='event.calendar')
+
+
+def _calendar_version():
+    return cache.get_or_set('event_calendar_version', time.time_ns, None)
+
+
+def invalidate_calendars():
+    """Tandai semua feed kalender usang. Dipanggil setiap kali event (event/BlognEvent) atau komunitas berubah."""
+    cache.set('event_calendar_version', time.time_ns(), None)
+
+
+def _user_calendar_version(user_id):
+    return cache.get_or_set(f'event_calendar_user_version_{user_id}', time.time_ns, None)
+
+
+def invalidate_user_calendars(user_ids):
+    """Tandai feed pribadi user-user ini usang (ikut/keluar event atau komunitas)."""
+    now = time.time_ns()
+    cache.set_many({f'event_calendar_user_version_{user_id}': now for user_id in user_ids}, None)
+
+
+def calendar_token(user):
+    return _calendar_signer.sign(str(user.pk))
+
+
+def user_id_from_calendar_token(token):
+    """Id user dari token feed pribadi, atau None bila token tidak sah."""
+    try:
+        return int(_calendar_signer.unsign(token))
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+def _calendar_etag(scope, user_id=None):
+    """
+    ETag feed dihitung dari nomor versi di cache saja, jadi klien kalender
+    yang polling dengan If-None-Match dijawab 304 tanpa query database.
+    Tanggal hari ini ikut dihitung karena jendela event lama bergeser harian.
+    """
+    parts = [scope, str(_calendar_version()), timezone.localdate().isoformat()]
+    if user_id is not None:
+        parts.append(str(_user_calendar_version(user_id)))
+    return f'"{hashlib.md5(":".join(parts).encode()).hexdigest()}"'
+
+
+def community_calendar_etag(community_id):
+    return _calendar_etag(f'community-{community_id}')
+
+
+def user_calendar_etag(user_id):
+    return _calendar_etag(f'user-{user_id}', user_id)
+
+
+def _ics_escape(value):
+    return (
+        (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _ics_line(name, value):
+    """Satu content line RFC 5545: dilipat per 75 oktet tanpa memotong karakter UTF-8."""
+    line = f'{name}:{value}'.encode('utf-8')
+    folded = []
+    while len(line) > 75:
+        cut = 75
+        while line[cut] & 0xC0 == 0x80:
+            cut -= 1
+        folded.append(line[:cut])
+        line = b' ' + line[cut:]
+    folded.append(line)
+    return b'\r\n'.join(folded) + b'\r\n'
+
+
+def _ics_time(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _vevent(uid, stamp, start, end, summary, description, location, categories):
+    return b''.join([
+        b'BEGIN:VEVENT\r\n',
+        _ics_line('UID', f'{uid}@{CALENDAR_DOMAIN}'),
+        _ics_line('DTSTAMP', _ics_time(stamp)),
+        _ics_line('DTSTART', _ics_time(start)),
+        _ics_line('DTEND', _ics_time(end)),
+        _ics_line('SUMMARY', _ics_escape(summary)),
+        _ics_line('DESCRIPTION', _ics_escape(description)),
+        _ics_line('LOCATION', _ics_escape(location)),
+        _ics_line('CATEGORIES', _ics_escape(categories)),
+        b'END:VEVENT\r\n',
+    ])
+
+
+def _calendar_chunks(name, events, blog_events):
+    """
+    Isi feed sebagai potongan bytes: header, satu VEVENT per event, footer.
+    Baris dibaca lewat values_list().iterator() sehingga feed besar tidak
+    dimuat sekaligus ke memori dan tidak membuat instance model.
+    """
+    yield b''.join([
+        b'BEGIN:VCALENDAR\r\n',
+        b'VERSION:2.0\r\n',
+        _ics_line('PRODID', '-//GetFitToday//Events//ID'),
+        b'CALSCALE:GREGORIAN\r\n',
+        b'METHOD:PUBLISH\r\n',
+        _ics_line('X-WR-CALNAME', _ics_escape(name)),
+        b'X-PUBLISHED-TTL:PT15M\r\n',
+        b'REFRESH-INTERVAL;VALUE=DURATION:PT15M\r\n',
+    ])
+
+    rows = events.values_list('pk', 'updated_at', 'date', 'name', 'description', 'location', 'community__name')
+    for pk, updated_at, date, summary, description, location, community_name in rows.iterator(CALENDAR_CHUNK_SIZE):
+        yield _vevent(
+            f'event-{pk}', updated_at, date, date + CALENDAR_EVENT_DURATION,
+            summary, description, location, community_name,
+        )
+
+    locations = {}
+    spot_rows = BlogEvent.locations.through.objects.filter(event__in=blog_events).values_list('event_id', 'fitnessspot__name')
+    for event_id, spot_name in spot_rows.iterator(CALENDAR_CHUNK_SIZE):
+        locations.setdefault(event_id, []).append(spot_name)
+    rows = blog_events.values_list('pk', 'starting_date', 'ending_date', 'name', 'description')
+    for pk, start, end, summary, description in rows.iterator(CALENDAR_CHUNK_SIZE):
+        yield _vevent(
+            f'blognevent-{pk}', start, start, end,
+            summary, description, ', '.join(locations.get(pk, ())), 'GetFitToday',
+        )
+
+    yield b'END:VCALENDAR\r\n'
+
+
+def _cached_chunks(key, chunks):
+    """Teruskan potongan ke klien sambil mengumpulkannya; body lengkap di-cache setelah potongan terakhir."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, b''.join(parts), CALENDAR_CACHE_TIMEOUT)
+
+
+def _calendar_feed(etag, name, events, blog_events):
+    key = f'event_calendar_body:{etag}'
+    body = cache.get(key)
+    if body is not None:
+        return body
+    return _cached_chunks(key, _calendar_chunks(name, events, blog_events))
+
+
+def community_calendar(community, etag):
+    """
+    Feed komunitas: event komunitas ini ditambah event BlognEvent di fitness
+    spot tempat komunitas berlatih, mulai CALENDAR_PAST_DAYS hari lalu.
+    Mengembalikan bytes dari cache, atau iterator bytes yang di-cache di
+    bawah `etag` (dari community_calendar_etag) setelah selesai dikirim.
+    """
+    since = timezone.now() - timedelta(days=CALENDAR_PAST_DAYS)
+    events = Event.objects.filter(community=community, date__gte=since).order_by('date', 'pk')
+    blog_events = BlogEvent.objects.filter(
+        Exists(BlogEvent.locations.through.objects.filter(event_id=OuterRef('pk'), fitnessspot_id=community.fitness_spot_id)),
+        ending_date__gte=since,
+    ).order_by('starting_date', 'pk')
+    return _calendar_feed(etag, community.name, events, blog_events)
+
+
+def user_calendar(user, etag):
+    """
+    Feed pribadi: event yang diikuti user atau milik komunitas tempat user
+    menjadi anggota, ditambah event BlognEvent buatan user atau yang diadakan
+    di fitness spot komunitasnya. Kembalian sama dengan community_calendar.
+    """
+    since = timezone.now() - timedelta(days=CALENDAR_PAST_DAYS)
+    member_of = Community.members.through.objects.filter(user_id=user.pk)
+    events = Event.objects.filter(
+        Exists(Participant.objects.filter(event_id=OuterRef('pk'), user_id=user.pk))
+        | Exists(member_of.filter(community_id=OuterRef('community_id'))),
+        date__gte=since,
+    ).order_by('date', 'pk')
+    spots = Community.objects.filter(
+        Exists(member_of.filter(community_id=OuterRef('pk')))
+    ).values('fitness_spot_id')
+    blog_events = BlogEvent.objects.filter(
+        Q(user_id=user.pk)
+        | Exists(BlogEvent.locations.through.objects.filter(event_id=OuterRef('pk'), fitnessspot_id__in=spots)),
+        ending_date__gte=since,
+    ).order_by('starting_date', 'pk')
+    return _calendar_feed(etag, f'GetFitToday - {user.username}', events, blog_events)
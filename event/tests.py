@@ -1,14 +1,18 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.urls import reverse
 from datetime import datetime, timedelta
 from unittest.mock import patch
+import io
 import json
 import unittest
+from django.core.management import call_command
 
-from .models import Event
-from community.models import Community, CommunityCategory
+from . import services
+from .models import Event, EventWaitlistEntry
+from BlognEvent.models import Event as BlogEvent
+from community.models import Community
 from home.models import FitnessSpot
 
 User = get_user_model()
@@ -44,14 +48,12 @@ def create_fitness_spot(name=None, address=None):
         longitude=106.8 + (_counter["spot"] * 0.01)
     )
 
-def create_category(name=None, slug=None):
+def create_category(name=None):
+    # Kategori komunitas berupa CharField biasa, bukan model terpisah.
     if name is None:
         _counter['category'] += 1
         name = f'Test Category {_counter["category"]}'
-    if slug is None:
-        slug = f'test-category-{_counter["category"]}'
-    
-    return CommunityCategory.objects.create(name=name, slug=slug)
+    return name
 
 def create_community(name='Test Community', fitness_spot=None, category=None, **kwargs):
     if fitness_spot is None:
@@ -1426,4 +1428,397 @@ class EventAjaxViewTestCase(TestCase):
         
         data = json.loads(response.content)
         self.assertIn('message', data)
-        self.assertTrue(len(data['message']) > 0)
\ No newline at end of file
+        self.assertTrue(len(data['message']) > 0)
+
+class EventAnnotationTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = create_user(username='viewer', password='viewerpass')
+        self.admin_user = create_user(username='commadmin', password='adminpass')
+        self.community = create_community()
+        self.community.admins.add(self.admin_user)
+        self.other_community = create_community(name='Other Community')
+
+    def test_with_viewer_annotates_flags_and_counts(self):
+        joined = create_event(name='Joined', community=self.community, created_by=self.admin_user)
+        closed = create_event(
+            name='Closed', community=self.other_community, created_by=self.admin_user,
+            registration_deadline=timezone.now() - timedelta(hours=1),
+        )
+        joined.participants.add(self.user, self.admin_user)
+
+        events = {e.name: e for e in Event.objects.with_viewer(self.admin_user)}
+        with self.assertNumQueries(0):
+            self.assertEqual(events['Joined'].participant_count(), 2)
+            self.assertTrue(events['Joined'].user_is_participant(self.admin_user))
+            self.assertTrue(events['Joined'].can_edit(self.admin_user))
+            self.assertFalse(events['Closed'].can_edit(self.admin_user))
+            self.assertFalse(events['Closed'].registration_open())
+            self.assertFalse(events['Closed'].can_join(self.admin_user))
+
+        # Anotasi untuk user lain tidak dipakai; method kembali ke query biasa.
+        self.assertFalse(events['Joined'].can_edit(self.user))
+        self.assertTrue(events['Joined'].user_is_participant(self.user))
+        self.assertEqual(closed.participant_count(), 0)
+
+    def test_event_list_query_count_is_constant(self):
+        self.client.login(username='viewer', password='viewerpass')
+        create_event(community=self.community, created_by=self.admin_user)
+        with self.assertNumQueries(5) as first:
+            self.client.get(reverse('event:event_list'))
+        for i in range(5):
+            event = create_event(name=f'Event {i}', community=self.other_community, created_by=self.admin_user)
+            event.participants.add(self.user)
+        with self.assertNumQueries(len(first.captured_queries)):
+            response = self.client.get(reverse('event:event_list'))
+        self.assertEqual(len(response.context['events']), 6)
+        self.assertTrue(all(e['is_participant'] for e in response.context['events'] if e['name'].startswith('Event')))
+
+
+class ShowEventApiTestCase(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = create_user(username='flutter', password='flutterpass')
+        self.admin_user = create_user(username='commadmin', password='adminpass')
+        self.community = create_community()
+        self.community.admins.add(self.admin_user)
+        now = timezone.now()
+        self.events = [
+            create_event(name=f'Event {i}', community=self.community, created_by=self.admin_user,
+                         date=now + timedelta(days=i - 2))
+            for i in range(6)
+        ]
+        self.events[4].participants.add(self.user)
+
+    def test_query_count_is_constant_and_flags_are_batched(self):
+        self.client.login(username='flutter', password='flutterpass')
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('event:show_event_api'))
+        data = response.json()
+        self.assertEqual([e['name'] for e in data][:2], ['Event 5', 'Event 4'])
+        self.assertTrue(data[1]['is_joined'])
+        self.assertEqual(data[1]['participant_count'], 1)
+        self.assertFalse(any(e['can_edit'] for e in data))
+
+        for i in range(10):
+            create_event(name=f'Extra {i}', community=self.community, created_by=self.admin_user)
+        with self.assertNumQueries(3):
+            self.client.get(reverse('event:show_event_api'))
+
+    def test_admin_session_and_pagination(self):
+        session = self.client.session
+        session['is_admin'] = True
+        session['admin_name'] = 'commadmin'
+        session.save()
+
+        response = self.client.get(reverse('event:show_event_api'), {'status': 'upcoming', 'limit': 2})
+        page = response.json()
+        self.assertEqual([e['name'] for e in page], ['Event 5', 'Event 4'])
+        self.assertTrue(all(e['can_edit'] and e['is_superadmin'] for e in page))
+
+        response = self.client.get(reverse('event:show_event_api'), {
+            'status': 'upcoming', 'limit': 2, 'cursor': response['X-Next-Cursor'],
+        })
+        self.assertEqual([e['name'] for e in response.json()], ['Event 3'])
+        self.assertNotIn('X-Next-Cursor', response)
+
+        response = self.client.get(reverse('event:show_event_api'), {'status': 'soon'})
+        self.assertEqual(response.status_code, 400)
+
+    @patch('event.views.EVENT_API_PAGE_SIZE', 2)
+    def test_without_limit_or_cursor_returns_full_list(self):
+        # Klien Flutter lama membaca body sebagai list utuh tanpa header paginasi.
+        response = self.client.get(reverse('event:show_event_api'))
+        self.assertEqual(len(response.json()), 6)
+        self.assertNotIn('X-Next-Cursor', response)
+
+        response = self.client.get(reverse('event:show_event_api'), {'limit': ''})
+        self.assertEqual(len(response.json()), 6)
+
+
+class CounterColumnTestCase(TestCase):
+    def setUp(self):
+        self.users = [create_user() for _ in range(3)]
+        self.community = create_community()
+        self.event = create_event(community=self.community)
+
+    def test_participants_count_follows_m2m_changes(self):
+        self.event.participants.add(*self.users)
+        self.assertEqual(self.event.participant_count(), 3)
+        self.event.participants.add(self.users[0])
+        self.event.participants.remove(self.users[0], create_user())
+        self.assertEqual(self.event.participants_count, 2)
+
+        self.users[1].joined_events.remove(self.event)
+        other = create_event(name='Other', community=self.community)
+        self.users[2].joined_events.add(other)
+        self.event.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((self.event.participants_count, other.participants_count), (1, 1))
+
+        self.users[2].joined_events.clear()
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.participants_count, 0)
+
+    def test_members_count_and_repair_command(self):
+        self.community.members.add(*self.users)
+        self.assertEqual(self.community.members_count, 3)
+        self.community.members.clear()
+        self.assertEqual(self.community.members_count, 0)
+
+        # Perubahan langsung lewat tabel through tidak memicu sinyal.
+        Event.participants.through.objects.create(event=self.event, user=self.users[0])
+        Community.members.through.objects.create(community=self.community, user=self.users[0])
+        out = io.StringIO()
+        call_command('repair_counters', '--check', stdout=out)
+        self.assertIn('Event.participants_count: 1 baris selisih', out.getvalue())
+
+        call_command('repair_counters', stdout=io.StringIO())
+        self.event.refresh_from_db()
+        self.community.refresh_from_db()
+        self.assertEqual((self.event.participants_count, self.community.members_count), (1, 1))
+
+    def test_counter_is_recounted_from_rows_and_survives_stale_save(self):
+        # Baris yang sudah ada (mis. ditambahkan transaksi lain) tidak dihitung dua kali.
+        Event.participants.through.objects.create(event=self.event, user=self.users[0])
+        self.event.participants.add(self.users[0], self.users[1])
+        self.assertEqual(self.event.participants_count, 2)
+
+        stale_event = Event.objects.get(pk=self.event.pk)
+        stale_community = Community.objects.get(pk=self.community.pk)
+        self.event.participants.remove(self.users[0])
+        self.community.members.add(*self.users)
+        stale_event.name = 'Renamed'
+        stale_event.save()
+        stale_community.name = 'Renamed'
+        stale_community.save()
+        self.event.refresh_from_db()
+        self.community.refresh_from_db()
+        self.assertEqual((self.event.name, self.event.participants_count), ('Renamed', 1))
+        self.assertEqual((self.community.name, self.community.members_count), ('Renamed', 3))
+
+    def test_event_list_sorts_by_popularity(self):
+        popular = create_event(name='Popular', community=self.community)
+        popular.participants.add(*self.users)
+        response = Client().get(reverse('event:event_list'), {'date_sort': 'popular'})
+        self.assertEqual(response.context['events'][0]['name'], 'Popular')
+        self.assertEqual(response.context['events'][0]['participant_count'], 3)
+
+
+class EventCapacityTestCase(TestCase):
+    def setUp(self):
+        self.users = [create_user() for _ in range(4)]
+        self.event = create_event(capacity=2)
+
+    def test_join_fills_capacity_then_waitlists_in_order(self):
+        outcomes = [services.join_event(self.event, user) for user in self.users]
+        self.assertEqual(outcomes, [services.JOINED, services.JOINED, services.WAITLISTED, services.WAITLISTED])
+        self.assertEqual(self.event.participants_count, 2)
+        self.assertTrue(self.event.is_full())
+        self.assertEqual(services.join_event(self.event, self.users[0]), services.ALREADY_JOINED)
+        self.assertEqual(services.join_event(self.event, self.users[3]), services.ALREADY_WAITLISTED)
+        self.assertEqual(services.waitlist_position(self.event, self.users[3]), 2)
+
+    def test_leave_promotes_first_waitlisted_user(self):
+        for user in self.users:
+            services.join_event(self.event, user)
+        self.assertEqual(services.leave_event(self.event, self.users[0]), services.LEFT)
+        self.assertEqual(set(self.event.participants.values_list('id', flat=True)), {self.users[1].id, self.users[2].id})
+        self.assertEqual(self.event.participants_count, 2)
+        self.assertEqual(services.waitlist_position(self.event, self.users[3]), 1)
+
+        self.assertEqual(services.leave_event(self.event, self.users[3]), services.LEFT_WAITLIST)
+        self.assertEqual(services.leave_event(self.event, self.users[3]), services.NOT_JOINED)
+        self.assertFalse(EventWaitlistEntry.objects.exists())
+
+    def test_raising_capacity_promotes_waitlist(self):
+        for user in self.users:
+            services.join_event(self.event, user)
+        self.event.capacity = 3
+        self.event.save()
+        self.assertEqual(services.promote_waitlist(self.event), [self.users[2].id])
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.participants_count, 3)
+
+    def test_stale_save_does_not_overwrite_counter(self):
+        stale = Event.objects.get(pk=self.event.pk)
+        services.join_event(self.event, self.users[0])
+        stale.name = 'Renamed'
+        stale.save()
+        self.event.refresh_from_db()
+        self.assertEqual((self.event.name, self.event.participants_count), ('Renamed', 1))
+
+    def test_join_view_reports_waitlist(self):
+        services.join_event(self.event, self.users[0])
+        services.join_event(self.event, self.users[1])
+        client = Client()
+        client.login(username=self.users[2].username, password='testpass123')
+        data = client.post(reverse('event:join_event', kwargs={'event_id': self.event.id})).json()
+        self.assertEqual((data['status'], data['waitlisted'], data['waitlist_position']), ('success', True, 1))
+        self.assertEqual(data['participant_count'], 2)
+
+        data = client.get(reverse('event:get_event_detail', kwargs={'event_id': self.event.id})).json()
+        self.assertEqual((data['event']['capacity'], data['event']['is_full']), (2, True))
+
+    def test_create_event_rejects_invalid_capacity(self):
+        self.event.community.admins.add(self.users[0])
+        client = Client()
+        client.login(username=self.users[0].username, password='testpass123')
+        response = client.post(reverse('event:create_event'), json.dumps({
+            'name': 'Capped', 'description': 'x', 'location': 'x',
+            'date': (timezone.now() + timedelta(days=3)).strftime('%Y-%m-%dT%H:%M'),
+            'community': self.event.community.id, 'capacity': 0,
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(DEBUG=True)
+class EventJoinBenchmarkTestCase(TransactionTestCase):
+    def test_concurrent_joins_never_exceed_capacity(self):
+        out = io.StringIO()
+        call_command('bench_event_join', '--users', '40', '--workers', '8', '--capacity', '10', '--leaves', '3', stdout=out)
+        self.assertIn('Konsisten:', out.getvalue())
+        self.assertFalse(Event.objects.exists())
+
+
+class EventCalendarFeedTestCase(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.community = create_community(name='Lari Pagi')
+        self.event = create_event(
+            name='Lari, 10K; Senayan', community=self.community,
+            description='Kumpul jam 6.\nBawa air minum. ' + 'Panjang ' * 20,
+        )
+        self.blog_event = BlogEvent.objects.create(
+            user=self.user, name='Open House Gym',
+            starting_date=timezone.now() + timedelta(days=3),
+            ending_date=timezone.now() + timedelta(days=3, hours=4),
+        )
+        self.blog_event.locations.add(self.community.fitness_spot)
+        self.url = reverse('event:community_calendar_feed', kwargs={'community_id': self.community.id})
+
+    def _body(self, response):
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_community_feed_lists_both_event_sources(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/calendar'))
+        body = self._body(response).decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n') and body.endswith('END:VCALENDAR\r\n'))
+        self.assertIn(f'UID:event-{self.event.id}@getfittoday', body)
+        self.assertIn(f'UID:blognevent-{self.blog_event.id}@getfittoday', body)
+        self.assertIn('SUMMARY:Lari\\, 10K\\; Senayan', body)
+        self.assertIn('Kumpul jam 6.\\nBawa', body)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in body.split('\r\n')))
+
+    def test_etag_short_circuits_until_events_change(self):
+        first = self.client.get(self.url)
+        first_body = self._body(first)
+        etag = first['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Body lengkap di-cache setelah stream pertama selesai.
+        response = self.client.get(self.url)
+        self.assertFalse(response.streaming)
+        self.assertEqual(response.content, first_body)
+
+        # Join event tidak mengubah isi feed komunitas.
+        services.join_event(self.event, self.user)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.event.name = 'Lari 5K'
+        self.event.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'SUMMARY:Lari 5K', self._body(response))
+
+    def test_user_feed_uses_signed_token(self):
+        self.client.login(username=self.user.username, password='testpass123')
+        url = self.client.get(reverse('event:my_calendar_url')).json()['url']
+        self.client.logout()
+
+        body = self._body(self.client.get(url)).decode()
+        self.assertNotIn(f'event-{self.event.id}@', body)
+        self.assertIn(f'blognevent-{self.blog_event.id}@', body)
+        etag = self.client.get(url)['ETag']
+
+        self.community.members.add(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'event-{self.event.id}@'.encode(), self._body(response))
+
+        bad = reverse('event:user_calendar_feed', kwargs={'token': f'{self.user.id}:forged'})
+        self.assertEqual(self.client.get(bad).status_code, 404)
+
+
+class CommunityEventsApiTestCase(TestCase):
+    def setUp(self):
+        self.user = create_user()
+        self.community = create_community()
+        self.community.admins.add(self.user)
+        now = timezone.now()
+        self.past = create_event(name='Past', community=self.community, date=now - timedelta(days=3))
+        self.upcoming = [
+            create_event(name=f'Upcoming {i}', community=self.community, date=now + timedelta(days=i + 1))
+            for i in range(4)
+        ]
+        create_event(name='Other community')
+        self.upcoming[0].participants.add(self.user)
+        self.url = reverse('event:community_events_api', kwargs={'community_id': self.community.id})
+
+    def test_status_range_and_cursor_pagination(self):
+        self.client.login(username=self.user.username, password='testpass123')
+        response = self.client.get(self.url, {'status': 'upcoming', 'limit': 3})
+        data = response.json()
+        self.assertEqual([e['name'] for e in data['events']], ['Upcoming 0', 'Upcoming 1', 'Upcoming 2'])
+        self.assertTrue(data['events'][0]['is_participant'])
+        self.assertEqual(data['events'][0]['participant_count'], 1)
+        self.assertTrue(all(e['can_edit'] for e in data['events']))
+        self.assertEqual(response['X-Next-Cursor'], data['next_cursor'])
+
+        data = self.client.get(self.url, {'status': 'upcoming', 'limit': 3, 'cursor': data['next_cursor']}).json()
+        self.assertEqual([e['name'] for e in data['events']], ['Upcoming 3'])
+        self.assertIsNone(data['next_cursor'])
+
+        data = self.client.get(self.url, {'status': 'past'}).json()
+        self.assertEqual([e['name'] for e in data['events']], ['Past'])
+
+        day = timezone.localtime(self.upcoming[1].date).strftime('%Y-%m-%d')
+        data = self.client.get(self.url, {'from': day, 'to': day}).json()
+        self.assertEqual([e['name'] for e in data['events']], ['Upcoming 1'])
+
+        self.assertEqual(self.client.get(self.url, {'status': 'soon'}).status_code, 400)
+
+    @patch('event.views.EVENT_API_PAGE_SIZE', 2)
+    def test_without_limit_or_cursor_returns_every_event(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual([e['name'] for e in data['events']], ['Past'] + [f'Upcoming {i}' for i in range(4)])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_query_count_does_not_grow_with_events(self):
+        self.client.login(username=self.user.username, password='testpass123')
+        self.client.get(self.url)
+        # sesi + user + komunitas + satu query event beranotasi
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+        for i in range(5):
+            create_event(name=f'Extra {i}', community=self.community).participants.add(self.user)
+        with self.assertNumQueries(4):
+            data = self.client.get(self.url).json()
+        self.assertEqual(len(data['events']), 10)
+
+    def test_community_detail_shows_upcoming_events_from_one_query(self):
+        with self.assertNumQueries(1):
+            events = services.upcoming_community_events(self.community, self.user, limit=3)
+            self.assertTrue(events[0].user_is_participant(self.user))
+            self.assertTrue(events[0].can_edit(self.user))
+        self.assertEqual([e.name for e in events], ['Upcoming 0', 'Upcoming 1', 'Upcoming 2'])
+
+        response = self.client.get(reverse('community:community_detail', args=[self.community.id]))
+        self.assertEqual([e.name for e in response.context['upcoming_events']], [e.name for e in self.upcoming])
+        self.assertContains(response, 'Upcoming 3')
+        self.assertNotContains(response, '>Past<')
@@ -19,4 +19,7 @@ urlpatterns = [
     path('api/leave/<int:event_id>/', views.leave_event_flutter, name='leave_event_flutter'),
     path('api/edit/<int:event_id>/', views.edit_event_flutter, name='edit_event_flutter'),
     path('api/delete/<int:event_id>/', views.delete_event_flutter, name='delete_event_flutter'),
+    path('calendar/community/<int:community_id>.ics', views.community_calendar_feed, name='community_calendar_feed'),
+    path('calendar/user/<str:token>.ics', views.user_calendar_feed, name='user_calendar_feed'),
+    path('calendar/me/', views.my_calendar_url, name='my_calendar_url'),
 ]
\ No newline at end of file
@@ -1,14 +1,17 @@
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.urls import reverse
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from django.db.models import Q
+from home.utils.pagination import keyset_page
 from .models import Event
+from . import services
 from community.models import Community
 
 User = get_user_model()
@@ -35,6 +38,21 @@ def _admin_session_username(request) -> str | None:
     return None
 
 
+def _parse_capacity(value):
+    """Kapasitas dari body request: kosong -> None (tanpa batas), selain itu bilangan bulat >= 1."""
+    if value in (None, ''):
+        return None
+    capacity = int(value)
+    if capacity < 1:
+        raise ValueError('Kapasitas minimal 1.')
+    return capacity
+
+
+def _parse_form_datetime(value):
+    """Tanggal dari input datetime-local ('%Y-%m-%dT%H:%M') dalam zona waktu aktif."""
+    return timezone.make_aware(datetime.strptime(value, '%Y-%m-%dT%H:%M'), timezone.get_current_timezone())
+
+
 def _get_or_create_admin_user(request):
     username = _admin_session_username(request)
     if not username:
@@ -64,7 +82,7 @@ def event_list(request):
         except Community.DoesNotExist:
             from_community_id = None
 
-    events = Event.objects.all().select_related('community', 'created_by')
+    events = Event.objects.with_viewer(request.user).select_related('community', 'created_by')
 
     if my_events and request.user.is_authenticated:
         user_communities = Community.objects.filter(admins=request.user)
@@ -86,7 +104,8 @@ def event_list(request):
     sort_mapping = {
         'newest': '-created_at',
         'soonest': 'date',
-        'latest': '-date'
+        'latest': '-date',
+        'popular': '-participants_count',
     }
     events = events.order_by(sort_mapping.get(date_sort, 'date'))
 
@@ -107,7 +126,9 @@ def event_list(request):
             'can_delete': event.can_delete(request.user),
             'can_join': event.can_join(request.user),
             'is_participant': event.user_is_participant(request.user),
-            'participant_count': event.participants.count(),
+            'participant_count': event.participant_count(),
+            'capacity': event.capacity,
+            'is_full': event.is_full(),
             'registration_open': event.registration_open(),
             'is_past': event.is_past(),
         })
@@ -145,16 +166,20 @@ def create_event(request):
 
         if not all([name, description, date, location, community_id]):
             return JsonResponse({'status': 'error', 'message': 'Semua field wajib diisi.'}, status=400)
+        try:
+            capacity = _parse_capacity(data.get('capacity'))
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'Kapasitas harus bilangan bulat minimal 1.'}, status=400)
 
         community = get_object_or_404(Community, pk=community_id)
         if not community.is_admin(request.user) and not request.user.is_staff:
             return JsonResponse({'status': 'error', 'message': 'Hanya admin komunitas yang bisa membuat event.'}, status=403)
 
-        event_date = timezone.make_aware(datetime.strptime(date, '%Y-%m-%dT%H:%M'), timezone.get_current_timezone())
-        
-        reg_deadline = None
-        if registration_deadline:
-            reg_deadline = timezone.make_aware(datetime.strptime(registration_deadline, '%Y-%m-%dT%H:%M'), timezone.get_current_timezone())
+        try:
+            event_date = _parse_form_datetime(date)
+            reg_deadline = _parse_form_datetime(registration_deadline) if registration_deadline else None
+        except (TypeError, ValueError):
+            return JsonResponse({'status': 'error', 'message': 'Format tanggal tidak valid.'}, status=400)
 
         event = Event.objects.create(
             name=name,
@@ -163,7 +188,8 @@ def create_event(request):
             location=location,
             community=community,
             created_by=request.user,
-            registration_deadline=reg_deadline
+            registration_deadline=reg_deadline,
+            capacity=capacity
         )
 
         return JsonResponse({'status': 'success', 'message': f'Event "{event.name}" berhasil dibuat.', 'event_id': event.id})
@@ -184,18 +210,24 @@ def edit_event(request, event_id):
         event.description = data.get('description', event.description)
         event.location = data.get('location', event.location)
 
-        if 'date' in data and data['date']:
-            event_date = datetime.strptime(data['date'], '%Y-%m-%dT%H:%M')
-            event.date = timezone.make_aware(event_date, timezone.get_current_timezone())
-        
-        if 'registration_deadline' in data:
-            if data['registration_deadline']:
-                reg_deadline = datetime.strptime(data['registration_deadline'], '%Y-%m-%dT%H:%M')
-                event.registration_deadline = timezone.make_aware(reg_deadline, timezone.get_current_timezone())
-            else:
-                event.registration_deadline = None
-        
+        try:
+            if 'date' in data and data['date']:
+                event.date = _parse_form_datetime(data['date'])
+            if 'registration_deadline' in data:
+                deadline = data['registration_deadline']
+                event.registration_deadline = _parse_form_datetime(deadline) if deadline else None
+        except (TypeError, ValueError):
+            return JsonResponse({'status': 'error', 'message': 'Format tanggal tidak valid.'}, status=400)
+
+        if 'capacity' in data:
+            try:
+                event.capacity = _parse_capacity(data['capacity'])
+            except ValueError:
+                return JsonResponse({'status': 'error', 'message': 'Kapasitas harus bilangan bulat minimal 1.'}, status=400)
+
         event.save()
+        # Kapasitas bisa saja dinaikkan; isi kursi barunya dari antrean.
+        services.promote_waitlist(event)
         return JsonResponse({'status': 'success', 'message': 'Event berhasil diperbarui.'})
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
@@ -215,35 +247,45 @@ def delete_event(request, event_id):
 @require_POST
 def join_event(request, event_id):
     event = get_object_or_404(Event, id=event_id)
-    if not event.can_join(request.user):
-        if event.user_is_participant(request.user):
-            message = 'Kamu sudah terdaftar di event ini.'
-        elif not event.registration_open():
-            message = 'Pendaftaran event sudah ditutup.'
-        else:
-            message = 'Kamu tidak bisa bergabung ke event ini.'
-        return JsonResponse({'status': 'error', 'message': message}, status=400)
+    outcome = services.join_event(event, request.user)
+    if outcome == services.JOINED:
+        return JsonResponse({'status': 'success', 'message': f'Berhasil bergabung ke event "{event.name}"!', 'participant_count': event.participant_count()})
+    if outcome == services.WAITLISTED:
+        position = services.waitlist_position(event, request.user)
+        return JsonResponse({
+            'status': 'success',
+            'waitlisted': True,
+            'message': f'Event penuh. Kamu masuk daftar tunggu (posisi {position}).',
+            'participant_count': event.participant_count(),
+            'waitlist_position': position,
+        })
 
-    event.participants.add(request.user)
-    return JsonResponse({'status': 'success', 'message': f'Berhasil bergabung ke event "{event.name}"!', 'participant_count': event.participants.count()})
+    messages = {
+        services.ALREADY_JOINED: 'Kamu sudah terdaftar di event ini.',
+        services.ALREADY_WAITLISTED: 'Kamu sudah ada di daftar tunggu event ini.',
+        services.CLOSED: 'Pendaftaran event sudah ditutup.',
+    }
+    return JsonResponse({'status': 'error', 'message': messages[outcome]}, status=400)
 
 
 @login_required
 @require_POST
 def leave_event(request, event_id):
     event = get_object_or_404(Event, id=event_id)
-    if not event.user_is_participant(request.user):
-        return JsonResponse({'status': 'error', 'message': 'Kamu belum terdaftar.'}, status=400)
     if event.is_past() or event.is_ongoing():
-        return JsonResponse({'status': 'error', 'message': 'Event sudah dimulai.'}, status=400)
+        if event.user_is_participant(request.user):
+            return JsonResponse({'status': 'error', 'message': 'Event sudah dimulai.'}, status=400)
 
-    event.participants.remove(request.user)
-    return JsonResponse({'status': 'success', 'message': 'Berhasil keluar.', 'participant_count': event.participants.count()})
+    outcome = services.leave_event(event, request.user)
+    if outcome == services.NOT_JOINED:
+        return JsonResponse({'status': 'error', 'message': 'Kamu belum terdaftar.'}, status=400)
+    message = 'Berhasil keluar.' if outcome == services.LEFT else 'Kamu keluar dari daftar tunggu.'
+    return JsonResponse({'status': 'success', 'message': message, 'participant_count': event.participant_count()})
 
 
 @login_required
 def get_event_detail(request, event_id):
-    event = get_object_or_404(Event, id=event_id)
+    event = get_object_or_404(Event.objects.with_viewer(request.user).select_related('community'), id=event_id)
     local_date = timezone.localtime(event.date)
     return JsonResponse({
         'status': 'success',
@@ -256,25 +298,52 @@ def get_event_detail(request, event_id):
             'community_name': event.community.name,
             'can_edit': event.can_edit(request.user),
             'is_participant': event.user_is_participant(request.user),
-            'participant_count': event.participants.count(),
+            'participant_count': event.participant_count(),
+            'capacity': event.capacity,
+            'is_full': event.is_full(),
         }
     })
 
 
 def community_events_api(request, community_id):
-    community = get_object_or_404(Community, id=community_id)
-    events = Event.objects.filter(community=community).order_by('date')
+    """
+    Event sebuah komunitas urut tanggal dengan filter `status`, `from` dan
+    `to`; per halaman hanya bila `limit` atau `cursor` dikirim. Status user dan jumlah peserta ikut
+    dalam satu query yang memakai indeks (community, date).
+    """
+    community = get_object_or_404(Community.objects.only('pk', 'name'), id=community_id)
+    params = request.GET.copy()
+    params.pop('community', None)
+    try:
+        events = _filter_events(Event.objects.with_viewer(request.user).filter(community=community), params)
+        page, next_cursor = _paginate_if_requested(events, ['date', 'pk'], request.GET)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Filter, limit atau cursor tidak valid.'}, status=400)
+
     events_data = []
-    for event in events:
+    for event in page:
         local_date = timezone.localtime(event.date)
         events_data.append({
             'id': event.id,
             'name': event.name,
             'date': local_date.strftime('%Y-%m-%d %H:%M'),
+            'date_display': local_date.strftime('%d %b %Y, %H:%M'),
             'location': event.location,
-            'participant_count': event.participants.count(),
+            'participant_count': event.participants_count,
+            'capacity': event.capacity,
+            'is_full': event.is_full(),
+            'registration_open': event.registration_open(),
+            'can_edit': event.can_edit(request.user),
+            'can_join': event.can_join(request.user),
+            'is_participant': event.user_is_participant(request.user),
         })
-    return JsonResponse({'success': True, 'community_name': community.name, 'events': events_data})
+    response = JsonResponse({
+        'success': True,
+        'community_name': community.name,
+        'events': events_data,
+        'next_cursor': next_cursor,
+    })
+    return _with_next_link(response, request, next_cursor)
 
 
 # --- FLUTTER API VIEWS ---
@@ -318,31 +387,99 @@ def create_event_flutter(request):
             description=data.get("description"),
             date=aware_event_date,
             location=data.get("location"),
+            capacity=_parse_capacity(data.get("capacity")),
         )
         return JsonResponse({"status": "success", "message": "Event berhasil dibuat!"}, status=200)
     except Exception as e:
         return JsonResponse({"status": "error", "message": str(e)}, status=500)
 
 
+EVENT_API_PAGE_SIZE = 50
+EVENT_API_MAX_PAGE_SIZE = 200
+
+
+def _api_viewer(request):
+    """
+    Konteks auth endpoint Flutter, dihitung sekali per request: user yang
+    dipakai untuk status join (user login, atau user milik sesi admin) dan
+    apakah request punya akses superadmin.
+    """
+    is_superadmin = _has_admin_access(request)
+    if request.user.is_authenticated:
+        return request.user, is_superadmin
+    admin_username = _admin_session_username(request)
+    admin_user = User.objects.filter(username=admin_username).first() if admin_username else None
+    return admin_user, is_superadmin
+
+
+def _filter_events(events, params):
+    """Filter status (upcoming/past/all), from/to (YYYY-MM-DD, waktu lokal) dan community. ValueError bila tidak valid."""
+    tz = timezone.get_current_timezone()
+    status = params.get('status', 'all')
+    if status == 'upcoming':
+        events = events.filter(date__gt=timezone.now())
+    elif status == 'past':
+        events = events.filter(date__lte=timezone.now())
+    elif status != 'all':
+        raise ValueError('bad status')
+    if params.get('from'):
+        day = datetime.strptime(params['from'], '%Y-%m-%d')
+        events = events.filter(date__gte=timezone.make_aware(day, tz))
+    if params.get('to'):
+        day = datetime.strptime(params['to'], '%Y-%m-%d') + timedelta(days=1)
+        events = events.filter(date__lt=timezone.make_aware(day, tz))
+    if params.get('community'):
+        events = events.filter(community_id=int(params['community']))
+    return events
+
+
+def _page_size(value):
+    if not value:
+        return EVENT_API_PAGE_SIZE
+    size = int(value)
+    if not 1 <= size <= EVENT_API_MAX_PAGE_SIZE:
+        raise ValueError('bad limit')
+    return size
+
+
+def _paginate_if_requested(events, keys, params):
+    """
+    Satu halaman keyset bila `limit` atau `cursor` dikirim. Tanpa keduanya
+    semua baris dikembalikan, seperti yang diharapkan klien lama.
+    """
+    if params.get('limit') or params.get('cursor'):
+        return keyset_page(events, keys, params.get('cursor'), _page_size(params.get('limit')))
+    return events.order_by(*keys), None
+
+
+def _with_next_link(response, request, next_cursor):
+    """Tambahkan header Link/X-Next-Cursor; body tetap list seperti sebelumnya."""
+    if next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        response['Link'] = f'<{request.build_absolute_uri(request.path)}?{params.urlencode()}>; rel="next"'
+        response['X-Next-Cursor'] = next_cursor
+    return response
+
+
 def show_event_api(request):
-    events = Event.objects.all().order_by('-date').select_related('community')
+    """
+    Daftar event untuk aplikasi Flutter, terbaru dulu, dengan filter `status`,
+    `from`, `to` dan `community`. Paginasi (`limit`, `cursor`) hanya dipakai
+    bila diminta; klien lama tanpa parameter itu tetap menerima semua event.
+    Jumlah query tetap berapa pun banyaknya event.
+    """
+    viewer, is_superadmin = _api_viewer(request)
+    can_act = request.user.is_authenticated or is_superadmin
+    try:
+        events = _filter_events(Event.objects.with_viewer(viewer).select_related('community'), request.GET)
+        page, next_cursor = _paginate_if_requested(events, ['-date', '-pk'], request.GET)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Filter, limit atau cursor tidak valid.'}, status=400)
+
     data = []
-    for event in events:
-        is_authenticated = request.user.is_authenticated
-        is_superadmin = _has_admin_access(request)
-        can_manage = bool(is_superadmin or event.community.is_admin(request.user))
-        admin_username = _admin_session_username(request)
-        admin_user = (
-            User.objects.filter(username=admin_username).first()
-            if admin_username
-            else None
-        )
-        if is_authenticated:
-            is_joined = event.user_is_participant(request.user)
-        elif admin_user is not None:
-            is_joined = event.user_is_participant(admin_user)
-        else:
-            is_joined = False
+    for event in page:
+        can_manage = can_act and (is_superadmin or event.can_edit(request.user))
         data.append({
             "id": event.id,
             "name": event.name,
@@ -350,14 +487,16 @@ def show_event_api(request):
             "date": timezone.localtime(event.date).strftime("%Y-%m-%d %H:%M:%S"),
             "location": event.location,
             "community_name": event.community.name,
-            "participant_count": event.participants.count(),
-            "can_edit": can_manage if (is_authenticated or is_superadmin) else False,
-            "can_delete": can_manage if (is_authenticated or is_superadmin) else False,
+            "participant_count": event.participant_count(),
+            "capacity": event.capacity,
+            "is_full": event.is_full(),
+            "can_edit": can_manage,
+            "can_delete": can_manage,
             "is_active": not event.is_past(),
-            "is_joined": is_joined,
+            "is_joined": event.user_is_participant(viewer) if viewer is not None else False,
             "is_superadmin": is_superadmin,
         })
-    return JsonResponse(data, safe=False)
+    return _with_next_link(JsonResponse(data, safe=False), request, next_cursor)
 
 
 @csrf_exempt
@@ -373,11 +512,23 @@ def join_event_flutter(request, event_id):
         return JsonResponse({"status": "error", "message": "Harap login."}, status=401)
     
     event = get_object_or_404(Event, id=event_id)
-    if event.participants.filter(id=join_user.id).exists():
-        return JsonResponse({"status": "error", "message": "Sudah join."}, status=400)
-    
-    event.participants.add(join_user)
-    return JsonResponse({"status": "success", "message": "Berhasil join!"}, status=200)
+    outcome = services.join_event(event, join_user)
+    if outcome == services.JOINED:
+        return JsonResponse({"status": "success", "message": "Berhasil join!"}, status=200)
+    if outcome == services.WAITLISTED:
+        return JsonResponse({
+            "status": "success",
+            "waitlisted": True,
+            "message": "Event penuh, masuk daftar tunggu.",
+            "waitlist_position": services.waitlist_position(event, join_user),
+        }, status=200)
+
+    messages = {
+        services.ALREADY_JOINED: "Sudah join.",
+        services.ALREADY_WAITLISTED: "Sudah di daftar tunggu.",
+        services.CLOSED: "Pendaftaran ditutup.",
+    }
+    return JsonResponse({"status": "error", "message": messages[outcome]}, status=400)
 
 
 @csrf_exempt
@@ -395,9 +546,8 @@ def leave_event_flutter(request, event_id):
         return JsonResponse({"status": "error", "message": "Harap login."}, status=401)
     
     event = get_object_or_404(Event, id=event_id)
-    if not event.participants.filter(id=leave_user.id).exists():
+    if services.leave_event(event, leave_user) == services.NOT_JOINED:
         return JsonResponse({"status": "error", "message": "Belum join."}, status=400)
-    event.participants.remove(leave_user)
     return JsonResponse({"status": "success", "message": "Berhasil keluar."}, status=200)
 
 
@@ -419,8 +569,11 @@ def edit_event_flutter(request, event_id):
         if "date" in data:
             new_date = datetime.strptime(data["date"], "%Y-%m-%d %H:%M:%S")
             event.date = timezone.make_aware(new_date, timezone.get_current_timezone())
+        if "capacity" in data:
+            event.capacity = _parse_capacity(data["capacity"])
 
         event.save()
+        services.promote_waitlist(event)
         return JsonResponse({"status": "success", "message": "Event berhasil diupdate!"}, status=200)
     except Exception as e:
         return JsonResponse({"status": "error", "message": str(e)}, status=500)
@@ -437,3 +590,53 @@ def delete_event_flutter(request, event_id):
         
     event.delete()
     return JsonResponse({"status": "success", "message": "Event berhasil dihapus!"}, status=200)
+
+
+# --- iCalendar FEEDS ---
+
+def _calendar_response(etag, body, filename):
+    """Body dari cache dikirim utuh; selain itu di-stream sambil di-cache."""
+    if isinstance(body, bytes):
+        response = HttpResponse(body, content_type='text/calendar; charset=utf-8')
+    else:
+        response = StreamingHttpResponse(body, content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = f'inline; filename="{filename}"'
+    return _calendar_headers(response, etag)
+
+
+def _calendar_headers(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, max-age=300'
+    return response
+
+
+@require_GET
+def community_calendar_feed(request, community_id):
+    # ETag dicek sebelum query apa pun: polling klien kalender yang tidak berubah cukup dijawab 304.
+    etag = services.community_calendar_etag(community_id)
+    if request.headers.get('If-None-Match') == etag:
+        return _calendar_headers(HttpResponseNotModified(), etag)
+    community = get_object_or_404(Community.objects.only('pk', 'name', 'fitness_spot_id'), pk=community_id)
+    return _calendar_response(etag, services.community_calendar(community, etag), f'community-{community.pk}.ics')
+
+
+@require_GET
+def user_calendar_feed(request, token):
+    # Aplikasi kalender tidak membawa cookie sesi, jadi feed pribadi memakai token bertanda tangan.
+    user_id = services.user_id_from_calendar_token(token)
+    if user_id is None:
+        raise Http404('Feed tidak ditemukan.')
+    etag = services.user_calendar_etag(user_id)
+    if request.headers.get('If-None-Match') == etag:
+        return _calendar_headers(HttpResponseNotModified(), etag)
+    user = get_object_or_404(User.objects.only('pk', 'username'), pk=user_id, is_active=True)
+    return _calendar_response(etag, services.user_calendar(user, etag), 'my-events.ics')
+
+
+@login_required
+@require_GET
+def my_calendar_url(request):
+    url = request.build_absolute_uri(
+        reverse('event:user_calendar_feed', kwargs={'token': services.calendar_token(request.user)})
+    )
+    return JsonResponse({'status': 'success', 'url': url})
@@ -137,7 +137,12 @@ else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': BASE_DIR / 'db.sqlite3',
+            # SQLITE_PATH menunjuk database lain, mis. database scratch untuk benchmark.
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            # Tunggu lock tulis hingga 20 detik sebelum "database is locked". Jalur
+            # tulis yang diperebutkan mengambil lock-nya sendiri di awal transaksi
+            # (home.utils.db.lock_for_write).
+            'OPTIONS': {'timeout': 20},
         }
     }
 
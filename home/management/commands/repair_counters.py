@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from community.models import Community
+from event.models import Event
+from home.utils.counters import count_drift, recount
+
+# (label, relasi many-to-many, kolom counter)
+COUNTERS = [
+    ('Event.participants_count', Event.participants, 'participants_count'),
+    ('Community.members_count', Community.members, 'members_count'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Menghitung ulang kolom counter (peserta event, anggota komunitas) dari tabel relasinya'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Hanya laporkan jumlah baris yang selisih, tanpa menulis')
+
+    def handle(self, *args, **options):
+        for label, relation, counter in COUNTERS:
+            drift = count_drift(relation, counter)
+            if options['check']:
+                style = self.style.WARNING if drift else self.style.SUCCESS
+                self.stdout.write(style(f'{label}: {drift} baris selisih'))
+                continue
+            with transaction.atomic():
+                updated = recount(relation, counter)
+            self.stdout.write(self.style.SUCCESS(f'{label}: {updated} baris dihitung ulang ({drift} sebelumnya selisih)'))
@@ -330,3 +330,23 @@ class AdminTests(HomeSetupMixin):
         changelist = self.fsa.get_changelist_instance(mock_request)
         queryset = changelist.get_queryset(mock_request)
         self.assertEqual(queryset.count(), 2)  
+
+
+class BenchUtilsTest(TestCase):
+    def test_percentile_interpolates_between_ranks(self):
+        from .utils.bench import latency_summary, percentile
+        values = [i / 1000 for i in range(1, 21)]  # 1..20 ms
+        self.assertAlmostEqual(percentile(values, 50), 0.0105)
+        self.assertAlmostEqual(percentile(values, 95), 0.01905)
+        self.assertEqual(percentile([0.5], 95), 0.5)
+        self.assertEqual(latency_summary([]), {'p50_ms': None, 'p95_ms': None, 'p99_ms': None})
+
+    @override_settings(DEBUG=True)
+    def test_scratch_guard_rejects_regular_database(self):
+        from django.core.management.base import CommandError
+        from django.db import connection
+        from .utils.bench import ensure_scratch_database
+        ensure_scratch_database()  # database test
+        with mock.patch.dict(connection.settings_dict, {'NAME': '/srv/app/db.sqlite3'}):
+            with self.assertRaises(CommandError):
+                ensure_scratch_database()
@@ -0,0 +1,78 @@
+# home/utils/bench.py
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection, connections
+
+DB_ERROR = "db_error"
+
+# Potongan nama database yang dianggap aman untuk diisi data benchmark.
+SCRATCH_DATABASE_MARKERS = ("scratch", "bench", "test", "memorydb")
+
+
+def ensure_scratch_database():
+    """
+    Benchmark membuat dan menghapus banyak baris serta memenuhi tabel dengan
+    lock; tolak berjalan di luar DEBUG atau pada database yang namanya tidak
+    menandakan database scratch (mis. SQLITE_PATH=/tmp/bench.sqlite3).
+    """
+    if not settings.DEBUG:
+        raise CommandError("Benchmark hanya dijalankan dengan DEBUG=True.")
+    name = os.path.basename(str(connection.settings_dict["NAME"])).lower()
+    if not any(marker in name for marker in SCRATCH_DATABASE_MARKERS):
+        raise CommandError(
+            f"Database {name!r} bukan database scratch; pakai database yang namanya memuat "
+            f"salah satu dari {', '.join(SCRATCH_DATABASE_MARKERS)}."
+        )
+
+
+def run_concurrent(func, items, workers):
+    """
+    Jalankan func(item) untuk setiap item di `workers` thread. Mengembalikan
+    ([(hasil, latensi detik)], durasi total detik); OperationalError dicatat
+    sebagai DB_ERROR dan koneksi thread ditutup setelah tiap item.
+    """
+    def timed(item):
+        started = time.perf_counter()
+        try:
+            outcome = func(item)
+        except OperationalError:
+            outcome = DB_ERROR
+        finally:
+            connections.close_all()
+        return outcome, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(timed, items))
+    return results, time.perf_counter() - started
+
+
+def percentile(values, pct):
+    """Persentil ke-`pct` (1-99) dengan interpolasi linear; None bila kosong."""
+    values = list(values)
+    if len(values) < 2:
+        return values[0] if values else None
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+def latency_summary(latencies, percentiles=(50, 95, 99)):
+    """{'p50_ms': ..., 'p95_ms': ...} dari latensi dalam detik."""
+    latencies = list(latencies)
+    summary = {}
+    for pct in percentiles:
+        value = percentile(latencies, pct)
+        summary[f"p{pct}_ms"] = round(value * 1000, 2) if value is not None else None
+    return summary
+
+
+def format_latency(latencies, percentiles=(50, 95)):
+    """'12.3ms / 45.6ms' untuk laporan teks."""
+    latencies = list(latencies)
+    if not latencies:
+        return "-"
+    return " / ".join(f"{percentile(latencies, pct) * 1000:.1f}ms" for pct in percentiles)
@@ -0,0 +1,96 @@
+# home/utils/counters.py
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed
+
+from home.utils.db import lock_for_write
+
+
+def _relation_parts(relation):
+    field = relation.field
+    return field.model, relation.through, field.m2m_field_name(), field.m2m_reverse_field_name()
+
+
+class CounterFieldsMixin:
+    """
+    Mixin model untuk kolom counter yang hanya diubah lewat UPDATE atomik.
+    save() pada instance yang sudah ada tidak menulis kolom di `counter_fields`,
+    jadi instance basi tidak menimpa hitungan terbaru.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+def track_m2m_count(relation, counter):
+    """
+    Jaga kolom `counter` di model pemilik relasi many-to-many `relation`
+    (mis. Event.participants -> Event.participants_count) lewat m2m_changed.
+    Baris pemilik dikunci di pre_* lalu dihitung ulang dengan subquery COUNT
+    di post_*, jadi add duplikat atau remove bersamaan tidak menggeser counter.
+    Perubahan lewat model through langsung (bulk_create/delete) tidak memicu
+    sinyal; gunakan `manage.py repair_counters` untuk menghitung ulang.
+    """
+    model, through, source, target = _relation_parts(relation)
+    pending = f"_{counter}_pending"
+
+    def owners(pks):
+        return model._default_manager.filter(pk__in=pks).order_by("pk")
+
+    def on_change(sender, instance, action, reverse, pk_set, **kwargs):
+        if not reverse:
+            # `instance` adalah pemilik counter, mis. event.participants.add(user).
+            if action.startswith("pre_"):
+                lock_for_write(owners([instance.pk]))
+            else:
+                recount(relation, counter, owners([instance.pk]))
+                instance.refresh_from_db(fields=[counter])
+            return
+
+        # Sisi sebaliknya, mis. user.joined_events.add(event): pk_set berisi id pemilik counter.
+        if action == "pre_clear":
+            pk_set = set(through.objects.filter(**{target: instance.pk}).values_list(f"{source}_id", flat=True))
+            setattr(instance, pending, pk_set)
+        elif action == "post_clear":
+            pk_set = instance.__dict__.pop(pending, set())
+        if not pk_set:
+            return
+        if action.startswith("pre_"):
+            lock_for_write(owners(pk_set))
+        else:
+            recount(relation, counter, owners(pk_set))
+
+    m2m_changed.connect(on_change, sender=through, weak=False, dispatch_uid=f"{through._meta.label}.{counter}")
+
+
+def _actual_counts(relation):
+    _model, through, source, _target = _relation_parts(relation)
+    counts = (
+        through.objects.filter(**{source: OuterRef("pk")})
+        .order_by()
+        .values(source)
+        .annotate(n=Count("*"))
+        .values("n")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def recount(relation, counter, queryset=None):
+    """Hitung ulang `counter` dengan satu UPDATE berisi subquery COUNT. Mengembalikan jumlah baris."""
+    model = relation.field.model
+    queryset = model._default_manager.all() if queryset is None else queryset
+    return queryset.update(**{counter: _actual_counts(relation)})
+
+
+def count_drift(relation, counter, queryset=None):
+    """Jumlah baris yang nilai `counter`-nya berbeda dari jumlah baris relasinya."""
+    model = relation.field.model
+    queryset = model._default_manager.all() if queryset is None else queryset
+    return queryset.annotate(actual_count=_actual_counts(relation)).exclude(**{counter: F("actual_count")}).count()
@@ -0,0 +1,20 @@
+# home/utils/db.py
+from django.db import connection
+from django.db.models import F
+
+
+def lock_for_write(queryset):
+    """
+    Ambil lock tulis atas baris `queryset` sebagai statement pertama sebuah
+    transaksi (panggil di dalam transaction.atomic()).
+
+    Postgres: SELECT ... FOR UPDATE pada baris itu. SQLite tidak punya row
+    lock; UPDATE tanpa perubahan membuat transaksi langsung memegang lock
+    tulis database (dengan menunggu sesuai `timeout`), alih-alih menaikkan
+    lock baca di tengah transaksi yang langsung gagal "database is locked".
+    """
+    if connection.vendor == "sqlite":
+        pk = queryset.model._meta.pk.attname
+        queryset.update(**{pk: F(pk)})
+    else:
+        list(queryset.select_for_update().values_list("pk", flat=True))
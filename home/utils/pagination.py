@@ -0,0 +1,84 @@
+# home/utils/pagination.py
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+
+def _encode_cursor(values):
+    # isoformat() sendiri, karena DjangoJSONEncoder memotong mikrodetik.
+    values = [v.isoformat() if isinstance(v, datetime) else str(v) if isinstance(v, UUID) else v for v in values]
+    raw = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor, model, keys):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("bad cursor")
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError("bad cursor")
+    decoded = []
+    for key, value in zip(keys, values):
+        name = key.lstrip("-")
+        try:
+            field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+        except FieldDoesNotExist:
+            decoded.append(value)
+            continue
+        try:
+            decoded.append(field.to_python(value))
+        except ValidationError:
+            raise ValueError("bad cursor")
+    return decoded
+
+def keyset_page(queryset, keys, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Satu halaman hasil dengan cursor pagination (keyset): baris diurutkan
+    menurut `keys` (mis. ["-start_time", "-pk"]; kunci terakhir harus unik)
+    dan halaman berikutnya dimulai tepat setelah baris terakhir, jadi
+    biayanya tidak bertambah seiring halaman seperti OFFSET.
+    Mengembalikan (baris, cursor berikutnya atau None).
+    """
+    queryset = queryset.order_by(*keys)
+    if cursor:
+        values = _decode_cursor(cursor, queryset.model, keys)
+        after = Q()
+        for i, key in enumerate(keys):
+            name = key.lstrip("-")
+            lookup = "lt" if key.startswith("-") else "gt"
+            step = Q(**{f"{name}__{lookup}": values[i]})
+            for prev_key, prev_value in zip(keys[:i], values[:i]):
+                step &= Q(**{prev_key.lstrip("-"): prev_value})
+            after |= step
+        queryset = queryset.filter(after)
+
+    rows = list(queryset[:limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, _encode_cursor([getattr(last, key.lstrip("-")) for key in keys])
+
+def keyset_page_merged(querysets, keys, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Seperti keyset_page, tetapi atas gabungan beberapa queryset dengan kunci
+    urut yang sama (mis. tabel aktif dan tabel arsipnya). Setiap queryset
+    dibaca satu halaman dari cursor yang sama, lalu hasilnya digabung
+    menurut `keys`, jadi urutan dan cursor tetap persis seperti satu tabel.
+    """
+    rows, more = [], False
+    for queryset in querysets:
+        page, next_cursor = keyset_page(queryset, keys, cursor, limit)
+        rows.extend(page)
+        more = more or next_cursor is not None
+    # Urutkan stabil dari kunci terakhir ke pertama, masing-masing dengan arahnya sendiri.
+    for key in reversed(keys):
+        rows.sort(key=lambda row: getattr(row, key.lstrip("-")), reverse=key.startswith("-"))
+    if len(rows) <= limit and not more:
+        return rows, None
+    rows = rows[:limit]
+    return rows, _encode_cursor([getattr(rows[-1], key.lstrip("-")) for key in keys])
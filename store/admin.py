@@ -1,10 +1,10 @@
 from django.contrib import admin
-from .models import Product, Cart, CartItem
+from .models import Product, Cart, CartItem, Order, OrderLine, InventoryEntry
 
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'price', 'store', 'rating', 'units_sold', 'created_at')
+    list_display = ('name', 'price', 'stock', 'store', 'rating', 'units_sold', 'created_at')
     list_filter = ('store', 'rating')
     search_fields = ('name', 'store__name')
     ordering = ('-created_at',)
@@ -23,3 +23,28 @@ class CartAdmin(admin.ModelAdmin):
     list_filter = ('created_at', 'owner')
     search_fields = ('owner__username', 'session_key')
     inlines = [CartItemInline]
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    extra = 0
+    readonly_fields = ('product', 'product_name', 'unit_price', 'quantity', 'line_total')
+    can_delete = False
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ('id', 'owner', 'status', 'total', 'created_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('owner__username', 'session_key')
+    inlines = [OrderLineInline]
+
+@admin.register(InventoryEntry)
+class InventoryEntryAdmin(admin.ModelAdmin):
+    list_display = ('product', 'change', 'reason', 'order', 'created_at')
+    list_filter = ('reason', 'created_at')
+    search_fields = ('product__name',)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -1,188 +1,341 @@
+import argparse
+import atexit
+import glob
+import json
 import os
+import random
+import threading
 import time
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
-from seleniumbase import SB
+from urllib.parse import quote_plus
 from bs4 import BeautifulSoup
-import pandas as pd
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    from lxml import etree, html as lxml_html
+    _LXML_CARD_XPATH = etree.XPath("//div[contains(concat(' ', normalize-space(@class), ' '), ' css-5wh65g ')]")
+except ImportError:
+    lxml_html = None
 
 GMT7 = timezone(timedelta(hours=7))
 
 SCRIPT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 CHAT_LOGS = []
+OUTPUT_JSONL = os.path.join(SCRIPT_DIRECTORY, "tokopedia_products.jsonl")
+SEARCH_URL = "https://www.tokopedia.com/search?st=&q={query}&srp_component_id=02.01.00.00&srp_page_id=&srp_page_title=&navsource="
+
+_output_lock = threading.Lock()
+
+LOG_PATH = os.path.join(SCRIPT_DIRECTORY, "tokopedia_scraper_logs.txt")
+LOG_FLUSH_LINES = 100
+_log_buffer = []
+_log_lock = threading.Lock()
+
+def _flush_logs_locked():
+    if not _log_buffer:
+        return
+    with open(LOG_PATH, "a", encoding="utf-8") as logsfile:
+        logsfile.write("\n".join(_log_buffer) + "\n")
+    _log_buffer.clear()
+
+def flush_logs():
+    """Writes buffered log lines to the log file in one append."""
+    with _log_lock:
+        _flush_logs_locked()
+
+atexit.register(flush_logs)
 
 def add_logs(log_message):
-    """Appends a timestamped log message to the global log list and a file."""
+    """Appends a timestamped log message to the global log list and the buffered log file."""
     timestamp = f"[{datetime.now(GMT7).strftime('%Y-%m-%d %H:%M:%S')}] {log_message}"
     CHAT_LOGS.append(timestamp)
     print(timestamp)
-    logs_path = os.path.join(SCRIPT_DIRECTORY, "tokopedia_scraper_logs.txt")
-    with open(logs_path, "a", encoding="utf-8") as logsfile:
-        logsfile.write(timestamp + "\n")
-
-def append_to_excel(df, search_query):
-    """Appends scraped product data from a DataFrame to an Excel file."""
-    safe_query = re.sub(r'[\\/*?:"<>|]', "", search_query)
-    excel_filename = f"tokopedia_data_{safe_query}.xlsx"
-    excel_path = os.path.join(SCRIPT_DIRECTORY, excel_filename)
-    add_logs(f"Preparing to save {len(df)} products for query '{search_query}' to {excel_path}...")
-
-    try:
-        df_to_save = df.copy()
-
-        final_columns = [
-            'Product Name',
-            'Price (Rp)',
-            'Rating',
-            'Units Sold',
-            'Image URL'
-        ]
-
-        if os.path.exists(excel_path):
-            add_logs(f"Appending data to existing file: {excel_path}")
-            existing_df = pd.read_excel(excel_path, sheet_name='Products')
-            
-            combined_df = pd.concat([existing_df, df_to_save], ignore_index=True)
-            
-            combined_df.drop_duplicates(subset=['Product URL'], keep='last', inplace=True)
-            
-            output_df = combined_df[final_columns]
-            output_df.to_excel(excel_path, sheet_name='Products', index=False)
-            add_logs(f"Successfully updated {excel_path}. Total products now: {len(output_df)}")
-        else:
-            add_logs(f"Creating new file: {excel_path}")
-            
-            output_df = df_to_save[final_columns]
-            output_df.to_excel(excel_path, sheet_name='Products', index=False)
-            add_logs(f"Successfully created {excel_path} and saved {len(output_df)} rows.")
+    with _log_lock:
+        _log_buffer.append(timestamp)
+        if len(_log_buffer) >= LOG_FLUSH_LINES:
+            _flush_logs_locked()
 
-    except Exception as e:
-        add_logs(f"Error saving data to Excel: {e}")
+def build_search_url(search_query):
+    """Builds the Tokopedia search URL for a plain-text query."""
+    return SEARCH_URL.format(query=quote_plus(search_query))
 
-def parse_product_data(soup):
-    """Parses the HTML soup to extract product details."""
-    add_logs("Parsing product data from page source...")
-    products = []
-    product_cards = soup.find_all('div', class_='css-5wh65g')
-    add_logs(f"Found {len(product_cards)} potential product cards.")
+def append_to_jsonl(products, search_query, output_path=OUTPUT_JSONL):
+    """
+    Appends scraped products as JSON lines. Unlike the old Excel output the
+    existing file is never re-read or rewritten, so the cost of a save only
+    depends on the new rows. The file can be loaded with
+    `manage.py import_products <file>.jsonl --upsert`.
+    """
+    scraped_at = datetime.now(GMT7).isoformat()
+    lines = [
+        json.dumps({**product, 'Search Query': search_query, 'Scraped At': scraped_at}, ensure_ascii=False)
+        for product in products
+    ]
+    with _output_lock:
+        with open(output_path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+    add_logs(f"Appended {len(products)} products for query '{search_query}' to {output_path}.")
 
-    for card in product_cards:
-        try:
-            name = None
-            price = None
-            rating = None
-            sold = None
-            image_url = None
-            product_url = None
-
-            # Extract Product Name
-            name_tag = card.find('span', class_='+tnoqZhn89+NHUA43BpiJg==')
-            if name_tag:
-                name = name_tag.text.strip()
-
-            # Extract Price
-            price_tag = card.find(class_=re.compile(r'HJhoi0tEIlowsgSNDNWVXg==|YZHqvX\+8TVU2YltRC9S\+oA=='))
-            if price_tag:
-                price_raw = price_tag.text.strip()
-                price = int(re.sub(r'[^\d]', '', price_raw))
-
-            # Extract Rating
-            rating_tag = card.find('span', class_='_2NfJxPu4JC-55aCJ8bEsyw==')
-            if rating_tag:
-                rating = rating_tag.text.strip()
-
-            # Extract Units Sold
-            sold_tag = card.find('span', class_='u6SfjDD2WiBlNW7zHmzRhQ==')
-            if sold_tag:
-                sold = sold_tag.text.strip()
-
-            # Extract Image URL
-            img_tag = card.find('img', alt='product-image')
-            if img_tag and img_tag.has_attr('src'):
-                image_url = img_tag['src']
-
-            # Extract Product URL
-            link_tag = card.find('a', class_=re.compile(r'Ui5-B4CDAk4Cv-cjLm4o0g=='))
-            if link_tag and link_tag.has_attr('href'):
-                product_url = link_tag['href']
-
-            if name and price and product_url:
-                products.append({
-                    'Product Name': name,
-                    'Price (Rp)': price,
-                    'Rating': rating if rating else 'N/A',
-                    'Units Sold': sold if sold else 'N/A',
-                    'Image URL': image_url if image_url else 'N/A',
-                    'Product URL': product_url
-                })
-            else:
-                add_logs(f"Skipping a card due to missing essential data (Name, Price, or URL). Name found: {name is not None}, Price found: {price is not None}, URL found: {product_url is not None}")
+# Tokopedia's obfuscated class names, matched as whole class tokens.
+CARD_CLASS = 'css-5wh65g'
+NAME_CLASS = '+tnoqZhn89+NHUA43BpiJg=='
+PRICE_CLASSES = frozenset({'HJhoi0tEIlowsgSNDNWVXg==', 'YZHqvX+8TVU2YltRC9S+oA=='})
+RATING_CLASS = '_2NfJxPu4JC-55aCJ8bEsyw=='
+SOLD_CLASS = 'u6SfjDD2WiBlNW7zHmzRhQ=='
+LINK_CLASS = 'Ui5-B4CDAk4Cv-cjLm4o0g=='
+NON_DIGIT_RE = re.compile(r'[^\d]')
+CARD_SELECTOR = f'div.{CARD_CLASS}'
 
-        except Exception as e:
-            add_logs(f"Skipping a card due to a parsing error: {e}")
-            continue
+def _extract_card(elements):
+    """
+    Builds one product from a single pass over a card's elements. Each
+    element is a (tag, class tokens, get_attr, get_text) tuple, and for every
+    field the first matching element in document order wins.
+    """
+    found = {}
+    for tag, classes, get_attr, get_text in elements:
+        if tag == 'span':
+            if NAME_CLASS in classes and 'name' not in found:
+                found['name'] = get_text()
+            elif RATING_CLASS in classes and 'rating' not in found:
+                found['rating'] = get_text()
+            elif SOLD_CLASS in classes and 'sold' not in found:
+                found['sold'] = get_text()
+        elif tag == 'img' and 'image_url' not in found and get_attr('alt') == 'product-image':
+            found['image_url'] = get_attr('src')
+        elif tag == 'a' and 'product_url' not in found and LINK_CLASS in classes:
+            found['product_url'] = get_attr('href')
+
+        if 'price' not in found and not PRICE_CLASSES.isdisjoint(classes):
+            found['price'] = int(NON_DIGIT_RE.sub('', get_text()))
+
+    name, price, product_url = found.get('name'), found.get('price'), found.get('product_url')
+    if not (name and price and product_url):
+        return None
+    return {
+        'Product Name': name,
+        'Price (Rp)': price,
+        'Rating': found.get('rating') or 'N/A',
+        'Units Sold': found.get('sold') or 'N/A',
+        'Image URL': found.get('image_url') or 'N/A',
+        'Product URL': product_url
+    }
+
+def _bs4_cards(soup):
+    for card in soup.find_all('div', class_=CARD_CLASS):
+        yield (
+            (el.name, el.get('class') or (), el.get, lambda el=el: el.get_text().strip())
+            for el in card.find_all(True)
+        )
 
+def _lxml_cards(html):
+    root = lxml_html.fromstring(html)
+    for card in _LXML_CARD_XPATH(root):
+        yield (
+            (el.tag, (el.get('class') or '').split(), el.get, lambda el=el: el.text_content().strip())
+            for el in card.iter()
+            if isinstance(el.tag, str)
+        )
+
+def _selectolax_cards(html):
+    for card in LexborHTMLParser(html).css(CARD_SELECTOR):
+        yield (
+            (node.tag, (node.attributes.get('class') or '').split(), node.attributes.get,
+             lambda node=node: node.text(strip=True))
+            for node in card.traverse(include_text=False)
+        )
+
+def _parse_cards(cards):
+    products = []
+    skipped = 0
+    for elements in cards:
+        try:
+            product = _extract_card(elements)
+        except Exception:
+            product = None
+        if product is None:
+            skipped += 1
+        else:
+            products.append(product)
+    if skipped:
+        add_logs(f"Skipped {skipped} cards with missing or unparsable Name, Price or URL.")
     add_logs(f"Successfully parsed {len(products)} products.")
     return products
 
-def run_scraper(target_url, search_query):
+def parse_product_data(soup):
+    """Parses an already-built BeautifulSoup document to extract product details."""
+    add_logs("Parsing product data from page source...")
+    return _parse_cards(_bs4_cards(soup))
+
+def available_parsers():
+    """Parser backends usable in this environment, fastest first."""
+    backends = []
+    if LexborHTMLParser is not None:
+        backends.append('selectolax')
+    if lxml_html is not None:
+        backends.append('lxml')
+    backends.append('html.parser')
+    return backends
+
+def parse_html(html, backend=None):
+    """Parses a search result page with the fastest available backend (or the one given)."""
+    backend = backend or available_parsers()[0]
+    add_logs(f"Parsing product data from page source with {backend}...")
+    if backend == 'selectolax':
+        cards = _selectolax_cards(html)
+    elif backend == 'lxml':
+        cards = _lxml_cards(html)
+    else:
+        cards = _bs4_cards(BeautifulSoup(html, 'html.parser'))
+    return _parse_cards(cards)
+
+def fetch_page_html(target_url, scroll_count=5, scroll_pause=3):
+    """Opens the search page in a headless browser, scrolls to load more cards and returns the HTML."""
+    from seleniumbase import SB
+
+    with SB(uc=True, headless=True, incognito=True, locale_code="id") as sb:
+        sb.uc_open_with_reconnect(target_url, reconnect_time=5)
+        add_logs("Waiting for initial product data to load...")
+        sb.wait_for_element('div.css-5wh65g', timeout=60)
+
+        add_logs("Initial data loaded. Scrolling down to load more products...")
+        for i in range(scroll_count):
+            sb.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            add_logs(f"Scroll iteration {i+1}/{scroll_count}...")
+            time.sleep(scroll_pause)
+
+        return sb.get_page_source()
+
+class HtmlFixtureFetcher:
+    """
+    Serves recorded search pages from a directory instead of opening a
+    browser, so the pipeline can be run and tested offline. A query is
+    mapped to `<directory>/<query with spaces as +>.html`.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __call__(self, target_url, **kwargs):
+        query = re.search(r'[?&]q=([^&]*)', target_url).group(1)
+        with open(os.path.join(self.directory, f"{query}.html"), encoding="utf-8") as f:
+            return f.read()
+
+def backoff_delay(attempt, base_delay):
+    """Exponential backoff with jitter so parallel sessions do not retry in lockstep."""
+    return base_delay * (2 ** attempt) + random.uniform(0, base_delay)
+
+def run_scraper(target_url, search_query, fetch_html=fetch_page_html, sink=append_to_jsonl,
+                max_attempts=3, base_delay=5):
     """
     Runs one full cycle of the scraper for a given Tokopedia URL.
-    Tries up to 3 times to load the page and find product data.
+    Tries up to `max_attempts` times to load the page and find product data,
+    and returns the parsed products (empty list when every attempt failed).
     """
     add_logs(f"Starting scrape cycle for query: '{search_query}'...")
-    max_attempts = 3
 
     for attempt in range(max_attempts):
-        product_data = []
         try:
             add_logs(f"Attempt {attempt + 1}/{max_attempts} for query '{search_query}'...")
-            with SB(uc=True, headless=True, incognito=True, locale_code="id") as sb:
-                sb.uc_open_with_reconnect(target_url, reconnect_time=5)
-                add_logs("Waiting for initial product data to load...")
-                sb.wait_for_element('div.css-5wh65g', timeout=60)
-
-                add_logs("Initial data loaded. Proceeding with scrape.")
-                time.sleep(5)
-
-                add_logs("Scrolling down to load more products...")
-                scroll_count = 5
-                for i in range(scroll_count):
-                    sb.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                    add_logs(f"Scroll iteration {i+1}/{scroll_count}...")
-                    time.sleep(3)
-
-                html = sb.get_page_source()
-                soup = BeautifulSoup(html, 'html.parser')
-                product_data = parse_product_data(soup)
-
-                if product_data:
-                    df = pd.DataFrame(product_data).sort_values(by='Price (Rp)').reset_index(drop=True)
-                    append_to_excel(df, search_query)
-                    add_logs(f"Scrape cycle for '{search_query}' finished successfully on this attempt.")
-                    return
-                else:
-                    add_logs(f"No products found for '{search_query}' on this attempt.")
-                    if attempt == max_attempts - 1:
-                        add_logs(f"No products found for '{search_query}' after {max_attempts} attempts.")
+            html = fetch_html(target_url)
+            product_data = parse_html(html)
+
+            if product_data:
+                product_data.sort(key=lambda p: p['Price (Rp)'])
+                if sink is not None:
+                    sink(product_data, search_query)
+                add_logs(f"Scrape cycle for '{search_query}' finished successfully on this attempt.")
+                return product_data
+            add_logs(f"No products found for '{search_query}' on this attempt.")
 
         except Exception as e:
             add_logs(f"Attempt {attempt + 1} for query '{search_query}' failed: {e}")
-            if attempt < max_attempts - 1:
-                add_logs("Retrying...")
-                time.sleep(10)
-            else:
-                add_logs(f"All attempts for query '{search_query}' failed.")
+
+        if attempt < max_attempts - 1:
+            delay = backoff_delay(attempt, base_delay)
+            add_logs(f"Retrying '{search_query}' in {delay:.1f}s...")
+            time.sleep(delay)
+
+    add_logs(f"All attempts for query '{search_query}' failed.")
+    return []
+
+def scrape_queries(queries, max_workers=3, **scraper_kwargs):
+    """
+    Scrapes several queries in parallel. Each worker runs its own browser
+    session, and `max_workers` bounds how many sessions are open at once.
+    Returns {query: products}.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(run_scraper, build_search_url(query), query, **scraper_kwargs): query
+            for query in queries
+        }
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+def benchmark_parsers(fixture_dir, repeat=20, backends=None):
+    """
+    Parses every saved page in `fixture_dir` `repeat` times with each backend
+    and returns {backend: cards per second}.
+    """
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages.append(f.read())
+    card_count = sum(page.count(CARD_CLASS) for page in pages)
+
+    results = {}
+    for backend in backends or available_parsers():
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for page in pages:
+                parse_html(page, backend)
+        elapsed = time.perf_counter() - started
+        results[backend] = card_count * repeat / elapsed if elapsed else float("inf")
+    return results
 
 def main():
-    """Main function to run the Tokopedia product scraper once."""
+    """Runs the Tokopedia product scraper once for every query given on the command line."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("queries", nargs="*", default=["bola voli"], help="Search queries, e.g. \"bola voli\" \"raket badminton\"")
+    parser.add_argument("--workers", type=int, default=3, help="Maximum number of browser sessions running at once")
+    parser.add_argument("--attempts", type=int, default=3, help="Attempts per query")
+    parser.add_argument("--backoff", type=float, default=5, help="Base retry delay in seconds")
+    parser.add_argument("--output", default=OUTPUT_JSONL, help="JSONL file to append results to")
+    parser.add_argument("--fixtures", help="Read recorded HTML pages from this directory instead of opening a browser")
+    parser.add_argument("--benchmark", metavar="DIR", help="Measure parser throughput on the saved HTML pages in DIR and exit")
+    parser.add_argument("--repeat", type=int, default=20, help="Passes over the pages per backend in --benchmark mode")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        # Parser logs would dominate the timing, so they are muted while measuring.
+        global add_logs
+        add_logs = lambda log_message: None
+        for backend, rate in benchmark_parsers(args.benchmark, args.repeat).items():
+            print(f"{backend:<12} {rate:>12.0f} cards/s")
+        return
 
-    SEARCH_QUERY = "bola+voli"
-    TARGET_URL = f"https://www.tokopedia.com/search?st=&q={SEARCH_QUERY}&srp_component_id=02.01.00.00&srp_page_id=&srp_page_title=&navsource="
+    scraper_kwargs = {
+        "max_attempts": args.attempts,
+        "base_delay": args.backoff,
+        "sink": lambda products, query: append_to_jsonl(products, query, args.output),
+    }
+    if args.fixtures:
+        scraper_kwargs["fetch_html"] = HtmlFixtureFetcher(args.fixtures)
 
-    add_logs(f"=== Starting scrape run for query: '{SEARCH_QUERY}'. ===")
-    run_scraper(TARGET_URL, SEARCH_QUERY)
-    add_logs("=== Scrape run finished. ===")
+    add_logs(f"=== Starting scrape run for {len(args.queries)} queries with {args.workers} workers. ===")
+    started = time.perf_counter()
+    results = scrape_queries(args.queries, max_workers=args.workers, **scraper_kwargs)
+    total = sum(len(products) for products in results.values())
+    add_logs(f"=== Scrape run finished: {total} products in {time.perf_counter() - started:.1f}s. ===")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+from home.utils.bench import DB_ERROR, ensure_scratch_database, format_latency, run_concurrent
+from store.models import Cart, CartItem, InventoryEntry, Order, Product
+from store.services import OutOfStock, checkout_cart
+
+User = get_user_model()
+
+BENCH_PREFIX = 'bench-checkout'
+
+
+class Command(BaseCommand):
+    help = 'Mengukur throughput checkout dengan banyak pembeli bersamaan pada produk yang sama'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--buyers', type=int, default=50, help='Jumlah pembeli (satu checkout per pembeli)')
+        parser.add_argument('--workers', type=int, default=8, help='Jumlah thread yang berjalan bersamaan')
+        parser.add_argument('--stock', type=int, default=30, help='Stok awal produk populer')
+        parser.add_argument('--quantity', type=int, default=1, help='Jumlah barang per checkout')
+
+    def handle(self, *args, **options):
+        ensure_scratch_database()
+        buyers, workers = options['buyers'], options['workers']
+        product = Product.objects.create(name=f'{BENCH_PREFIX} hot product', price=10000, stock=options['stock'])
+        users = [User.objects.create(username=f'{BENCH_PREFIX}-{i}') for i in range(buyers)]
+        carts = []
+        for user in users:
+            cart = Cart.objects.create(owner=user)
+            CartItem.objects.create(cart=cart, product=product, quantity=options['quantity'])
+            carts.append(cart)
+
+        def buy(cart):
+            try:
+                checkout_cart(cart)
+            except OutOfStock:
+                return 'out_of_stock'
+            return 'ok'
+
+        try:
+            results, elapsed = run_concurrent(buy, carts, workers)
+            outcomes = [outcome for outcome, _ in results]
+            product.refresh_from_db()
+            sold = -(InventoryEntry.objects.filter(product=product).aggregate(total=Sum('change'))['total'] or 0)
+
+            self.stdout.write(f'Pembeli            : {buyers} ({workers} thread)')
+            self.stdout.write(f'Checkout berhasil  : {outcomes.count("ok")}')
+            self.stdout.write(f'Stok habis         : {outcomes.count("out_of_stock")}')
+            self.stdout.write(f'Error database     : {outcomes.count(DB_ERROR)}')
+            self.stdout.write(f'Durasi             : {elapsed:.3f}s')
+            self.stdout.write(f'Throughput         : {buyers / elapsed:.1f} checkout/s')
+            self.stdout.write(f'Latensi p50 / p95  : {format_latency(latency for _, latency in results)}')
+
+            if product.stock < 0 or sold != options['stock'] - product.stock:
+                self.stdout.write(self.style.ERROR(f'Ledger tidak konsisten: stok={product.stock}, terjual={sold}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Ledger konsisten: sisa stok {product.stock}, terjual {sold}'))
+        finally:
+            Order.objects.filter(owner__in=users).delete()
+            product.delete()
+            User.objects.filter(pk__in=[u.pk for u in users]).delete()
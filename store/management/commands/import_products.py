@@ -1,89 +1,225 @@
-import pandas as pd
-from django.core.management.base import BaseCommand
-from store.models import Product
+import itertools
+import json
 import os
-import random
+import time
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from store.models import Product, parse_units_sold
+from store.services import invalidate_cart_summaries, invalidate_featured_products
 from home.models import FitnessSpot
-from django.db import connection
+
+DEFAULT_FILE = os.path.join(settings.BASE_DIR, 'store', 'static', 'data', 'product_dataset.xlsx')
+
+# Nama kolom di file sumber -> field Product. Dataset hasil scraping memakai
+# nama kolom Excel, sedangkan products.json memakai format fixture Django.
+COLUMN_MAP = {
+    'Product Name': 'name',
+    'Price (Rp)': 'price',
+    'Rating': 'rating',
+    'Units Sold': 'units_sold',
+    'Image URL': 'image_url',
+    'fields.name': 'name',
+    'fields.price': 'price',
+    'fields.rating': 'rating',
+    'fields.units_sold': 'units_sold',
+    'fields.image_url': 'image_url',
+    'fields.store': 'store_id',
+}
+FIELDS = ['name', 'price', 'rating', 'units_sold', 'image_url', 'store_id']
+SUPPORTED_EXTENSIONS = ('.xlsx', '.xls', '.csv', '.jsonl', '.parquet', '.json')
+
+
+def file_extension(path):
+    """Ekstensi file sumber; CommandError bila formatnya tidak didukung."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SUPPORTED_EXTENSIONS:
+        raise CommandError(f'Format file tidak didukung: {ext}')
+    return ext
+
+
+def read_chunks(path, chunk_size):
+    """Baca file sumber (xlsx/csv/jsonl/parquet/json) sebagai potongan DataFrame."""
+    ext = file_extension(path)
+    if ext == '.csv':
+        yield from pd.read_csv(path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+        return
+    if ext == '.jsonl':
+        yield from pd.read_json(path, lines=True, chunksize=chunk_size, dtype=False)
+        return
+
+    if ext in ('.xlsx', '.xls'):
+        df = pd.read_excel(path)
+    elif ext == '.parquet':
+        df = pd.read_parquet(path)
+    else:
+        with open(path, encoding='utf-8') as f:
+            df = pd.json_normalize(json.load(f))
+
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size]
+
+
+def clean_chunk(df):
+    """Normalisasi kolom secara vektor: 'N/A' -> None, harga jadi angka, rating 0-5."""
+    df = df.rename(columns=COLUMN_MAP).reindex(columns=FIELDS)
+    df = df.astype(object).where(df.notna(), None)
+    df = df.replace({'N/A': None, '': None})
+
+    # Harga yang sudah numerik dipakai apa adanya; teks seperti "Rp1.250.000" dibuang non-digitnya.
+    price = pd.to_numeric(df['price'], errors='coerce')
+    price = price.fillna(pd.to_numeric(df['price'].astype(str).str.replace(r'[^\d]', '', regex=True), errors='coerce'))
+    rating = pd.to_numeric(df['rating'], errors='coerce')
+    rating = rating.where(rating.between(0, 5))
+
+    df['price'] = price
+    df['rating'] = rating.map('{:g}'.format).astype(object).where(rating.notna(), None)
+    df['name'] = df['name'].str.strip()
+    return df[df['price'].notna() & df['name'].notna() & df['name'].ne('')]
+
 
 class Command(BaseCommand):
-    help = 'Imports products from an Excel file into the database'
+    help = 'Imports products from an Excel/CSV/JSONL/Parquet/JSON file into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', default=DEFAULT_FILE, help='File sumber (.xlsx, .csv, .jsonl, .parquet, .json)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Jumlah baris per bulk_create/bulk_update')
+        parser.add_argument('--seed', type=int, default=42, help='Seed untuk pembagian produk ke toko')
+        parser.add_argument(
+            '--upsert', action='store_true',
+            help='Perbarui produk dengan nama yang sama dan tambahkan yang baru, tanpa menghapus data lama',
+        )
 
     def handle(self, *args, **options):
-        file_name = 'product_dataset.xlsx'
-        file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), file_name)
+        file_path = options['file']
+        batch_size = options['batch_size']
 
         if not os.path.exists(file_path):
             self.stdout.write(self.style.ERROR(f'File not found: {file_path}'))
             return
+        file_extension(file_path)
 
-        self.stdout.write(self.style.SUCCESS(f'Reading from {file_path}...'))
-        
-        try:
-            df = pd.read_excel(file_path)
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error reading Excel file: {e}'))
-            return
-        
         self.stdout.write('Mengambil data fitness spots...')
-        spot_pks = list(FitnessSpot.objects.values_list('pk', flat=True))
+        spot_pks = np.array(sorted(FitnessSpot.objects.values_list('pk', flat=True)), dtype=object)
 
-        if not spot_pks:
+        if not len(spot_pks):
             self.stdout.write(self.style.ERROR('Tidak ada data FitnessSpot di database! Harap muat data GOR terlebih dahulu.'))
             return
-            
+
         self.stdout.write(f'Ditemukan {len(spot_pks)} fitness spots (toko).')
-        
-        self.stdout.write('Deleting old products and resetting ID sequence...')
-        
-        table_name = Product._meta.db_table
-        db_vendor = connection.vendor
 
+        # Potongan pertama dibaca sebelum tabel disentuh: file yang tidak bisa
+        # dibaca sama sekali tidak menghapus katalog yang ada.
+        self.stdout.write(self.style.SUCCESS(f'Reading from {file_path}...'))
+        started = time.perf_counter()
         try:
-            with connection.cursor() as cursor:
-                if db_vendor == 'sqlite':
-
-                    cursor.execute(f"DELETE FROM {table_name};")
-
-                    cursor.execute(f"DELETE FROM sqlite_sequence WHERE name='{table_name}';")
-                
-                elif db_vendor == 'postgresql':
-                    cursor.execute(f"TRUNCATE TABLE {table_name} RESTART IDENTITY CASCADE;")
-                    
-                elif db_vendor == 'mysql':
-                    cursor.execute(f"TRUNCATE TABLE {table_name};")
-                    
-                else:
-                    self.stdout.write(self.style.WARNING(f"Using standard Django delete (PK might not reset for '{db_vendor}')..."))
-                    Product.objects.all().delete()
+            chunks = read_chunks(file_path, batch_size)
+            first = next(chunks, None)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error reading file: {e}'))
+            return
+        chunks = itertools.chain([first], chunks) if first is not None else iter(())
+
+        rng = np.random.default_rng(options['seed'])
+        valid_spots = set(spot_pks)
+        created = updated = skipped = 0
 
-            self.stdout.write(self.style.SUCCESS('Old products deleted and ID sequence reset.'))
-        
+        # Reset dan semua potongan dalam satu transaksi: error di tengah file
+        # membatalkan seluruh impor, termasuk penghapusan produk lama.
+        try:
+            with transaction.atomic():
+                created, updated, skipped = self._import(chunks, options, spot_pks, valid_spots, rng)
+        except CommandError:
+            raise
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error deleting/resetting data: {e}'))
+            self.stdout.write(self.style.ERROR(f'Error importing file: {e}. Tidak ada perubahan yang disimpan.'))
             return
 
-        
-        self.stdout.write('Importing new products...')
-        
-        products_to_create = []
-        
-        for index, row in df.iterrows():
-            rating_val = row['Rating'] if row['Rating'] != 'N/A' else None
-            sold_val = row['Units Sold'] if row['Units Sold'] != 'N/A' else None
-
-            chosen_store_id = random.choice(spot_pks) 
-
-            product = Product(
-                name=row['Product Name'],
-                price=row['Price (Rp)'],
-                rating=rating_val,
-                units_sold=sold_val,
-                image_url=row['Image URL'],
-                store_id = chosen_store_id 
+        # bulk_create/bulk_update tidak memicu signal post_save.
+        invalidate_featured_products()
+        invalidate_cart_summaries()
+
+        elapsed = time.perf_counter() - started
+        total = created + updated
+        rate = total / elapsed if elapsed else float(total)
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully imported {total} products ({created} baru, {updated} diperbarui, {skipped} dilewati) '
+            f'dalam {elapsed:.2f}s ({rate:.0f} baris/s).'
+        ))
+
+    def _import(self, chunks, options, spot_pks, valid_spots, rng):
+        """Hapus/muat produk lama lalu simpan semua potongan. Dipanggil di dalam satu transaksi."""
+        batch_size = options['batch_size']
+        if not options['upsert']:
+            self._reset_products()
+            existing = {}
+        else:
+            existing = dict(Product.objects.values_list('name', 'pk'))
+
+        created = updated = skipped = 0
+        for chunk in chunks:
+            df = clean_chunk(chunk)
+            if options['upsert']:
+                df = df.drop_duplicates('name', keep='last')
+            skipped += len(chunk) - len(df)
+
+            # Toko dari file dipakai bila valid, sisanya dibagi acak dengan seed tetap.
+            random_stores = spot_pks[rng.integers(0, len(spot_pks), size=len(df))]
+            has_store = df['store_id'].isin(valid_spots).to_numpy(dtype=bool)
+            df['store_id'] = np.where(has_store, df['store_id'].to_numpy(dtype=object), random_stores)
+
+            to_create, to_update = [], []
+            for row in df.itertuples(index=False):
+                product = Product(
+                    name=row.name,
+                    price=int(row.price),
+                    rating=row.rating,
+                    units_sold=row.units_sold,
+                    units_sold_count=parse_units_sold(row.units_sold),
+                    image_url=row.image_url,
+                    store_id=row.store_id,
+                )
+                pk = existing.get(row.name)
+                if pk is None:
+                    to_create.append(product)
+                else:
+                    product.pk = pk
+                    to_update.append(product)
+
+            new_products = Product.objects.bulk_create(to_create, batch_size=batch_size)
+            Product.objects.bulk_update(
+                to_update, ['price', 'rating', 'units_sold', 'units_sold_count', 'image_url', 'store_id'],
+                batch_size=batch_size,
             )
-            products_to_create.append(product)
+            if options['upsert']:
+                existing.update((p.name, p.pk) for p in new_products if p.pk is not None)
+            created += len(to_create)
+            updated += len(to_update)
+        return created, updated, skipped
+
+    def _reset_products(self):
+        self.stdout.write('Deleting old products and resetting ID sequence...')
+
+        table_name = Product._meta.db_table
+        db_vendor = connection.vendor
+
+        with connection.cursor() as cursor:
+            if db_vendor == 'sqlite':
+
+                cursor.execute(f"DELETE FROM {table_name};")
+
+                cursor.execute(f"DELETE FROM sqlite_sequence WHERE name='{table_name}';")
+
+            elif db_vendor == 'postgresql':
+                cursor.execute(f"TRUNCATE TABLE {table_name} RESTART IDENTITY CASCADE;")
+
+            elif db_vendor == 'mysql':
+                cursor.execute(f"TRUNCATE TABLE {table_name};")
 
-        Product.objects.bulk_create(products_to_create)
+            else:
+                self.stdout.write(self.style.WARNING(f"Using standard Django delete (PK might not reset for '{db_vendor}')..."))
+                Product.objects.all().delete()
 
-        self.stdout.write(self.style.SUCCESS(f'Successfully imported {len(products_to_create)} products.'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Old products deleted and ID sequence reset.'))
@@ -0,0 +1,15 @@
+import json
+from django.core.management.base import BaseCommand
+from store.services import build_featured_payload
+
+
+class Command(BaseCommand):
+    help = (
+        'Menghitung ulang daftar produk unggulan untuk homepage. Jalankan berkala (cron) '
+        'bila CACHES memakai backend bersama seperti Redis/Memcached.'
+    )
+
+    def handle(self, *args, **options):
+        payload = build_featured_payload()
+        count = len(json.loads(payload['body'])['products'])
+        self.stdout.write(self.style.SUCCESS(f'{count} produk unggulan disimpan (ETag {payload["etag"]}).'))
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:48
+
+import re
+
+from django.db import migrations, models
+
+# Salinan store.models.parse_units_sold pada saat migrasi ini dibuat, supaya
+# hasil migrasi tidak berubah bila parser di kode aplikasi berubah kemudian.
+_UNITS_SOLD_RE = re.compile(r'(\d+(?:[.,]\d+)?)\s*(rb|jt)?', re.IGNORECASE)
+_UNITS_SOLD_MULTIPLIER = {'rb': 1_000, 'jt': 1_000_000}
+
+
+def _parse_units_sold(value):
+    match = _UNITS_SOLD_RE.search(value or '')
+    if not match:
+        return 0
+    number = float(match.group(1).replace(',', '.'))
+    return int(number * _UNITS_SOLD_MULTIPLIER.get((match.group(2) or '').lower(), 1))
+
+
+def fill_units_sold_count(apps, schema_editor):
+    """Isi units_sold_count dari teks units_sold produk yang sudah ada."""
+    Product = apps.get_model('store', 'Product')
+    batch = []
+    for product in Product.objects.exclude(units_sold__isnull=True).exclude(units_sold='').only('pk', 'units_sold').iterator(2000):
+        product.units_sold_count = _parse_units_sold(product.units_sold)
+        batch.append(product)
+        if len(batch) >= 2000:
+            Product.objects.bulk_update(batch, ['units_sold_count'])
+            batch = []
+    Product.objects.bulk_update(batch, ['units_sold_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0002_placetype_alter_fitnessspot_rating_and_more'),
+        ('store', '0004_order_inventory'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='units_sold_count',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_units_sold_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-units_sold_count', 'id'], name='product_units_sold_idx'),
+        ),
+    ]
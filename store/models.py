@@ -1,14 +1,33 @@
+import re
 from django.conf import settings
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from decimal import Decimal
 from home.models import FitnessSpot
 
+_UNITS_SOLD_RE = re.compile(r'(\d+(?:[.,]\d+)?)\s*(rb|jt)?', re.IGNORECASE)
+_UNITS_SOLD_MULTIPLIER = {'rb': 1_000, 'jt': 1_000_000}
+
+
+def parse_units_sold(value):
+    """Ubah teks seperti '4rb+ terjual' atau '1,2jt terjual' menjadi angka (4000, 1200000)."""
+    match = _UNITS_SOLD_RE.search(value or '')
+    if not match:
+        return 0
+    number = float(match.group(1).replace(',', '.'))
+    return int(number * _UNITS_SOLD_MULTIPLIER.get((match.group(2) or '').lower(), 1))
+
+
 class Product(models.Model):
     name = models.CharField(max_length=255)
     price = models.DecimalField(max_digits=12, decimal_places=0)
     rating = models.CharField(max_length=10, null=True, blank=True)
     units_sold = models.CharField(max_length=50, null=True, blank=True)
+    # Angka dari teks `units_sold`, diisi saat save(); dipakai untuk mengurutkan produk unggulan.
+    units_sold_count = models.PositiveBigIntegerField(default=0, editable=False)
     image_url = models.URLField(max_length=1000, null=True, blank=True)
+    stock = models.PositiveIntegerField(null=True, blank=True, help_text='Kosongkan bila stok tidak dilacak')
     created_at = models.DateTimeField(auto_now_add=True, null=True)
 
     store = models.ForeignKey(
@@ -19,9 +38,21 @@ class Product(models.Model):
         related_name="products"
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-units_sold_count', 'id'], name='product_units_sold_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} — Rp{int(self.price):,}"
 
+    def save(self, *args, **kwargs):
+        self.units_sold_count = parse_units_sold(self.units_sold)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'units_sold' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'units_sold_count'}
+        super().save(*args, **kwargs)
+
 
 class Cart(models.Model):
     owner = models.ForeignKey(
@@ -37,10 +68,8 @@ class Cart(models.Model):
         return f"Cart(session={self.session_key})"
 
     def total_price(self):
-        total = Decimal(0)
-        for item in self.items.all():
-            total += item.total_price()
-        return total
+        from .services import cart_totals
+        return cart_totals(self)['total']
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
@@ -54,4 +83,81 @@ class CartItem(models.Model):
         return f"{self.product.name} x{self.quantity}"
 
     def total_price(self):
-        return Decimal(self.product.price) * self.quantity
\ No newline at end of file
+        line_total = getattr(self, 'line_total', None)
+        if line_total is not None:
+            return Decimal(line_total)
+        return Decimal(self.product.price) * self.quantity
+
+
+class OrderStatus(models.TextChoices):
+    PAID = "paid", "Paid"
+    CANCELLED = "cancelled", "Cancelled"
+
+
+class Order(models.Model):
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='orders'
+    )
+    session_key = models.CharField(max_length=40, blank=True)
+    status = models.CharField(max_length=10, choices=OrderStatus.choices, default=OrderStatus.PAID)
+    total = models.DecimalField(max_digits=14, decimal_places=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Order #{self.pk} — Rp{int(self.total):,}"
+
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, related_name='lines', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, null=True, blank=True, on_delete=models.SET_NULL)
+    product_name = models.CharField(max_length=255)
+    unit_price = models.DecimalField(max_digits=12, decimal_places=0)
+    quantity = models.PositiveIntegerField()
+    line_total = models.DecimalField(max_digits=14, decimal_places=0)
+
+    def __str__(self):
+        return f"{self.product_name} x{self.quantity}"
+
+
+class InventoryReason(models.TextChoices):
+    CHECKOUT = "checkout", "Checkout"
+    RESTOCK = "restock", "Restock"
+    ADJUSTMENT = "adjustment", "Adjustment"
+
+
+class InventoryEntry(models.Model):
+    """
+    Ledger stok yang hanya bisa ditambah (append-only). Setiap perubahan
+    `Product.stock` dicatat sebagai satu baris di sini.
+    """
+    product = models.ForeignKey(Product, related_name='inventory_entries', on_delete=models.CASCADE)
+    change = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=InventoryReason.choices)
+    order = models.ForeignKey(Order, null=True, blank=True, on_delete=models.SET_NULL, related_name='inventory_entries')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'Inventory entries'
+
+    def __str__(self):
+        return f"{self.product_id} {self.change:+d} ({self.reason})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Ledger stok tidak boleh diubah.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger stok tidak boleh dihapus.")
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_caches(sender, instance, **kwargs):
+    """Harga atau keberadaan produk berubah, jadi total keranjang dan produk unggulan di cache sudah basi."""
+    from .services import invalidate_cart_summaries, invalidate_featured_products
+    invalidate_cart_summaries()
+    invalidate_featured_products()
@@ -0,0 +1,341 @@
+import hashlib
+import json
+import time
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum, Window
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from home.utils.db import lock_for_write
+from .models import Cart, CartItem, InventoryEntry, InventoryReason, Order, OrderLine, Product
+
+CART_CACHE_TIMEOUT = 60 * 15
+CART_CACHE_VERSION_KEY = 'cart_summary_version'
+
+FEATURED_CACHE_KEY = 'featured_products_payload'
+FEATURED_CACHE_TIMEOUT = 60 * 10
+FEATURED_LIMIT = 15
+FEATURED_PLACEHOLDER_IMAGE = 'https://via.placeholder.com/300x180.png?text=No+Image'
+
+LINE_TOTAL = ExpressionWrapper(
+    F('quantity') * F('product__price'),
+    output_field=DecimalField(max_digits=14, decimal_places=0),
+)
+
+
+def cart_items(cart):
+    """Item keranjang beserta produknya, dengan `line_total` dihitung di SQL."""
+    return (
+        CartItem.objects.filter(cart=cart)
+        .select_related('product')
+        .annotate(line_total=LINE_TOTAL)
+        .order_by('pk')
+    )
+
+
+def cart_totals(cart):
+    """Jumlah item dan total harga keranjang dalam satu query agregat."""
+    totals = CartItem.objects.filter(cart=cart).aggregate(
+        item_count=Count('pk'),
+        total=Coalesce(Sum(LINE_TOTAL), Decimal(0), output_field=LINE_TOTAL.output_field),
+    )
+    return {'item_count': totals['item_count'], 'total': Decimal(totals['total'])}
+
+
+def cart_summary(cart):
+    """
+    Item, total per baris, jumlah item dan grand total keranjang dari satu
+    query. Total keseluruhan dihitung lewat window function sehingga tidak
+    perlu query agregat terpisah.
+    """
+    items = list(
+        cart_items(cart).annotate(
+            cart_count=Window(expression=Count('pk')),
+            cart_total=Window(expression=Sum(LINE_TOTAL)),
+        )
+    )
+    if not items:
+        return {'items': [], 'item_count': 0, 'total': Decimal(0)}
+    return {
+        'items': items,
+        'item_count': items[0].cart_count,
+        'total': Decimal(items[0].cart_total),
+    }
+
+
+def _cart_cache_key(request):
+    if request.user.is_authenticated:
+        return f"cart_summary_user_{request.user.pk}"
+    session_key = request.session.session_key
+    if not session_key:
+        return None
+    return f"cart_summary_session_{session_key}"
+
+
+def _new_cache_version():
+    return time.time_ns()
+
+
+def _cart_cache_version():
+    return cache.get_or_set(CART_CACHE_VERSION_KEY, _new_cache_version, None)
+
+
+def remember_cart_summary(request, cart, totals=None):
+    """
+    Simpan ringkasan keranjang (id, jumlah item, total) ke cache. Dipanggil
+    oleh setiap endpoint yang mengubah keranjang (write-through).
+    """
+    if cart is not None and totals is None:
+        totals = cart_totals(cart)
+    summary = {
+        'id': cart.pk if cart is not None else None,
+        'item_count': totals['item_count'] if totals else 0,
+        'total': int(totals['total']) if totals else 0,
+    }
+    key = _cart_cache_key(request)
+    if key is not None:
+        cache.set(key, summary, CART_CACHE_TIMEOUT, version=_cart_cache_version())
+    return summary
+
+
+def get_cart_summary(request):
+    """
+    Ringkasan keranjang untuk halaman read-only. Cache hit tidak menyentuh
+    database, dan pengunjung anonim tanpa session tidak dibuatkan Cart.
+    """
+    key = _cart_cache_key(request)
+    if key is None:
+        return {'id': None, 'item_count': 0, 'total': 0}
+
+    cached = cache.get(key, version=_cart_cache_version())
+    if cached is not None:
+        return cached
+
+    if request.user.is_authenticated:
+        cart = Cart.objects.filter(owner=request.user).first()
+    else:
+        cart = Cart.objects.filter(session_key=request.session.session_key).first()
+    return remember_cart_summary(request, cart)
+
+
+def invalidate_cart_summaries():
+    """Buang semua ringkasan keranjang di cache, misalnya saat harga produk berubah."""
+    cache.set(CART_CACHE_VERSION_KEY, _new_cache_version(), None)
+
+
+def _upsert_values_sql(quantities):
+    """Potongan `SELECT` + parameter untuk INSERT ... SELECT yang sekaligus memvalidasi produk."""
+    cases = ' '.join('WHEN %s THEN %s' for _ in quantities)
+    placeholders = ', '.join('%s' for _ in quantities)
+    case_params = [v for pid, qty in quantities.items() for v in (pid, qty)]
+    return cases, placeholders, case_params, list(quantities)
+
+
+def _upsert_postgresql(cart, quantities):
+    item_table = CartItem._meta.db_table
+    product_table = Product._meta.db_table
+    cases, placeholders, case_params, ids = _upsert_values_sql(quantities)
+    sql = f"""
+        WITH upserted AS (
+            INSERT INTO {item_table} (cart_id, product_id, quantity)
+            SELECT %s, p.id, CASE p.id {cases} END
+            FROM {product_table} p
+            WHERE p.id IN ({placeholders})
+            ON CONFLICT (cart_id, product_id)
+            DO UPDATE SET quantity = {item_table}.quantity + EXCLUDED.quantity
+            RETURNING product_id, quantity, (xmax = 0) AS inserted
+        ),
+        before AS (
+            SELECT COUNT(*) AS item_count, COALESCE(SUM(ci.quantity * bp.price), 0) AS total
+            FROM {item_table} ci
+            JOIN {product_table} bp ON bp.id = ci.product_id
+            WHERE ci.cart_id = %s
+        )
+        SELECT u.product_id, u.quantity, u.inserted, p.name, p.price, before.item_count, before.total
+        FROM upserted u
+        JOIN {product_table} p ON p.id = u.product_id
+        CROSS JOIN before
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [cart.pk, *case_params, *ids, cart.pk])
+        rows = cursor.fetchall()
+
+    lines = {}
+    if not rows:
+        return lines, None
+    item_count, total = rows[0][5], Decimal(rows[0][6])
+    for product_id, quantity, inserted, name, price, _, _ in rows:
+        lines[product_id] = {'name': name, 'quantity': quantity}
+        item_count += 1 if inserted else 0
+        total += Decimal(price) * quantities[product_id]
+    return lines, {'item_count': item_count, 'total': total}
+
+
+def _upsert_sqlite(cart, quantities):
+    item_table = CartItem._meta.db_table
+    product_table = Product._meta.db_table
+    cases, placeholders, case_params, ids = _upsert_values_sql(quantities)
+    sql = f"""
+        INSERT INTO {item_table} (cart_id, product_id, quantity)
+        SELECT %s, id, CASE id {cases} END
+        FROM {product_table}
+        WHERE id IN ({placeholders})
+        ON CONFLICT (cart_id, product_id)
+        DO UPDATE SET quantity = {item_table}.quantity + excluded.quantity
+        RETURNING product_id, quantity,
+            (SELECT name FROM {product_table} WHERE {product_table}.id = {item_table}.product_id)
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [cart.pk, *case_params, *ids])
+            rows = cursor.fetchall()
+        totals = cart_totals(cart) if rows else None
+    lines = {product_id: {'name': name, 'quantity': quantity} for product_id, quantity, name in rows}
+    return lines, totals
+
+
+@transaction.atomic
+def _upsert_orm(cart, quantities):
+    lines = {}
+    for product in Product.objects.filter(pk__in=list(quantities)).only('pk', 'name'):
+        item, created = CartItem.objects.select_for_update().get_or_create(
+            cart=cart, product=product, defaults={'quantity': quantities[product.pk]}
+        )
+        if not created:
+            CartItem.objects.filter(pk=item.pk).update(quantity=F('quantity') + quantities[product.pk])
+            item.refresh_from_db(fields=['quantity'])
+        lines[product.pk] = {'name': product.name, 'quantity': item.quantity}
+    return lines, cart_totals(cart) if lines else None
+
+
+def upsert_cart_items(cart, quantities):
+    """
+    Tambahkan beberapa produk sekaligus ke keranjang dengan satu statement
+    `INSERT ... ON CONFLICT DO UPDATE`, sehingga klik ganda tidak bisa
+    saling menimpa jumlah.
+
+    `quantities` adalah dict {product_id: jumlah}. Mengembalikan
+    `(lines, totals)`: `lines` berisi nama dan jumlah baru per produk yang
+    ada di database (produk yang tidak ada diabaikan), `totals` berisi
+    `item_count` dan `total` keranjang setelah penambahan, atau None bila
+    tidak ada produk yang valid.
+    """
+    quantities = {int(pid): int(qty) for pid, qty in quantities.items() if int(qty) > 0}
+    if not quantities:
+        return {}, None
+    if connection.vendor == 'postgresql':
+        return _upsert_postgresql(cart, quantities)
+    if connection.vendor == 'sqlite':
+        return _upsert_sqlite(cart, quantities)
+    return _upsert_orm(cart, quantities)
+
+
+class OutOfStock(ValueError):
+    pass
+
+
+@transaction.atomic
+def checkout_cart(cart):
+    """
+    Ubah isi keranjang menjadi Order dalam satu transaksi.
+
+    Harga disalin ke OrderLine saat checkout. Stok dikurangi dengan UPDATE
+    bersyarat (`stock >= jumlah`) per produk, sehingga tidak perlu
+    SELECT ... FOR UPDATE dan pembeli lain hanya menunggu selama statement
+    itu berjalan. Produk dengan stok NULL dianggap tidak dilacak.
+    """
+    # Lock keranjang dulu: checkout ganda keranjang yang sama antre di sini, dan
+    # di SQLite transaksi ini sudah memegang lock tulis sebelum membaca apa pun.
+    lock_for_write(Cart.objects.filter(pk=cart.pk))
+    items = list(cart_items(cart))
+    if not items:
+        raise ValueError('Keranjang sudah kosong.')
+
+    # Urutan product_id yang tetap mencegah deadlock antar checkout.
+    items.sort(key=lambda item: item.product_id)
+    for item in items:
+        updated = (
+            Product.objects
+            .filter(pk=item.product_id)
+            .filter(Q(stock__isnull=True) | Q(stock__gte=item.quantity))
+            .update(stock=F('stock') - item.quantity)
+        )
+        if not updated:
+            raise OutOfStock(f'Stok "{item.product.name}" tidak mencukupi.')
+
+    order = Order.objects.create(
+        owner=cart.owner,
+        session_key=cart.session_key,
+        total=sum((item.line_total for item in items), Decimal(0)),
+    )
+    OrderLine.objects.bulk_create([
+        OrderLine(
+            order=order,
+            product_id=item.product_id,
+            product_name=item.product.name,
+            unit_price=item.product.price,
+            quantity=item.quantity,
+            line_total=item.line_total,
+        )
+        for item in items
+    ])
+    InventoryEntry.objects.bulk_create([
+        InventoryEntry(product_id=item.product_id, change=-item.quantity, reason=InventoryReason.CHECKOUT, order=order)
+        for item in items
+        if item.product.stock is not None
+    ])
+    CartItem.objects.filter(cart=cart).delete()
+    return order
+
+
+@transaction.atomic
+def adjust_stock(product, change, reason=InventoryReason.RESTOCK):
+    """Tambah/kurangi stok produk dan catat di ledger. Restock produk yang belum dilacak mulai melacaknya."""
+    qs = Product.objects.filter(pk=product.pk)
+    if change < 0:
+        qs = qs.filter(stock__gte=-change)
+    updated = qs.update(stock=Coalesce(F('stock'), 0) + change)
+    if not updated:
+        raise OutOfStock(f'Stok "{product.name}" tidak mencukupi.')
+    InventoryEntry.objects.create(product=product, change=change, reason=reason)
+    product.refresh_from_db(fields=['stock'])
+    return product
+
+
+def build_featured_payload():
+    """
+    Hitung ulang daftar produk unggulan dan simpan di cache sebagai JSON
+    siap kirim beserta ETag-nya.
+    """
+    # Dibaca langsung dari indeks (units_sold_count DESC, id): hanya FEATURED_LIMIT baris.
+    top = Product.objects.order_by('-units_sold_count', 'pk').values_list(
+        'name', 'price', 'image_url', 'rating', 'units_sold'
+    )[:FEATURED_LIMIT]
+    view_url = reverse('store:product_list')
+    products = [
+        {
+            'name': name,
+            'price_formatted': f"Rp{int(price):,}",
+            'image_url': image_url or FEATURED_PLACEHOLDER_IMAGE,
+            'rating': rating or '-',
+            'units_sold': units_sold or '',
+            'view_url': view_url,
+        }
+        for name, price, image_url, rating, units_sold in top
+    ]
+    body = json.dumps({'products': products}).encode('utf-8')
+    payload = {'body': body, 'etag': f'"{hashlib.md5(body).hexdigest()}"'}
+    cache.set(FEATURED_CACHE_KEY, payload, FEATURED_CACHE_TIMEOUT)
+    return payload
+
+
+def get_featured_payload():
+    payload = cache.get(FEATURED_CACHE_KEY)
+    if payload is None:
+        payload = build_featured_payload()
+    return payload
+
+
+def invalidate_featured_products():
+    cache.delete(FEATURED_CACHE_KEY)
@@ -1,12 +1,26 @@
+import importlib.util
+import io
 import json
-from django.test import TestCase, Client
+import os
+import shutil
+import tempfile
+from unittest import skipUnless
+from unittest.mock import patch
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, Client, RequestFactory
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from decimal import Decimal
 from django.db import IntegrityError
-from .models import Product, Cart, CartItem
+from .models import Product, Cart, CartItem, InventoryEntry, Order, parse_units_sold
 from home.models import FitnessSpot
 from .forms import ProductForm
+from .services import (
+    OutOfStock, adjust_stock, build_featured_payload, cart_summary, cart_totals, checkout_cart, get_cart_summary,
+    upsert_cart_items,
+)
 
 User = get_user_model()
 
@@ -84,6 +98,419 @@ class StoreModelTests(TestCase):
             CartItem.objects.create(cart=cart, product=self.product1, quantity=1)
 
 
+class CartServiceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='serviceuser', password='password')
+        cls.product1 = Product.objects.create(name='Service Product 1', price=Decimal('50000'), image_url='http://example.com/s1.jpg')
+        cls.product2 = Product.objects.create(name='Service Product 2', price=Decimal('75000'), image_url='http://example.com/s2.jpg')
+
+    def setUp(self):
+        self.cart = Cart.objects.create(owner=self.user)
+
+    def test_cart_summary_single_query(self):
+        CartItem.objects.create(cart=self.cart, product=self.product1, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.product2, quantity=1)
+        with self.assertNumQueries(1):
+            summary = cart_summary(self.cart)
+            names = [item.product.name for item in summary['items']]
+        self.assertEqual(names, ['Service Product 1', 'Service Product 2'])
+        self.assertEqual(summary['item_count'], 2)
+        self.assertEqual(summary['total'], Decimal('175000'))
+        self.assertEqual(summary['items'][0].line_total, Decimal('100000'))
+        self.assertEqual(summary['items'][0].total_price(), Decimal('100000'))
+
+    def test_cart_summary_empty(self):
+        summary = cart_summary(self.cart)
+        self.assertEqual(summary, {'items': [], 'item_count': 0, 'total': Decimal('0')})
+
+    def test_cart_totals(self):
+        CartItem.objects.create(cart=self.cart, product=self.product2, quantity=3)
+        with self.assertNumQueries(1):
+            totals = cart_totals(self.cart)
+        self.assertEqual(totals, {'item_count': 1, 'total': Decimal('225000')})
+
+    def test_user_cart_json_uses_sql_totals(self):
+        CartItem.objects.create(cart=self.cart, product=self.product1, quantity=2)
+        self.client.login(username='serviceuser', password='password')
+        response = self.client.get(reverse('store:user_cart_json'))
+        data = response.json()
+        self.assertEqual(data['total_price'], 100000)
+        self.assertEqual(data['items'][0]['total_price'], 100000)
+
+
+class CartSummaryCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cacheuser', password='password')
+        cls.product = Product.objects.create(name='Cache Product', price=Decimal('20000'), image_url='http://example.com/c.jpg')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_product_list_does_not_create_cart(self):
+        response = self.client.get(reverse('store:product_list'))
+        self.assertEqual(response.context['cart_count'], 0)
+        self.assertFalse(Cart.objects.exists())
+
+    def test_product_list_served_from_cache_after_mutation(self):
+        self.client.login(username='cacheuser', password='password')
+        self.client.post(reverse('store:add_to_cart', args=[self.product.pk]), {'quantity': 2})
+        cart = Cart.objects.get(owner=self.user)
+        response = self.client.get(reverse('store:product_list'))
+        self.assertEqual(response.context['cart_count'], 1)
+
+        CartItem.objects.filter(cart=cart).delete()
+        response = self.client.get(reverse('store:product_list'))
+        self.assertEqual(response.context['cart_count'], 1)
+
+    def test_cart_mutations_write_through(self):
+        self.client.login(username='cacheuser', password='password')
+        self.client.post(reverse('store:add_to_cart', args=[self.product.pk]), {'quantity': 2})
+        request = RequestFactory().get('/')
+        request.user = self.user
+        summary = get_cart_summary(request)
+        self.assertEqual(summary['item_count'], 1)
+        self.assertEqual(summary['total'], 40000)
+
+        self.client.post(reverse('store:checkout'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(get_cart_summary(request)['item_count'], 0)
+
+    def test_product_change_invalidates_cached_totals(self):
+        cart = Cart.objects.create(owner=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        request = RequestFactory().get('/')
+        request.user = self.user
+        self.assertEqual(get_cart_summary(request)['total'], 20000)
+
+        self.product.price = Decimal('30000')
+        self.product.save()
+        self.assertEqual(get_cart_summary(request)['total'], 30000)
+
+
+class CartUpsertTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='upsertuser', password='password')
+        cls.product1 = Product.objects.create(name='Upsert Product 1', price=Decimal('10000'), image_url='http://example.com/u1.jpg')
+        cls.product2 = Product.objects.create(name='Upsert Product 2', price=Decimal('25000'), image_url='http://example.com/u2.jpg')
+
+    def setUp(self):
+        cache.clear()
+        self.cart = Cart.objects.create(owner=self.user)
+
+    def test_upsert_inserts_and_increments(self):
+        lines, totals = upsert_cart_items(self.cart, {self.product1.pk: 2})
+        self.assertEqual(lines[self.product1.pk], {'name': 'Upsert Product 1', 'quantity': 2})
+        self.assertEqual(totals, {'item_count': 1, 'total': Decimal('20000')})
+
+        lines, totals = upsert_cart_items(self.cart, {self.product1.pk: 3, self.product2.pk: 1})
+        self.assertEqual(lines[self.product1.pk]['quantity'], 5)
+        self.assertEqual(lines[self.product2.pk]['quantity'], 1)
+        self.assertEqual(totals, {'item_count': 2, 'total': Decimal('75000')})
+        self.assertEqual(CartItem.objects.get(cart=self.cart, product=self.product1).quantity, 5)
+
+    def test_upsert_ignores_missing_products(self):
+        lines, totals = upsert_cart_items(self.cart, {999999: 1})
+        self.assertEqual(lines, {})
+        self.assertIsNone(totals)
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_add_to_cart_missing_product_returns_404(self):
+        self.client.login(username='upsertuser', password='password')
+        response = self.client.post(reverse('store:add_to_cart', args=[999999]), {'quantity': 1})
+        self.assertEqual(response.status_code, 404)
+
+    def test_add_many_to_cart_flutter(self):
+        self.client.login(username='upsertuser', password='password')
+        payload = {'items': [
+            {'product_id': self.product1.pk, 'quantity': 1},
+            {'product_id': self.product2.pk, 'quantity': 2},
+            {'product_id': self.product1.pk, 'quantity': 1},
+            {'product_id': 999999, 'quantity': 1},
+        ]}
+        response = self.client.post(reverse('store:add_many_to_cart_flutter'), json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['cart_count'], 2)
+        self.assertEqual(data['total_price'], 70000)
+        self.assertEqual(data['missing'], [999999])
+        self.assertEqual(CartItem.objects.get(cart=self.cart, product=self.product1).quantity, 2)
+
+    def test_add_many_to_cart_flutter_invalid_payload(self):
+        response = self.client.post(reverse('store:add_many_to_cart_flutter'), '{"items": [{}]}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class CheckoutServiceTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='orderuser', password='password')
+        cls.tracked = Product.objects.create(name='Tracked Product', price=Decimal('10000'), stock=3, image_url='http://example.com/t.jpg')
+        cls.untracked = Product.objects.create(name='Untracked Product', price=Decimal('5000'), image_url='http://example.com/n.jpg')
+
+    def setUp(self):
+        self.cart = Cart.objects.create(owner=self.user)
+
+    def test_checkout_creates_order_and_ledger(self):
+        CartItem.objects.create(cart=self.cart, product=self.tracked, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.untracked, quantity=1)
+        order = checkout_cart(self.cart)
+
+        self.assertEqual(order.owner, self.user)
+        self.assertEqual(order.total, Decimal('25000'))
+        lines = {line.product_name: line for line in order.lines.all()}
+        self.assertEqual(lines['Tracked Product'].unit_price, Decimal('10000'))
+        self.assertEqual(lines['Tracked Product'].line_total, Decimal('20000'))
+        self.tracked.refresh_from_db()
+        self.untracked.refresh_from_db()
+        self.assertEqual(self.tracked.stock, 1)
+        self.assertIsNone(self.untracked.stock)
+        entry = InventoryEntry.objects.get(order=order)
+        self.assertEqual((entry.product, entry.change), (self.tracked, -2))
+        self.assertFalse(CartItem.objects.filter(cart=self.cart).exists())
+
+    def test_checkout_price_is_snapshotted(self):
+        CartItem.objects.create(cart=self.cart, product=self.untracked, quantity=1)
+        order = checkout_cart(self.cart)
+        self.untracked.price = Decimal('9000')
+        self.untracked.save()
+        self.assertEqual(order.lines.get().unit_price, Decimal('5000'))
+
+    def test_checkout_out_of_stock_rolls_back(self):
+        CartItem.objects.create(cart=self.cart, product=self.untracked, quantity=1)
+        CartItem.objects.create(cart=self.cart, product=self.tracked, quantity=5)
+        with self.assertRaises(OutOfStock):
+            checkout_cart(self.cart)
+        self.tracked.refresh_from_db()
+        self.assertEqual(self.tracked.stock, 3)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(CartItem.objects.filter(cart=self.cart).count(), 2)
+
+    def test_checkout_view_out_of_stock(self):
+        CartItem.objects.create(cart=self.cart, product=self.tracked, quantity=4)
+        self.client.login(username='orderuser', password='password')
+        response = self.client.post(reverse('store:checkout'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('tidak mencukupi', response.json()['error'])
+
+    def test_inventory_ledger_is_append_only(self):
+        adjust_stock(self.tracked, 5)
+        entry = InventoryEntry.objects.get(product=self.tracked)
+        self.assertEqual(entry.change, 5)
+        self.assertEqual(Product.objects.get(pk=self.tracked.pk).stock, 8)
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
+
+    def test_restock_starts_tracking_untracked_product(self):
+        adjust_stock(self.untracked, 4)
+        self.assertEqual(Product.objects.get(pk=self.untracked.pk).stock, 4)
+
+
+class FeaturedProductsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.create(name='Few Sold', price=Decimal('1000'), units_sold='500+ terjual', image_url='http://example.com/a.jpg')
+        Product.objects.create(name='Many Sold', price=Decimal('250000'), units_sold='4rb+ terjual', rating='4.9')
+        Product.objects.create(name='Unknown Sold', price=Decimal('3000'), image_url='http://example.com/c.jpg')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_parse_units_sold(self):
+        self.assertEqual(parse_units_sold('4rb+ terjual'), 4000)
+        self.assertEqual(parse_units_sold('1,2jt terjual'), 1200000)
+        self.assertEqual(parse_units_sold('250+ terjual'), 250)
+        self.assertEqual(parse_units_sold(None), 0)
+
+    def test_featured_ranked_by_units_sold(self):
+        response = self.client.get(reverse('store:featured_products_api'))
+        self.assertEqual(response.status_code, 200)
+        products = response.json()['products']
+        self.assertEqual([p['name'] for p in products], ['Many Sold', 'Few Sold', 'Unknown Sold'])
+        self.assertEqual(products[0]['price_formatted'], 'Rp250,000')
+        self.assertIn('placeholder', products[0]['image_url'])
+        self.assertEqual(products[2]['rating'], '-')
+
+    def test_units_sold_count_follows_text_and_limits_rows(self):
+        product = Product.objects.get(name='Few Sold')
+        self.assertEqual(product.units_sold_count, 500)
+        product.units_sold = '1,2jt terjual'
+        product.save(update_fields=['units_sold'])
+        self.assertEqual(Product.objects.get(pk=product.pk).units_sold_count, 1200000)
+
+        # Satu query terbatas FEATURED_LIMIT baris, bukan seluruh tabel produk.
+        with self.assertNumQueries(1) as ctx:
+            build_featured_payload()
+        self.assertIn('LIMIT', ctx.captured_queries[0]['sql'])
+
+    def test_featured_served_from_cache_with_etag(self):
+        first = self.client.get(reverse('store:featured_products_api'))
+        etag = first['ETag']
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('store:featured_products_api'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, 304)
+
+    def test_featured_refreshed_on_product_change(self):
+        first = self.client.get(reverse('store:featured_products_api'))
+        Product.objects.create(name='Best Seller', price=Decimal('5000'), units_sold='1jt terjual')
+        second = self.client.get(reverse('store:featured_products_api'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['products'][0]['name'], 'Best Seller')
+
+
+@skipUnless(importlib.util.find_spec('pandas'), 'pandas tidak terpasang')
+class ImportProductsCommandTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            FitnessSpot.objects.create(pk=f'importSpot{i}', name=f'Import Spot {i}', address='-', latitude='-6.5', longitude='106.8')
+
+    def _write_csv(self, rows):
+        tmp = tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8')
+        with tmp:
+            tmp.write('Product Name,Price (Rp),Rating,Units Sold,Image URL\n')
+            for row in rows:
+                tmp.write(','.join(row) + '\n')
+        self.addCleanup(os.remove, tmp.name)
+        return tmp.name
+
+    def test_import_csv_cleans_values(self):
+        path = self._write_csv([
+            ('Bola Voli', '"Rp150.000"', '4.8', '100+ terjual', 'http://example.com/b.jpg'),
+            ('Raket', '90000', 'N/A', 'N/A', 'N/A'),
+            ('Tanpa Harga', 'N/A', '4.0', '1 terjual', 'http://example.com/x.jpg'),
+        ])
+        call_command('import_products', path, stdout=io.StringIO())
+        self.assertEqual(Product.objects.count(), 2)
+        bola = Product.objects.get(name='Bola Voli')
+        self.assertEqual(bola.price, Decimal('150000'))
+        self.assertEqual(bola.rating, '4.8')
+        raket = Product.objects.get(name='Raket')
+        self.assertIsNone(raket.rating)
+        self.assertIsNone(raket.units_sold)
+        self.assertTrue(raket.store_id.startswith('importSpot'))
+
+    def test_import_store_assignment_is_deterministic(self):
+        path = self._write_csv([(f'Produk {i}', '1000', '4.0', '1 terjual', 'http://example.com/p.jpg') for i in range(10)])
+        call_command('import_products', path, '--seed', '7', stdout=io.StringIO())
+        first = list(Product.objects.order_by('name').values_list('store_id', flat=True))
+        call_command('import_products', path, '--seed', '7', stdout=io.StringIO())
+        second = list(Product.objects.order_by('name').values_list('store_id', flat=True))
+        self.assertEqual(first, second)
+
+    def test_import_upsert_keeps_existing_rows(self):
+        existing = Product.objects.create(name='Bola Voli', price=Decimal('1000'), image_url='http://example.com/old.jpg')
+        path = self._write_csv([
+            ('Bola Voli', '2000', '4.5', '10 terjual', 'http://example.com/new.jpg'),
+            ('Net Voli', '50000', '4.1', '5 terjual', 'http://example.com/net.jpg'),
+        ])
+        out = io.StringIO()
+        call_command('import_products', path, '--upsert', stdout=out)
+        existing.refresh_from_db()
+        self.assertEqual(existing.price, Decimal('2000'))
+        self.assertEqual(Product.objects.count(), 2)
+        self.assertIn('1 baru, 1 diperbarui', out.getvalue())
+
+    def test_import_unsupported_file_keeps_existing_rows(self):
+        Product.objects.create(name='Lama', price=Decimal('1000'), image_url='http://example.com/old.jpg')
+        tmp = tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False)
+        tmp.close()
+        self.addCleanup(os.remove, tmp.name)
+        with self.assertRaises(CommandError):
+            call_command('import_products', tmp.name, stdout=io.StringIO())
+        self.assertTrue(Product.objects.filter(name='Lama').exists())
+
+    def test_import_failing_midway_rolls_back_reset(self):
+        Product.objects.create(name='Lama', price=Decimal('1000'), image_url='http://example.com/old.jpg')
+        tmp = tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False, encoding='utf-8')
+        with tmp:
+            tmp.write('{"Product Name": "Baru", "Price (Rp)": 2000}\n')
+            tmp.write('bukan json\n')
+        self.addCleanup(os.remove, tmp.name)
+        out = io.StringIO()
+        call_command('import_products', tmp.name, '--batch-size', '1', stdout=out)
+        self.assertIn('Tidak ada perubahan yang disimpan', out.getvalue())
+        self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['Lama'])
+
+
+@skipUnless(importlib.util.find_spec('bs4'), 'beautifulsoup4 tidak terpasang')
+class ScraperPipelineTests(TestCase):
+    FIXTURES = os.path.join(os.path.dirname(__file__), 'test_fixtures', 'tokopedia')
+
+    def setUp(self):
+        from store.management.commands import WebScraping
+        self.scraper = WebScraping
+        log_patch = patch.object(WebScraping, 'add_logs')
+        log_patch.start()
+        self.addCleanup(log_patch.stop)
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.output = os.path.join(tmp_dir, 'products.jsonl')
+
+    def _sink(self, products, query):
+        self.scraper.append_to_jsonl(products, query, self.output)
+
+    def test_scrape_queries_from_fixtures(self):
+        results = self.scraper.scrape_queries(
+            ['bola voli', 'tidak ada'], max_workers=2, max_attempts=2, base_delay=0,
+            fetch_html=self.scraper.HtmlFixtureFetcher(self.FIXTURES), sink=self._sink,
+        )
+        self.assertEqual(results['tidak ada'], [])
+        prices = [p['Price (Rp)'] for p in results['bola voli']]
+        self.assertEqual(prices, [175500, 985000, 1250000])
+        with open(self.output, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['Search Query'], 'bola voli')
+
+    def test_jsonl_output_is_appended(self):
+        fetch = self.scraper.HtmlFixtureFetcher(self.FIXTURES)
+        for _ in range(2):
+            self.scraper.run_scraper(self.scraper.build_search_url('bola voli'), 'bola voli', fetch_html=fetch, sink=self._sink)
+        with open(self.output, encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 6)
+
+    @skipUnless(importlib.util.find_spec('pandas'), 'pandas tidak terpasang')
+    def test_jsonl_output_can_be_imported(self):
+        FitnessSpot.objects.create(pk='scrapeSpot', name='Scrape Spot', address='-', latitude='-6.5', longitude='106.8')
+        fetch = self.scraper.HtmlFixtureFetcher(self.FIXTURES)
+        self.scraper.run_scraper(self.scraper.build_search_url('bola voli'), 'bola voli', fetch_html=fetch, sink=self._sink)
+        call_command('import_products', self.output, '--upsert', stdout=io.StringIO())
+        self.assertEqual(Product.objects.get(name='Bola Voli Molten V5M5000').price, Decimal('985000'))
+        self.assertIsNone(Product.objects.get(name='Net Voli Standar Nasional').rating)
+
+    def test_parser_backends_agree(self):
+        with open(os.path.join(self.FIXTURES, 'bola+voli.html'), encoding='utf-8') as f:
+            html = f.read()
+        expected = self.scraper.parse_html(html, 'html.parser')
+        self.assertEqual(len(expected), 3)
+        self.assertEqual(self.scraper.parse_product_data(self.scraper.BeautifulSoup(html, 'html.parser')), expected)
+        for backend in self.scraper.available_parsers():
+            with self.subTest(backend=backend):
+                self.assertEqual(self.scraper.parse_html(html, backend), expected)
+
+    def test_skipped_cards_are_logged_once(self):
+        with open(os.path.join(self.FIXTURES, 'bola+voli.html'), encoding='utf-8') as f:
+            self.scraper.parse_html(f.read())
+        messages = [c.args[0] for c in self.scraper.add_logs.call_args_list]
+        self.assertIn('Skipped 1 cards with missing or unparsable Name, Price or URL.', messages)
+
+    def test_benchmark_reports_every_backend(self):
+        rates = self.scraper.benchmark_parsers(self.FIXTURES, repeat=1)
+        self.assertEqual(list(rates), self.scraper.available_parsers())
+        self.assertTrue(all(rate > 0 for rate in rates.values()))
+
+
 class ProductFormTests(TestCase):
 
     @classmethod
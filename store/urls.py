@@ -19,6 +19,7 @@ urlpatterns = [
     # TAMBAHAN PROJECT PAS (ini buat flutter)
     path('api/products/', views.product_list_json, name='product_list_json'),
     path('api/cart/', views.user_cart_json, name='user_cart_json'),
+    path('api/cart/add-many/', views.add_many_to_cart_flutter, name='add_many_to_cart_flutter'),
     path('create-flutter/', views.create_product_flutter, name='create_product_flutter'),
     path('proxy-image/', proxy_image, name='proxy_image'),
     path('api/spots/', views.get_fitness_spots_json, name='get_fitness_spots_json'),
@@ -2,8 +2,7 @@ import json
 from functools import wraps
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.decorators.http import require_POST, require_GET
-from django.http import JsonResponse, HttpResponseForbidden, HttpResponseBadRequest, HttpResponse
-from django.db.models import F
+from django.http import JsonResponse, HttpResponseForbidden, HttpResponseBadRequest, HttpResponse, Http404, HttpResponseNotModified
 from django.core.paginator import Paginator
 from django.contrib.humanize.templatetags.humanize import intcomma
 from django.contrib.auth.decorators import user_passes_test
@@ -12,6 +11,10 @@ from django.template.loader import render_to_string
 from decimal import Decimal, InvalidOperation 
 from .models import Product, Cart, CartItem
 from .forms import ProductForm
+from .services import (
+    OutOfStock, cart_summary, cart_totals, checkout_cart, get_cart_summary, get_featured_payload,
+    remember_cart_summary, upsert_cart_items,
+)
 from home.models import FitnessSpot
 from django.http import HttpResponse
 import requests
@@ -88,14 +91,11 @@ def product_list_json(request):
 
 def user_cart_json(request):
     cart = _get_or_create_cart(request)
-    items = cart.items.select_related('product').all()
-    
+    summary = cart_summary(cart)
+    remember_cart_summary(request, cart, summary)
+
     cart_data = []
-    total_price = 0
-    
-    for item in items:
-        item_total = item.product.price * item.quantity
-        total_price += item_total
+    for item in summary['items']:
         cart_data.append({
             "id": item.pk,
             "product": {
@@ -105,13 +105,44 @@ def user_cart_json(request):
                 "image_url": item.product.image_url,
             },
             "quantity": item.quantity,
-            "total_price": int(item_total)
+            "total_price": int(item.line_total)
         })
 
     return JsonResponse({
         "status": "success",
         "items": cart_data,
-        "total_price": int(total_price)
+        "total_price": int(summary['total'])
+    })
+
+
+@csrf_exempt
+@require_POST
+def add_many_to_cart_flutter(request):
+    try:
+        data = json.loads(request.body)
+        quantities = {}
+        for entry in data.get('items', []):
+            product_id = int(entry['product_id'])
+            quantities[product_id] = quantities.get(product_id, 0) + max(int(entry.get('quantity', 1)), 1)
+    except Exception:
+        return JsonResponse({"status": "error", "message": "Format data tidak valid"}, status=400)
+
+    if not quantities:
+        return JsonResponse({"status": "error", "message": "Tidak ada produk yang dikirim"}, status=400)
+
+    cart = _get_or_create_cart(request)
+    lines, totals = upsert_cart_items(cart, quantities)
+    summary = remember_cart_summary(request, cart, totals)
+
+    return JsonResponse({
+        "status": "success",
+        "items": [
+            {"product_id": pid, "name": line["name"], "quantity": line["quantity"]}
+            for pid, line in lines.items()
+        ],
+        "missing": [pid for pid in quantities if pid not in lines],
+        "cart_count": summary['item_count'],
+        "total_price": summary['total'],
     })
 
 
@@ -224,8 +255,7 @@ def product_list(request):
     if request.headers.get('x-requested-with') == 'XMLHttpRequest' and request.GET.get('ajax') == '1':
         return render(request, 'product_list2.html', context)
 
-    cart = _get_or_create_cart(request)
-    context['cart_count'] = cart.items.count()
+    context['cart_count'] = get_cart_summary(request)['item_count']
     context['fitness_spots'] = FitnessSpot.objects.all().order_by('name')
 
     return render(request, 'product_list.html', context)
@@ -234,8 +264,6 @@ def product_list(request):
 @csrf_exempt
 @require_POST
 def add_to_cart(request, pk):
-    product = get_object_or_404(Product, pk=pk)
-    
     try:
         data = json.loads(request.body)
         quantity = int(data.get('quantity', 1))
@@ -246,42 +274,27 @@ def add_to_cart(request, pk):
         quantity = 1
 
     cart = _get_or_create_cart(request)
-    
-    item, created = CartItem.objects.get_or_create(
-        cart=cart, 
-        product=product
-    )
+    lines, totals = upsert_cart_items(cart, {pk: quantity})
+    if pk not in lines:
+        raise Http404('Produk tidak ditemukan')
 
-    if not created:
-        item.quantity = F('quantity') + quantity
-        item.save()
-        item.refresh_from_db() 
-    else:
-        item.quantity = quantity
-        item.save()
-
-    cart.refresh_from_db() 
+    summary = remember_cart_summary(request, cart, totals)
     return JsonResponse({
         'success': True,
-        'message': f'"{product.name}" ditambahkan ke keranjang.',
-        'cart_count': cart.items.count()
+        'message': f'"{lines[pk]["name"]}" ditambahkan ke keranjang.',
+        'cart_count': summary['item_count']
     })
 
 
 def view_cart(request):
     cart = _get_or_create_cart(request)
-    items = cart.items.select_related('product').all()
-    total = 0
-    for item in items:
-        if hasattr(item, 'total_price') and callable(item.total_price):
-             total += item.total_price()
-        elif item.product and item.product.price is not None:
-             total += (item.product.price * item.quantity)
+    summary = cart_summary(cart)
+    remember_cart_summary(request, cart, summary)
 
     return render(request, 'checkout.html', {
         'cart': cart,
-        'items': items,
-        'total': total
+        'items': summary['items'],
+        'total': summary['total']
     })
 
 
@@ -289,22 +302,18 @@ def view_cart(request):
 @require_POST
 def remove_from_cart(request, pk):
     cart = _get_or_create_cart(request)
-    item = get_object_or_404(CartItem, cart=cart, product_id=pk)
-    item.delete()
+    deleted, _ = CartItem.objects.filter(cart=cart, product_id=pk).delete()
+    if not deleted:
+        raise Http404('Item tidak ditemukan')
 
-    items = cart.items.select_related('product').all()
-    total = 0
-    for i in items:
-        if hasattr(i, 'total_price') and callable(i.total_price):
-            total += i.total_price()
-        elif i.product and i.product.price is not None:
-             total += (i.product.price * i.quantity)
+    totals = cart_totals(cart)
+    remember_cart_summary(request, cart, totals)
 
     return JsonResponse({
         'success': True,
         'message': 'Item dihapus.',
-        'cart_count': items.count(),
-        'grand_total_formatted': f"Rp{intcomma(int(total))}"
+        'cart_count': totals['item_count'],
+        'grand_total_formatted': f"Rp{intcomma(int(totals['total']))}"
     })
 
 
@@ -321,39 +330,31 @@ def update_cart(request, pk):
         message = ''
         
         if quantity < 1:
-            item_qs = CartItem.objects.filter(cart=cart, product_id=pk)
-            if item_qs.exists():
-                item = item_qs.first()
-                product_name = item.product.name
-                item_qs.delete()
-                removed = True
-                message = f'"{product_name}" dihapus dari keranjang.'
-            else:
+            item = CartItem.objects.filter(cart=cart, product_id=pk).select_related('product').first()
+            if item is None:
                  return JsonResponse({'success': False, 'error': 'Item tidak ditemukan'}, status=404)
+            product_name = item.product.name
+            item.delete()
+            removed = True
+            message = f'"{product_name}" dihapus dari keranjang.'
         else:
-            item, created = CartItem.objects.update_or_create(
+            item, created = CartItem.objects.select_related('product').update_or_create(
                  cart=cart, product_id=pk, defaults={'quantity': quantity}
             )
-            item.refresh_from_db()
             message = f'Jumlah "{item.product.name}" diperbarui.'
 
-        items = cart.items.select_related('product').all()
-        grand_total = 0
-        for i in items:
-            if hasattr(i, 'total_price') and callable(i.total_price):
-                grand_total += i.total_price()
-            elif i.product and i.product.price is not None:
-                 grand_total += (i.product.price * i.quantity)
+        totals = cart_totals(cart)
+        remember_cart_summary(request, cart, totals)
         
         item_total = 0
         if item and not removed:
-             item_total = (item.product.price * item.quantity)
+             item_total = item.total_price()
 
         return JsonResponse({
             'success': True,
             'message': message,
             'item_total_formatted': f"Rp{intcomma(int(item_total))}",
-            'grand_total_formatted': f"Rp{intcomma(int(grand_total))}",
+            'grand_total_formatted': f"Rp{intcomma(int(totals['total']))}",
             'removed': removed
         })
     except Exception as e:
@@ -365,18 +366,22 @@ def update_cart(request, pk):
 def checkout(request):
     try:
         cart = _get_or_create_cart(request)
-        items = cart.items.all()
-
-        if not items.exists():
-            return JsonResponse({'success': False, 'error': 'Keranjang sudah kosong.'}, status=400)
-        
-        items.delete()
-        
-        return JsonResponse({'success': True, 'message': 'Checkout berhasil.'})
-
+        order = checkout_cart(cart)
+    except OutOfStock as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=409)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
+    remember_cart_summary(request, cart, {'item_count': 0, 'total': 0})
+    return JsonResponse({
+        'success': True,
+        'message': 'Checkout berhasil.',
+        'order_id': order.pk,
+        'total_formatted': f"Rp{intcomma(int(order.total))}"
+    })
+
 
 def admin_session_required(view_func):
     @wraps(view_func)
@@ -546,20 +551,14 @@ def view_product_detail(request, pk):
     
 def featured_products_api(request):
     try:
-        products = Product.objects.order_by('-units_sold')[:15]
-        
-        data = []
-        for product in products:
-            data.append({
-                'name': product.name,
-                'price_formatted': f"Rp{intcomma(int(product.price))}",
-                'image_url': product.image_url if product.image_url else 'https://via.placeholder.com/300x180.png?text=No+Image',
-                'rating': product.rating or '-',
-                'units_sold': product.units_sold or '',
-                'view_url': reverse('store:product_list')
-            })
-        
-        return JsonResponse({'products': data})
-
+        payload = get_featured_payload()
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
+
+    if request.headers.get('If-None-Match') == payload['etag']:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(payload['body'], content_type='application/json')
+    response['ETag'] = payload['etag']
+    response['Cache-Control'] = 'public, max-age=60'
+    return response